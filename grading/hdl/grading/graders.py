@@ -8,7 +8,7 @@ import projects
 from results import GraderResult, parse_non_zero_return_code
 from zipfile import ZipFile
 from base_grader import BaseGrader
-from feedback_tools import Diff, set_feedback, get_input_sample
+from feedback_tools import Diff, set_feedback, get_input_sample, encode_compact_feedback
 import graders_utils as gutils
 from submission_requests import SubmissionRequest
 from shutil import copyfile
@@ -104,8 +104,8 @@ class HDLGrader(BaseGrader):
             res_type = self.response_type
             result, debug_info['files_feedback'][testbench_file_name], feedback_info = self._construct_feedback(results)
             test_cases = (testbench_file_name, expected_output_name)
-            #Saving feedback as json  
-            if res_type == 'json':
+            #Saving feedback as json, or in its compact encoding
+            if res_type in ('json', 'compact'):
                 feedback_list_json = []
                 #for the test case we save the info for the html templates on the frontend
                 feedback_obj = {
@@ -125,8 +125,10 @@ class HDLGrader(BaseGrader):
                 # Converting the list to a json format string
                 # The json object always have this structure on hdl
                 # [ feedback_obj_test_case , options_for_feedback , debug_info ]
-                feedback_str_json = json.dumps(feedback_list_json)
-                feedback_str = feedback_str_json
+                if res_type == 'json':
+                    feedback_str = json.dumps(feedback_list_json)
+                else:
+                    feedback_str = encode_compact_feedback(feedback_list_json)
             #Saving feedback as rst
             elif res_type == 'rst':                
                 feedback_str = self.diff_tool.hdl_to_html_block(0, result, test_cases, debug_info, self.submission_request.is_staff)
@@ -8,17 +8,31 @@ import os
 import json
 import html
 import tempfile
+import queue
+import threading
 import projects
-from sys import getsizeof
-import gc
+import java_runtime_profiles
 import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing
 from results import GraderResult, parse_non_zero_return_code, SandboxCodes
 from zipfile import ZipFile, is_zipfile
 from base_grader import BaseGrader
-from feedback_tools import Diff, set_feedback, get_input_sample
+from feedback_tools import DIFF_MAX_LENGTH, Diff, set_feedback, get_input_sample, apply_feedback_budget, encode_compact_feedback
+from failure_statistics import FailureStatistics, DEFAULT_STATISTICS_FILENAME
+from output_streams import StreamingComparator, SpooledOutput, HeadTailBuffer, normalize_newlines
 import graders_utils as gutils
+import checkers
 from submission_requests import SubmissionRequest
-from .utils import remove_sockets_exception, cut_stderr, is_presentation_error
+from .utils import remove_sockets_exception, cut_stderr, find_first_different_token, describe_different_token
+
+# Output length of a custom input run will be 80 KBs at most.
+_CUSTOM_INPUT_STDOUT_MAX_LENGTH = (2 ** 10) * 80
+
+# Marks the end of the test cases in the queues between the stages of a pipelined grading
+_END_OF_STAGE = object()
+# Interval in seconds to check whether a pipelined grading stopped while a stage waits on a full queue
+_PIPELINE_POLL_INTERVAL = 0.1
 
 
 class SimpleGrader(BaseGrader):
@@ -30,6 +44,49 @@ class SimpleGrader(BaseGrader):
         - diff_tool (obj): Instance of the class Diff. Containing the diff tool with some
         specific 'options'.
         - generate_diff (bool): Value signaling that is necessary to generate the diff feedback.
+        - parallel_tests (bool or int): Whether the test cases are run at the same time on a pool of workers.
+        An integer value is also used as the maximum amount of workers.
+        - batch_tests (bool): Whether the test cases are sent to the project in a single batched run
+        (check 'Project.run_many'), instead of one sandbox session per test case. It is disabled by default,
+        as the test cases are less isolated from each other than in separate sessions (check 'batch_driver.py').
+        - streaming_comparison (bool): Whether the output is compared against the expected output file while
+        it is produced, without keeping it in memory (check 'StreamingComparator'). It only applies when
+        the default check_output is used.
+        - checker (str): Name of the checker used to compare the output when the default check_output is
+        used, e.g. 'exact', 'whitespace', 'line_order' or 'float' (check 'checkers.py').
+        - checker_options (dict): Options given to the checker, e.g. the 'absolute_tolerance' and
+        'relative_tolerance' of the 'float' checker.
+        - stderr_capture_size (int): Amount of bytes kept from the beginning and from the end of the stderr.
+        - max_failures (int): Amount of failed test cases after which the grading stops, or None to run all
+        of them. The remaining test cases are marked as NOT_RUN. It does not apply to staff submissions.
+        - stop_on_time_limit (bool): Whether the grading stops after the first test case that exceeds the
+        time limit. It does not apply to staff submissions.
+        - order_tests_by_failure (bool): Whether the test cases most likely to fail are run first, according to
+        the failure statistics of the task (check 'failure_statistics.py'). The results keep the order of the
+        test cases.
+        - failure_statistics_file (str): Name of the file where the failure statistics of the task are stored. It
+        must be kept between the gradings, e.g. in a mounted volume, as the task directory is copied for each
+        grading (check 'failure_statistics.py').
+        - pipeline_tests (bool or int): Whether the output of a test case is checked and its feedback is rendered
+        while the next test cases are run (check '_run_test_cases_in_pipeline'). It only applies when the test
+        cases are not run in parallel nor in batch. An integer value is also used as the amount of test cases
+        that each stage can get ahead of the next one.
+        - feedback_budget (int): Amount of bytes shared by the outputs, errors and diffs of all the test cases in
+        the feedback, giving priority to the first ones (check 'apply_feedback_budget'), or None for no budget.
+        With a budget, the debug info of json and compact feedback is not repeated in the custom values, which
+        keep a reference to the feedback instead.
+        - deduplicate_inputs (bool): Whether the code is run only once for each distinct input, giving its output
+        to all the test cases with that input (check 'DeduplicatedProject').
+        - report_startup_overhead (bool): Whether the time the runtime of the language takes to start in the
+        sandbox (e.g. the JVM) is measured and reported in the feedback, apart from the time of the test cases.
+        - python_zygote (bool or list): Whether the Python codes are forked from an interpreter that already
+        imported the common modules, instead of starting a new one for each test case (check 'batch_driver.py').
+        It only applies when the test cases are run in batch. A list value is also used as the modules imported.
+        It is disabled by default, as a program can tell the zygote apart from a new interpreter (check
+        'batch_driver.py').
+        - java_runtime_profile (bool or dict): Whether the Java codes are run with the flags of a runtime profile,
+        which also sizes the heap from the memory limit (check 'java_runtime_profiles.py'), instead of the default
+        flags of the JVM. A dict value is also used as the options of the profile (check 'JavaRuntimeProfile').
     """
 
     def __init__(self, submission_request, options):
@@ -40,12 +97,32 @@ class SimpleGrader(BaseGrader):
         self.diff_tool = Diff(options)
         self.output_diff_for = set(options.get("output_diff_for", []))
         self.check_output = options.get('check_output', gutils.check_output)
+        self.checker_name = options.get('checker', 'exact')
+        self.checker = checkers.get_checker_from_name(self.checker_name)
+        self.checker_options = options.get('checker_options', {})
         self.time_limit = options.get('time_limit', 2)
         self.hard_time_limit = options.get('hard_time_limit', self.time_limit)
         self.output_limit = options.get('output_limit', (2 ** 20) * 2)
         self.memory_limit = options.get('memory_limit', 50)
         self.response_type = options.get('response_type','json')
         self.ignore_presentation_error = options.get("ignore_presentation_error", False)
+        self.parallel_tests = options.get("parallel_tests", False)
+        self.batch_tests = options.get("batch_tests", False)
+        self.pipeline_tests = options.get("pipeline_tests", False)
+        self.streaming_comparison = options.get("streaming_comparison", False) and \
+            self.check_output is gutils.check_output
+        self.stderr_capture_size = options.get("stderr_capture_size", (2 ** 10) * 16)
+        self.feedback_budget = options.get("feedback_budget", None)
+        self.max_failures = options.get("max_failures", None)
+        self.stop_on_time_limit = options.get("stop_on_time_limit", False)
+        self.deduplicate_inputs = options.get("deduplicate_inputs", False)
+        self.report_startup_overhead = options.get("report_startup_overhead", False)
+        self.python_zygote = options.get("python_zygote", False)
+        self.java_runtime_profile = options.get("java_runtime_profile", False)
+        self.failure_statistics = None
+        if options.get("order_tests_by_failure", False):
+            self.failure_statistics = FailureStatistics(
+                options.get("failure_statistics_file", DEFAULT_STATISTICS_FILENAME))
 
     def create_project(self):
         """
@@ -56,7 +133,7 @@ class SimpleGrader(BaseGrader):
             and can be given specific test cases for the grading of the source code
         """
         request = self.submission_request
-        project_factory = projects.get_factory_from_name(request.language_name)
+        project_factory = self._get_project_factory()
         if request.problem_type == 'code_multiple_languages':
             project = project_factory.create_from_code(request.code)
             return project
@@ -90,7 +167,7 @@ class SimpleGrader(BaseGrader):
             project = project_factory.create_from_directory(project_directory)
             return project
 
-    def grade(self, test_cases, weights=None, set_feedback=set_feedback):
+    def grade(self, test_cases, weights=None, set_feedback=set_feedback, subtasks=None):
         """
         This method grades the student's source code against some specific test cases
 
@@ -98,9 +175,18 @@ class SimpleGrader(BaseGrader):
             test_cases (list of tuples): A list containing a tuples with a pair of string. The name
             of the input file and name of the expected output file of each test case.
             weights (list): List of integers describing the importance of each test case
+            subtasks (list of dicts): Optional all-or-nothing groups of test cases, which replace the weights
+            (check '_run_subtasks'). Each group is a dict with its 'name', the indices of its 'test_cases',
+            its 'score' and optionally the names of the groups it 'depends_on', which must come before it.
         """
         project = self.create_project()
-        results, debug_info = self._run_code_against_all_test_cases(project, test_cases)
+        results, debug_info = self._run_code_against_all_test_cases(project, test_cases, subtasks)
+        if self.feedback_budget is not None:
+            apply_feedback_budget(debug_info, [input_filename for input_filename, _ in test_cases],
+                                  self.feedback_budget)
+        # With a feedback budget, the debug info is stored once, in the feedback, and the custom values only
+        # keep a reference to it
+        debug_info_reference = None
 
         # Check for errors in run
         if GraderResult.COMPILATION_ERROR in results:
@@ -109,8 +195,8 @@ class SimpleGrader(BaseGrader):
         else:
             # Generate feedback string for tests format based with response type
             res_type = self.response_type
-            # Saving feedback as json
-            if res_type == 'json':
+            # Saving feedback as json, or in its compact encoding
+            if res_type in ('json', 'compact'):
                 feedback_list_json = []
                 for i, result in enumerate(results):
                     test_case = test_cases[i]
@@ -129,11 +215,15 @@ class SimpleGrader(BaseGrader):
                 feedback_list_json.append(options_for_feedback)
                 # We also save the debug info for the feedback
                 feedback_list_json.append(debug_info)
+                if self.feedback_budget is not None:
+                    debug_info_reference = {"reference": "feedback"}
                 # Converting the list to a json format string
                 # The json object always have this structure on multilang
                 # [ feedback_obj_test_case_1 , ... , feedback_obj_test_case_n , options_for_feedback , debug_info ]
-                feedback_str_json = json.dumps(feedback_list_json)
-                feedback_str = feedback_str_json
+                if res_type == 'json':
+                    feedback_str = json.dumps(feedback_list_json)
+                else:
+                    feedback_str = encode_compact_feedback(feedback_list_json)
             #Saving feedback as rst
             elif res_type == 'rst':
                 feedback_list_rst = []
@@ -146,8 +236,11 @@ class SimpleGrader(BaseGrader):
                 feedback_str = feedback_str_rst
             
         # Create the feedback_info dict and assign the string depend on the response type
-        feedback_info = self._generate_feedback_info(results, debug_info, weights, test_cases)
+        feedback_info = self._generate_feedback_info(results, debug_info_reference or debug_info, weights, test_cases,
+                                                     subtasks)
         feedback_info['global']['feedback'] = feedback_str
+        if self.report_startup_overhead:
+            feedback_info['custom']['startup_overhead'] = self._measure_startup_overhead()
 
         set_feedback(feedback_info)
 
@@ -159,15 +252,15 @@ class SimpleGrader(BaseGrader):
         results = {}
 
         try:
-            return_code, stdout, stderr = self._run_custom_input_project(project)
-            results = self._generate_custom_input_feedback_info(return_code, stdout, stderr)
+            return_code, stdout, stderr, stdout_size = self._run_custom_input_project(project)
+            results = self._generate_custom_input_feedback_info(return_code, stdout, stderr, stdout_size)
         except projects.BuildError as e:
             results = self._construct_compilation_error_feedback_info(e)
 
         # Return feedback
         set_feedback(results)
 
-    def _run_code_against_all_test_cases(self, project, test_cases):
+    def _run_code_against_all_test_cases(self, project, test_cases, subtasks=None):
         """
         This method runs the code against all the test cases and returns a list containing
         the results and dictionary containing information for debugging.
@@ -175,6 +268,7 @@ class SimpleGrader(BaseGrader):
         Args:
             project (obj): An instance of Project (an abstraction of runnable code)
             test_cases (list): A list containing the pairs input filename and expected output filename as tuples.            
+            subtasks (list): Optional groups of test cases, as given to grade().
 
 
         Returns:
@@ -187,16 +281,24 @@ class SimpleGrader(BaseGrader):
         debug_info = {}
 
         try:
+            if self.deduplicate_inputs:
+                project = projects.DeduplicatedProject(project, [input_filename for input_filename, _ in test_cases])
             project.build()
 
             debug_info["files_feedback"] = {}
-            for input_filename, exp_output_filename in test_cases:
-                grader_result, test_case_debug_info = self._run_code_against_test_case(project, input_filename,
-                                                                                       exp_output_filename)
+            if subtasks:
+                test_cases_results = self._run_subtasks(project, test_cases, subtasks)
+            else:
+                test_cases_results = self._run_test_cases(project, test_cases, **self._get_stop_options())
 
+            # Results are stored in the order of the test cases, so the feedback is always the same
+            for (input_filename, _), (grader_result, test_case_debug_info) in zip(test_cases, test_cases_results):
                 debug_info["files_feedback"][input_filename] = test_case_debug_info
                 grader_results.append(grader_result)
 
+            if self.failure_statistics is not None:
+                self._update_failure_statistics(test_cases, grader_results)
+
         except projects.BuildError as e:
             debug_info["compilation_output"] = e.compilation_output
 
@@ -204,6 +306,373 @@ class SimpleGrader(BaseGrader):
 
         return grader_results, debug_info
 
+    def _run_test_cases(self, project, test_cases, **stop_options):
+        """
+        This method runs the test cases in parallel, in batch or one by one, according to the options of
+        the grader, stopping early as given by the stop_options (check '_stop_early'). The test cases most
+        likely to fail are run first when the failure statistics are enabled.
+
+        Args:
+            project (obj): An instance of Project (an abstraction of runnable code)
+            test_cases (list): A list containing the pairs input filename and expected output filename as tuples.
+
+        Returns:
+            A list with the pairs (grader_result, debug_info) in the same order of the test cases.
+        """
+        if self.failure_statistics is None:
+            return self._run_test_cases_in_given_order(project, test_cases, **stop_options)
+
+        order = self.failure_statistics.sort_by_failure_probability(test_cases)
+        ordered_results = self._run_test_cases_in_given_order(project, [test_cases[index] for index in order],
+                                                              **stop_options)
+        test_cases_results = [None] * len(test_cases)
+        for index, test_case_result in zip(order, ordered_results):
+            test_cases_results[index] = test_case_result
+        return test_cases_results
+
+    def _run_test_cases_in_given_order(self, project, test_cases, **stop_options):
+        """ Runs the test cases in the given order (check '_run_test_cases') """
+        if not test_cases:
+            # E.g. the remaining test cases of the subtasks, when all of them are in a subtask
+            return []
+        elif self.parallel_tests:
+            return self._run_test_cases_in_parallel(project, test_cases, **stop_options)
+        elif self.batch_tests:
+            # All the test cases are run in the same session, so the grading can only stop after it
+            return self._stop_early(self._run_test_cases_in_batch(project, test_cases), len(test_cases),
+                                    **stop_options)
+
+        elif self.pipeline_tests:
+            # Closing the pipeline stops its stages, so only a few test cases are run after the grading stops
+            with closing(self._run_test_cases_in_pipeline(project, test_cases)) as test_cases_results:
+                return self._stop_early(test_cases_results, len(test_cases), **stop_options)
+
+        # The test cases are run lazily, so no test case is run once the grading stops early
+        return self._stop_early((self._run_code_against_test_case(project, input_filename, exp_output_filename)
+                                 for input_filename, exp_output_filename in test_cases), len(test_cases),
+                                **stop_options)
+
+    def _run_subtasks(self, project, test_cases, subtasks):
+        """
+        This method runs the test cases by subtasks, in order (check '_get_passed_subtasks'). Once a test case
+        of a subtask fails, the rest of its test cases are not run, as well as the ones of the subtasks that
+        depend on it, and they are marked as NOT_RUN. The test cases that are not in any subtask are run at
+        the end.
+
+        Args:
+            project (obj): An instance of Project (an abstraction of runnable code)
+            test_cases (list): A list containing the pairs input filename and expected output filename as tuples.
+            subtasks (list): The groups of test cases, as given to grade().
+
+        Returns:
+            A list with the pairs (grader_result, debug_info) in the same order of the test cases.
+        """
+        _check_subtasks(subtasks, len(test_cases))
+        stop_options = self._get_stop_options()
+        results_by_index = {}
+        passed_subtasks = set()
+        failures = 0
+        stopped = False
+
+        for subtask in subtasks:
+            indices = subtask["test_cases"]
+            pending_indices = [index for index in indices if index not in results_by_index]
+            # A test case shared with a previous subtask might have failed already
+            can_pass = set(subtask.get("depends_on", [])) <= passed_subtasks and \
+                all(results_by_index[index][0] == GraderResult.ACCEPTED for index in indices
+                    if index in results_by_index)
+            if can_pass and not stopped:
+                pending_results = self._run_test_cases(project, [test_cases[index] for index in pending_indices],
+                                                       max_failures=1)
+            else:
+                pending_results = [(GraderResult.NOT_RUN, {}) for _ in pending_indices]
+            results_by_index.update(zip(pending_indices, pending_results))
+
+            if can_pass and all(results_by_index[index][0] == GraderResult.ACCEPTED for index in indices):
+                passed_subtasks.add(subtask["name"])
+
+            # The fail-fast options apply to the whole grading
+            for grader_result, _ in pending_results:
+                if grader_result not in (GraderResult.ACCEPTED, GraderResult.NOT_RUN):
+                    failures += 1
+                    stopped = stopped or _must_stop(grader_result, failures, **stop_options)
+
+        remaining_indices = [index for index in range(len(test_cases)) if index not in results_by_index]
+        if stopped:
+            remaining_results = [(GraderResult.NOT_RUN, {}) for _ in remaining_indices]
+        else:
+            if stop_options.get("max_failures") is not None:
+                stop_options["max_failures"] -= failures
+            remaining_results = self._run_test_cases(project, [test_cases[index] for index in remaining_indices],
+                                                     **stop_options)
+        results_by_index.update(zip(remaining_indices, remaining_results))
+
+        return [results_by_index[index] for index in range(len(test_cases))]
+
+    def _update_failure_statistics(self, test_cases, grader_results):
+        """ Adds the results of the grading to the failure statistics of the task and stores them """
+        self.failure_statistics.record(test_cases, grader_results)
+        try:
+            self.failure_statistics.save()
+        except OSError:
+            # The statistics are only an optimization, so the grading goes on if they cannot be stored
+            pass
+
+    def _get_stop_options(self):
+        """ Returns the options to stop the grading early (check '_stop_early'), which do not apply to staff """
+        if self.submission_request.is_staff:
+            return {}
+        return {"max_failures": self.max_failures, "stop_on_time_limit": self.stop_on_time_limit}
+
+    def _run_test_cases_in_parallel(self, project, test_cases, **stop_options):
+        """
+        This method runs the test cases on a bounded pool of workers, sized from the container's CPU quota
+        and the memory limit of each run.
+
+        Args:
+            project (obj): An instance of Project (an abstraction of runnable code)
+            test_cases (list): A list containing the pairs input filename and expected output filename as tuples.
+
+        Returns:
+            A list with the pairs (grader_result, debug_info) in the same order of the test cases.
+        """
+        # A boolean only enables the parallel mode, an integer also bounds the amount of workers
+        max_workers = None if isinstance(self.parallel_tests, bool) else int(self.parallel_tests)
+        workers = gutils.compute_parallel_workers(self.memory_limit, max_workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if self.batch_tests:
+                # Each worker runs a contiguous chunk of test cases in a single batched session
+                chunk_size = -(-len(test_cases) // workers)
+                chunks = [test_cases[i:i + chunk_size] for i in range(0, len(test_cases), chunk_size)]
+                chunks_results = executor.map(lambda chunk: self._run_test_cases_in_batch(project, chunk), chunks)
+                return self._stop_early([test_case_result for chunk_results in chunks_results
+                                         for test_case_result in chunk_results], len(test_cases), **stop_options)
+
+            futures = [executor.submit(self._run_code_against_test_case, project, *test_case)
+                       for test_case in test_cases]
+            test_cases_results = self._stop_early((future.result() for future in futures), len(test_cases),
+                                                  **stop_options)
+            # The test cases after the one that stopped the grading are not run if they did not start yet
+            for future in futures:
+                future.cancel()
+            return test_cases_results
+
+    def _run_test_cases_in_batch(self, project, test_cases):
+        """
+        This method runs the test cases in a single batched run of the project (check 'Project.run_many'),
+        so the sandbox is started once for all of them.
+
+        Args:
+            project (obj): An instance of Project (an abstraction of runnable code)
+            test_cases (list): A list containing the pairs input filename and expected output filename as tuples.
+
+        Returns:
+            A list with the pairs (grader_result, debug_info) in the same order of the test cases.
+        """
+        with ExitStack() as stack:
+            # The inputs are given as bytes, as the file descriptor is given to an unbatched run
+            input_files = [stack.enter_context(open(input_filename, 'rb')) for input_filename, _ in test_cases]
+            stdout_sinks = [stack.enter_context(self._create_stdout_sink(expected_output_filename))
+                            for _, expected_output_filename in test_cases]
+            capture_options = [self._get_capture_options(stdout_sink) for stdout_sink in stdout_sinks]
+
+            run_results = project.run_many(input_files, capture_options=capture_options,
+                                           **self._get_run_student_flags())
+
+            return [self._evaluate_test_case(input_filename, expected_output_filename, *run_result, stdout_sink)
+                    for (input_filename, expected_output_filename), run_result, stdout_sink in
+                    zip(test_cases, run_results, stdout_sinks)]
+
+    def _run_test_cases_in_pipeline(self, project, test_cases):
+        """
+        This method runs the test cases in a pipeline of three stages connected by bounded queues: the runs of
+        the code (on a thread), the checks of the outputs (on another thread) and the rendering of the debug
+        information (check '_evaluate_test_case'), done as the results are taken. So the sandbox is kept busy
+        with the next test cases while the previous ones are checked.
+
+        When the results are not taken anymore and the generator is closed, the stages stop. The test cases that
+        were already run by then (at most the size of the queues) are discarded.
+
+        Args:
+            project (obj): An instance of Project (an abstraction of runnable code)
+            test_cases (list): A list containing the pairs input filename and expected output filename as tuples.
+
+        Returns:
+            A generator of the pairs (grader_result, debug_info) in the same order of the test cases.
+        """
+        queue_size = 1 if isinstance(self.pipeline_tests, bool) else int(self.pipeline_tests)
+        run_queue = queue.Queue(maxsize=queue_size)
+        check_queue = queue.Queue(maxsize=queue_size)
+        stopped = threading.Event()
+
+        def put(stage_queue, item):
+            """ Puts the item in the queue once there is room for it. Returns False if the pipeline stopped """
+            while not stopped.is_set():
+                try:
+                    stage_queue.put(item, timeout=_PIPELINE_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(stage_queue):
+            """ Takes the next item of the queue, or the end of the stage if the pipeline stopped """
+            while not stopped.is_set():
+                try:
+                    return stage_queue.get(timeout=_PIPELINE_POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            return _END_OF_STAGE
+
+        def run_stage():
+            try:
+                for input_filename, expected_output_filename in test_cases:
+                    if stopped.is_set():
+                        return
+                    stdout_sink = self._create_stdout_sink(expected_output_filename)
+                    try:
+                        with open(input_filename, 'r') as input_file:
+                            capture_options = self._get_capture_options(stdout_sink)
+                            run_result = project.run(input_file, capture_options=capture_options,
+                                                     **self._get_run_student_flags())
+                    except Exception:
+                        stdout_sink.close()
+                        raise
+                    if not put(run_queue, (stdout_sink, input_filename, expected_output_filename, run_result)):
+                        stdout_sink.close()
+                        return
+                put(run_queue, _END_OF_STAGE)
+            except Exception as e:
+                put(run_queue, e)
+
+        def check_stage():
+            while True:
+                item = get(run_queue)
+                if item is _END_OF_STAGE or isinstance(item, Exception):
+                    put(check_queue, item)
+                    return
+                stdout_sink, input_filename, expected_output_filename, (return_code, stdout, stderr) = item
+                try:
+                    check_result = self._check_test_case(expected_output_filename, return_code, stdout,
+                                                         stdout_sink)
+                except Exception as e:
+                    stdout_sink.close()
+                    put(check_queue, e)
+                    return
+                if not put(check_queue, (stdout_sink, input_filename, expected_output_filename, return_code,
+                                         stderr, check_result)):
+                    stdout_sink.close()
+                    return
+
+        stages = [threading.Thread(target=run_stage, daemon=True), threading.Thread(target=check_stage, daemon=True)]
+        for stage in stages:
+            stage.start()
+        try:
+            while True:
+                item = check_queue.get()
+                if item is _END_OF_STAGE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                stdout_sink, input_filename, expected_output_filename, return_code, stderr, check_result = item
+                result, checker_report = check_result
+                with stdout_sink:
+                    debug_info = self._render_debug_info(input_filename, expected_output_filename, result,
+                                                         return_code, stderr, stdout_sink, checker_report)
+                yield result, debug_info
+        finally:
+            stopped.set()
+            for stage in stages:
+                stage.join()
+            # The outputs of the test cases that were run after the grading stopped are released
+            for stage_queue in (run_queue, check_queue):
+                while not stage_queue.empty():
+                    item = stage_queue.get()
+                    if isinstance(item, tuple):
+                        item[0].close()
+
+    def _stop_early(self, test_cases_results, amount_of_test_cases, max_failures=None, stop_on_time_limit=False):
+        """
+        This method takes the results of the test cases, in order, until the grading must stop. The test cases
+        after it are marked as NOT_RUN.
+
+        Args:
+            test_cases_results (iterable): The pairs (grader_result, debug_info) of the test cases, in order. When
+            it is a generator, the test cases after the one that stopped the grading are never run.
+            amount_of_test_cases (int): The amount of test cases.
+            max_failures (int): Amount of failed test cases after which the grading stops, or None.
+            stop_on_time_limit (bool): Whether the grading stops after a test case exceeds the time limit.
+
+        Returns:
+            A list with the pairs (grader_result, debug_info) of all the test cases.
+        """
+        results = []
+        failures = 0
+        for grader_result, test_case_debug_info in test_cases_results:
+            results.append((grader_result, test_case_debug_info))
+            if grader_result != GraderResult.ACCEPTED:
+                failures += 1
+            if _must_stop(grader_result, failures, max_failures, stop_on_time_limit):
+                break
+
+        return results + [(GraderResult.NOT_RUN, {}) for _ in range(amount_of_test_cases - len(results))]
+
+    def _create_stdout_sink(self, expected_output_filename):
+        """
+        Returns the sink that receives the standard output of a run (check 'output_streams.py'): a
+        StreamingComparator that compares it against the expected output file while it is produced, or
+        a SpooledOutput that keeps it as bytes, moving it to disk when it is long.
+        """
+        if self.streaming_comparison:
+            return StreamingComparator(expected_output_filename, self.checker_name, self.checker_options,
+                                       max_diff_length=DIFF_MAX_LENGTH)
+        return SpooledOutput()
+
+    def _get_capture_options(self, stdout_sink=None):
+        """
+        Returns the options to capture the output of a run (check '_run_in_sandbox' in 'projects.py'). The
+        output limit is enforced while the output is read, and only the beginning and the end of the stderr
+        are kept, so a long output is never kept in memory.
+        """
+        capture_options = {
+            "output_limit": self.output_limit,
+            "stderr_sink": HeadTailBuffer(self.stderr_capture_size, self.stderr_capture_size)
+        }
+        if stdout_sink is not None:
+            capture_options["stdout_sink"] = stdout_sink
+        return capture_options
+
+    def _get_project_factory(self):
+        """ Returns the factory of the projects of the language of the submission, with the options of the task """
+        project_factory = projects.get_factory_from_name(self.submission_request.language_name)
+        if self.python_zygote and self.batch_tests and isinstance(project_factory, projects.PythonProjectFactory):
+            zygote_modules = self.python_zygote if isinstance(self.python_zygote, list) else None
+            project_factory = project_factory.with_zygote(zygote_modules)
+        if self.java_runtime_profile and isinstance(project_factory, projects.JavaProjectFactory):
+            runtime_profile = None
+            if isinstance(self.java_runtime_profile, dict):
+                runtime_profile = java_runtime_profiles.JavaRuntimeProfile(**self.java_runtime_profile)
+            project_factory = project_factory.with_runtime_profile(runtime_profile)
+        return project_factory
+
+    def _measure_startup_overhead(self):
+        """
+        Returns the time in seconds that the runtime of the language takes to start in the sandbox (check
+        'JavaProjectFactory.measure_startup_overhead'), or None if it is not measured for the language.
+        """
+        project_factory = self._get_project_factory()
+        if not hasattr(project_factory, "measure_startup_overhead"):
+            return None
+        return project_factory.measure_startup_overhead(**self._get_run_student_flags())
+
+    def _get_run_student_flags(self):
+        """ Returns the limits given to the sandbox on each run of the student's code """
+        time = self.time_limit
+        hard_time = self.time_limit
+        memory = self.memory_limit
+        return {"time": time, "memory": memory, "hard-time": hard_time}
+
     def _run_code_against_test_case(self, project, input_filename, expected_output_filename):
         """
         This method computes the results and debug information of an specific
@@ -219,59 +688,157 @@ class SimpleGrader(BaseGrader):
             of zero return code. Check 'results.py')
             And the debug information in the execution.
         """
-        with open(input_filename, 'r') as input_file, open(expected_output_filename, 'r') as expected_output_file:
-            time = self.time_limit
-            hard_time = self.time_limit
-            memory = self.memory_limit
-            return_code, stdout, stderr = project.run(input_file,
-                                                      **{"time": time, "memory": memory, "hard-time": hard_time})
-            stderr = remove_sockets_exception(stderr)
-            stderr = cut_stderr(stderr)
-            expected_output = expected_output_file.read()
-            # In case the stdout takes more memory than the output limit. It sets the stdout to free up memory
-            # and avoid memory leaks.
-            if getsizeof(stdout) > self.output_limit:
-                stdout = ""
-                # Call the garbage collector to reduce memory usage
-                gc.collect()
-                result = GraderResult.OUTPUT_LIMIT_EXCEEDED
-            elif return_code == 0:
-                output_matches = self.check_output(stdout, expected_output)
-                if output_matches:
+        with self._create_stdout_sink(expected_output_filename) as stdout_sink, \
+                open(input_filename, 'r') as input_file:
+            capture_options = self._get_capture_options(stdout_sink)
+            return_code, stdout, stderr = project.run(input_file, capture_options=capture_options,
+                                                      **self._get_run_student_flags())
+            return self._evaluate_test_case(input_filename, expected_output_filename, return_code, stdout, stderr,
+                                            stdout_sink)
+
+    def _evaluate_test_case(self, input_filename, expected_output_filename, return_code, stdout, stderr,
+                            stdout_sink):
+        """
+        This method computes the result and debug information of a test case from the output
+        of a run of the source code.
+
+        Args:
+            input_filename (str): Name of the input file in the test case.
+            expected_output_filename (str): Name of the output file in the test case.
+            return_code (int): The return code of the run.
+            stdout (str): The standard output of the run, as returned by the project.
+            stderr (str): The standard error of the run.
+            stdout_sink (obj): The sink that received the standard output of the run (check
+            '_create_stdout_sink'). Only the slices of the output shown in the feedback are decoded from it.
+
+        Returns:
+            The result of the test case (check 'results.py') and the debug information in the execution.
+        """
+        result, checker_report = self._check_test_case(expected_output_filename, return_code, stdout, stdout_sink)
+        debug_info = self._render_debug_info(input_filename, expected_output_filename, result, return_code, stderr,
+                                             stdout_sink, checker_report)
+        return result, debug_info
+
+    def _check_test_case(self, expected_output_filename, return_code, stdout, stdout_sink):
+        """
+        This method computes the result of a test case from the output of a run of the source code
+        (check '_evaluate_test_case').
+
+        Returns:
+            A pair with the result of the test case and the report of the checker (or None).
+        """
+        if not stdout_sink.finished:
+            # The project did not stream its output, so it is received once it is complete
+            stdout_sink.write(stdout.encode())
+            stdout_sink.finish()
+        comparator = stdout_sink if isinstance(stdout_sink, StreamingComparator) else None
+
+        checker_report = None
+        if stdout_sink.size > self.output_limit:
+            result = GraderResult.OUTPUT_LIMIT_EXCEEDED
+        elif return_code == 0:
+            if comparator is not None:
+                result = comparator.result
+                checker_report = comparator.checker_report
+            elif self.check_output is gutils.check_output:
+                # The checker decides whether the output is accepted or has a presentation error in a single pass
+                result, checker_report = self._check_spooled_output(stdout_sink, expected_output_filename)
+            else:
+                # A custom check_output receives the complete outputs
+                stdout = stdout_sink.decode()
+                with open(expected_output_filename, 'r') as expected_output_file:
+                    expected_output = expected_output_file.read()
+
+                if self.check_output(stdout, expected_output):
                     result = GraderResult.ACCEPTED
-                elif is_presentation_error(stdout, expected_output):
-                    result = GraderResult.ACCEPTED if self.ignore_presentation_error else \
-                        GraderResult.PRESENTATION_ERROR
                 else:
-                    result = GraderResult.WRONG_ANSWER
-            elif self.treat_non_zero_as_runtime_error:
-                result = parse_non_zero_return_code(return_code)
+                    # The tokens are the same in a presentation error (check 'utils.is_presentation_error')
+                    different_token = find_first_different_token(stdout, expected_output)
+                    if different_token is None:
+                        result = GraderResult.PRESENTATION_ERROR
+                    else:
+                        result = GraderResult.WRONG_ANSWER
+                        checker_report = describe_different_token(stdout, expected_output, different_token)
+
+            if result == GraderResult.PRESENTATION_ERROR and self.ignore_presentation_error:
+                result = GraderResult.ACCEPTED
+        elif self.treat_non_zero_as_runtime_error:
+            result = parse_non_zero_return_code(return_code)
+        else:
+            result = GraderResult.WRONG_ANSWER
+
+        return result, checker_report
+
+    def _render_debug_info(self, input_filename, expected_output_filename, result, return_code, stderr, stdout_sink,
+                           checker_report=None):
+        """
+        This method computes the debug information of a checked test case (check '_evaluate_test_case'),
+        including the diff between the outputs when it is needed. The diff is computed only on the region of
+        the outputs around their first mismatch, so it is useful and cheap for outputs of any size.
+
+        Returns:
+            The debug information in the execution, which is empty for accepted test cases. Only the return
+            code is kept for the test cases whose debug information is not shown (check '_is_debug_info_visible').
+        """
+        debug_info = {}
+        if result == GraderResult.ACCEPTED:
+            return debug_info
+        if not self._is_debug_info_visible(input_filename):
+            return {"input_file": input_filename, "return_code": return_code}
+
+        stderr = remove_sockets_exception(stderr)
+        stderr = cut_stderr(stderr)
+        diff = None
+        client_diff = None
+        if self.generate_diff and (result == GraderResult.WRONG_ANSWER or
+                                   result == GraderResult.PRESENTATION_ERROR):
+            if isinstance(stdout_sink, StreamingComparator):
+                diff_window = stdout_sink.diff_window()
             else:
-                result = GraderResult.WRONG_ANSWER
-
-            debug_info = {}
-            if result != GraderResult.ACCEPTED:
-                diff = None
-                if self.generate_diff and (result == GraderResult.WRONG_ANSWER or
-                                           result == GraderResult.PRESENTATION_ERROR) and \
-                        (input_filename in self.output_diff_for or self.submission_request.is_staff):
-                    diff = html.escape(self.diff_tool.compute(stdout, expected_output))
-
-                # As output might be very long, store string of max 50 KBs.
-                _stdout_max_length = (2 ** 10) * 50
-                stdout = gutils.reduce_text(stdout, _stdout_max_length)
-                debug_info.update({
-                    "input_file": input_filename,
-                    "stdout": html.escape(stdout),
-                    "stderr": html.escape(stderr),
-                    "return_code": return_code,
-                    "diff": diff,
-                })
-                gc.collect()
-
-            return result, debug_info
-
-    def _generate_feedback_info(self, results, debug_info, weights, test_cases):
+                diff_window = stdout_sink.diff_window(expected_output_filename, max_length=DIFF_MAX_LENGTH)
+            if self.diff_tool.client_side_diff:
+                client_diff = self.diff_tool.client_diff(diff_window, expected_output_filename)
+            else:
+                diff = html.escape(self.diff_tool.compute(*diff_window))
+
+        # As output might be very long, store string of max 50 KBs.
+        _stdout_max_length = (2 ** 10) * 50
+        stdout = "" if result == GraderResult.OUTPUT_LIMIT_EXCEEDED else stdout_sink.getvalue()
+        stdout = gutils.reduce_text(stdout, _stdout_max_length)
+        debug_info.update({
+            "input_file": input_filename,
+            "stdout": html.escape(stdout),
+            "stderr": html.escape(stderr),
+            "return_code": return_code,
+            "diff": diff,
+            "client_diff": client_diff,
+            "checker_report": html.escape(checker_report) if checker_report is not None else None,
+        })
+
+        return debug_info
+
+    def _is_debug_info_visible(self, input_filename):
+        """
+        Whether the debug information of the test case is shown to the viewer of the feedback: the staff
+        sees it for all the test cases, the students only for the ones in output_diff_for.
+        """
+        return input_filename in self.output_diff_for or bool(self.submission_request.is_staff)
+
+    def _check_spooled_output(self, stdout_sink, expected_output_filename):
+        """
+        Checks the output kept by a SpooledOutput against the expected output file, chunk by chunk, with
+        the checker of the grader. Returns a pair with the result and the report of the checker.
+        """
+        with open(expected_output_filename, 'rb') as expected_output_file:
+            # The line breaks are normalized as the expected output file was read in text mode, but the
+            # output of the program is compared as it is
+            checker = self.checker(normalize_newlines(expected_output_file.read()), **self.checker_options)
+        for chunk in stdout_sink.iter_chunks():
+            checker.write(chunk)
+        checker.finish()
+        return checker.result, checker.report()
+
+    def _generate_feedback_info(self, results, debug_info, weights, test_cases, subtasks=None):
         """
         This method generates a dictionary containing the information for the feedback
         setting function (check 'feedback_tools.py')
@@ -282,6 +849,8 @@ class SimpleGrader(BaseGrader):
             of the test cases.
             - weights (list): List of integers containing the importance of the nth-test
             - test_cases (list): List of pairs of filenames. i.e (input_filename, expected_output_filename)
+            - subtasks (list): Optional groups of test cases, as given to grade(). When they are given, the
+            score is the sum of the scores of the passed subtasks instead of the weights.
         """
 
         if weights is None:
@@ -290,8 +859,16 @@ class SimpleGrader(BaseGrader):
         feedback_info = {'global': {}, 'custom': {}}
 
         passing = sum(1 for result in results if result == GraderResult.ACCEPTED)
-        score = sum(weights[i] for i, result in enumerate(results) if result == GraderResult.ACCEPTED)
-        total_sum = sum(weights)
+        if subtasks:
+            passed_subtasks = _get_passed_subtasks(subtasks, results)
+            score = sum(subtask["score"] for subtask in subtasks if subtask["name"] in passed_subtasks)
+            total_sum = sum(subtask["score"] for subtask in subtasks)
+            feedback_info['custom']['subtasks'] = json.dumps(
+                [{"name": subtask["name"], "score": subtask["score"], "passed": subtask["name"] in passed_subtasks}
+                 for subtask in subtasks])
+        else:
+            score = sum(weights[i] for i, result in enumerate(results) if result == GraderResult.ACCEPTED)
+            total_sum = sum(weights)
 
         summary_result = gutils.compute_summary_result(results)
 
@@ -312,25 +889,30 @@ class SimpleGrader(BaseGrader):
             (check 'projects.py').
 
         Returns:
-            The return code, standard output and standard error files.
+            The return code, standard output and standard error files, and the number of bytes written to
+            the standard output.
         """
         # Create a file with the custom input
         custom_input_filename = 'custom_input.txt'
         with open(custom_input_filename, 'w') as input_file:
             input_file.write(self.submission_request.custom_input)
-        with open(custom_input_filename, 'r') as input_file:
+        # Only the beginning of the output is shown, so the rest of it is never decoded
+        with open(custom_input_filename, 'r') as input_file, \
+                SpooledOutput(head_size=_CUSTOM_INPUT_STDOUT_MAX_LENGTH) as stdout_sink:
             try:
                 project.build()
-                time = self.time_limit
-                hard_time = self.time_limit
-                memory = self.memory_limit
                 return_code, stdout, stderr = project.run(input_file,
-                                                          **{"time": time, "memory": memory, "hard-time": hard_time})
-                return return_code, stdout, stderr
+                                                          capture_options=self._get_capture_options(stdout_sink),
+                                                          **self._get_run_student_flags())
+                if not stdout_sink.finished:
+                    # The project did not stream its output, so it is received once it is complete
+                    stdout_sink.write(stdout.encode())
+                    stdout_sink.finish()
+                return return_code, stdout, stderr, stdout_sink.size
             except projects.BuildError as e:
                 raise
 
-    def _generate_custom_input_feedback_info(self, return_code, stdout, stderr):
+    def _generate_custom_input_feedback_info(self, return_code, stdout, stderr, stdout_size=0):
         """
         This method generates a dictionary with the information for setting the 
         feedback information (check 'feedback_tools.py').
@@ -339,18 +921,18 @@ class SimpleGrader(BaseGrader):
             - return_code (int): The return code after running a project (abstraction of code)
             - stdout (str): The contents of the standard output after running a project.
             - stderr (str): The contents of the standard error after running a project.
+            - stdout_size (int): The number of bytes written to the standard output, which is more than
+            the length of stdout when the output was cut.
 
         Returns:
             A dictionary containing the information for the feedback.
         """
 
         feedback_info = {'global': {}, 'custom': {}}
-        # In case the stdout takes more memory than the output limit. It sets the stdout to free up memory
-        # and avoid memory leaks.
-        if getsizeof(stdout) > self.output_limit:
+        # The output of the program is cut at the output limit (check 'projects.read_stream'), so only its size
+        # tells whether the limit was exceeded
+        if stdout_size > self.output_limit:
             stdout = ""
-            # Call the garbage collector to reduce memory usage
-            gc.collect()
             feedback_info['global']['return'] = GraderResult.OUTPUT_LIMIT_EXCEEDED
             feedback_info['global']['feedback'] = gutils.html_to_rst(
                 _("Your code exceeded the output limit") + ": <strong>%s</strong>" % feedback_info['global'][
@@ -364,10 +946,8 @@ class SimpleGrader(BaseGrader):
             feedback_info['global']['feedback'] = gutils.html_to_rst(
                 _("Your code did not run successfully") + ": <strong>%s</strong>" % (
                     feedback_info['global']['return'].name,))
-        # Output length will be 80 KBs at most.
-        _stdout_max_length = (2 ** 10) * 80
-        feedback_info['custom']['stdout'] = gutils.reduce_text(stdout,
-                                                               _stdout_max_length, _("Long output, it was reduced."))
+        feedback_info['custom']['stdout'] = gutils.reduce_text(stdout, _CUSTOM_INPUT_STDOUT_MAX_LENGTH,
+                                                               _("Long output, it was reduced."))
         feedback_info['custom']['stderr'] = remove_sockets_exception(stderr)
 
         feedback_info['global']['result'] = "success" if feedback_info['global'][
@@ -401,7 +981,39 @@ class SimpleGrader(BaseGrader):
         return feedback_info
 
 
-def handle_problem_action(problem_id, test_cases, options={}, weights=None, language_name=None):
+def _must_stop(grader_result, failures, max_failures=None, stop_on_time_limit=False):
+    """ Returns whether the grading must stop after a test case with the given result """
+    return max_failures is not None and failures >= max_failures or \
+        stop_on_time_limit and grader_result == GraderResult.TIME_LIMIT_EXCEEDED
+
+
+def _check_subtasks(subtasks, amount_of_test_cases):
+    """ Raises ValueError if the given subtasks (check 'SimpleGrader.grade') are not valid """
+    names = set()
+    for subtask in subtasks:
+        if any(index not in range(amount_of_test_cases) for index in subtask["test_cases"]):
+            raise ValueError("Subtask %s has a test case out of range" % subtask["name"])
+        if not set(subtask.get("depends_on", [])) <= names:
+            raise ValueError("Subtask %s depends on a subtask that is not defined before it" % subtask["name"])
+        if subtask["name"] in names:
+            raise ValueError("Subtask %s is defined twice" % subtask["name"])
+        names.add(subtask["name"])
+
+
+def _get_passed_subtasks(subtasks, results):
+    """
+    Returns the set of names of the passed subtasks. A subtask is passed when all its test cases were
+    accepted and all the subtasks it depends on were passed.
+    """
+    passed_subtasks = set()
+    for subtask in subtasks:
+        if set(subtask.get("depends_on", [])) <= passed_subtasks and \
+                all(results[index] == GraderResult.ACCEPTED for index in subtask["test_cases"]):
+            passed_subtasks.add(subtask["name"])
+    return passed_subtasks
+
+
+def handle_problem_action(problem_id, test_cases, options={}, weights=None, language_name=None, subtasks=None):
     """
     Decides whether to grade the given problem against the test cases, or run it against a
     user-provided custom input according to the task action. If language_name is None, it will be
@@ -413,12 +1025,13 @@ def handle_problem_action(problem_id, test_cases, options={}, weights=None, lang
     language_name: The name of the language that the code is written in. If None, it will be
         extracted from the problem with id problem_id.
     weights: grade().
+    subtasks: grade().
     options: Diff class.
     """
 
     sub_req = SubmissionRequest(problem_id, language_name)
     simple_grader = SimpleGrader(sub_req, options)
     if sub_req.action == "submit":
-        simple_grader.grade(test_cases, weights)
+        simple_grader.grade(test_cases, weights, subtasks=subtasks)
     elif sub_req.action == "customtest":
         simple_grader.run_custom_input()
@@ -1,18 +1,23 @@
+from itertools import zip_longest
 import re
 
+_TOKEN_REGEX = re.compile(r"[^ \r\t\n]+")
+
+_SOCKET_EXCEPTION_REGEX = re.compile(
+    r"^Exception ignored in: <bound method Socket\.__del__ of <zmq\.sugar\.socket\.Socket.*", re.MULTILINE)
+
 
 def remove_sockets_exception(stderr):
+    """Removes the stderr from the first line reporting an ignored exception of a zmq socket"""
     if not stderr:
         return stderr
-    stderr = stderr.split('\n')
-    start_exception_regex = r"Exception ignored in: <bound method Socket\.__del__ of <zmq\.sugar\.socket\.Socket.*"
-    start_exception_index = len(stderr)
-    for i, line in enumerate(stderr):
-        if re.match(start_exception_regex, line):
-            start_exception_index = i
-            break
 
-    return "\n".join([line for i, line in enumerate(stderr) if i < start_exception_index])
+    match = _SOCKET_EXCEPTION_REGEX.search(stderr)
+    if match is None:
+        return stderr
+
+    # The line break before the exception is removed as well
+    return stderr[:max(0, match.start() - 1)]
 
 
 def cut_stderr(stderr):
@@ -30,11 +35,52 @@ def cut_stderr(stderr):
     return "\n".join(stderr_lines)
 
 
+def iter_tokens(text):
+    """
+    Generates the tokens of the text, split by the delimiters: space, \r, \t, and \n, without building a list
+    of them. Each token is given as a pair of its position in the text and the token itself.
+    """
+    for match in _TOKEN_REGEX.finditer(text):
+        yield match.start(), match.group()
+
+
+def find_first_different_token(stdout, expected_output):
+    """
+    Walks the tokens of both texts in parallel (check 'iter_tokens'), stopping at the first different token.
+
+    :param stdout: the test case's output after running the code.
+    :param expected_output: expected output of the corresponding test case.
+    :return: None if both texts have the same tokens. Otherwise, a pair with the positions of the first different
+        token in the stdout and in the expected output. When one of the texts has fewer tokens, its position is
+        its length.
+    """
+    missing_token = (None, None)
+    for (stdout_position, token_stdout), (expected_position, token_expected_output) in \
+            zip_longest(iter_tokens(stdout), iter_tokens(expected_output), fillvalue=missing_token):
+        if token_stdout != token_expected_output:
+            return (len(stdout) if stdout_position is None else stdout_position,
+                    len(expected_output) if expected_position is None else expected_position)
+
+    return None
+
+
+def describe_different_token(stdout, expected_output, positions):
+    """
+    Returns a description of the first different token of both texts, given its positions (check
+    'find_first_different_token'), with the number of the line where it is in each text.
+    """
+    stdout_position, expected_position = positions
+    return "First different token: line %d of the output, line %d of the expected output." % (
+        stdout.count("\n", 0, stdout_position) + 1, expected_output.count("\n", 0, expected_position) + 1)
+
+
 def is_presentation_error(stdout, expected_output):
     """
 
     Tokenize the texts by splitting the texts with multiple delimiters: space, \r, \t, and \n. Resulting empty strings
-    are ignored. That way, the comparison of the two generated lists is done only with the actual answers.
+    are ignored. That way, the comparison of the two generated tokens is done only with the actual answers. The
+    tokens are generated lazily and the comparison stops at the first different token (check
+    'find_first_different_token').
 
     A presentation error is considered when the data in the output is correct, but it is not correctly formatted.
     Therefore, both outputs, the `stdout` and `expected_output`, must have the same tokens.
@@ -47,19 +93,4 @@ def is_presentation_error(stdout, expected_output):
     :param expected_output: expected output of the corresponding test case.
     :return: Boolean value indicating if there is presentation error or not.
     """
-    tokens_stdout = [token for token in re.split("[ \r\t\n]", stdout) if token]
-    tokens_expected_output = [token for token in re.split("[ \r\t\n]", expected_output) if token]
-
-    if len(tokens_stdout) != len(tokens_expected_output):
-        return False
-
-    idx_token_expected_output = 0
-    for token_stdout in tokens_stdout:
-        token_expected_output = tokens_expected_output[idx_token_expected_output]
-
-        if token_stdout != token_expected_output:
-            return False
-
-        idx_token_expected_output += 1
-
-    return True
+    return find_first_different_token(stdout, expected_output) is None
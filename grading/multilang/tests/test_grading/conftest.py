@@ -1,21 +1,14 @@
 import pytest
-import subprocess
 from unittest import mock
 
 
 @pytest.fixture
 def fake_sandbox():
-    def run_command(command, **subprocess_options):
-        if '--share-network' in command:
-            command.remove('--share-network')
-        completed_process = subprocess.run(command, stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE, **subprocess_options)
+    def sandbox_command(command):
+        # Drop the run_student flags given before the command to run
+        while command and command[0].startswith('--'):
+            command = command[1:] if command[0] == '--share-network' else command[2:]
+        return command
 
-        stdout = completed_process.stdout.decode()
-        stderr = completed_process.stderr.decode()
-        return_code = completed_process.returncode
-
-        return return_code, stdout, stderr
-
-    with mock.patch('grading.projects._run_in_sandbox', run_command):
+    with mock.patch('grading.projects._get_sandbox_command', sandbox_command):
         yield None
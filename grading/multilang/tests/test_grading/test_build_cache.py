@@ -0,0 +1,100 @@
+import os
+import tempfile
+from unittest import mock
+
+from grading import projects
+from grading.build_cache import BuildCache
+
+
+def create_project_directory(files):
+    directory = tempfile.mkdtemp()
+    for filename, content in files.items():
+        os.makedirs(os.path.join(directory, os.path.dirname(filename)), exist_ok=True)
+        with open(os.path.join(directory, filename), 'w') as project_file:
+            project_file.write(content)
+    return directory
+
+
+class TestBuildCache(object):
+    def test_key_depends_on_contents_and_options(self):
+        cache = BuildCache(tempfile.mkdtemp())
+        first_directory = create_project_directory({"main.cpp": "int main() {}"})
+        second_directory = create_project_directory({"main.cpp": "int main() {}"})
+        other_directory = create_project_directory({"main.cpp": "int main() { return 1; }"})
+
+        key = cache.compute_key(first_directory, ["main.cpp"], ["cpp", "-O2"])
+        assert cache.compute_key(second_directory, ["main.cpp"], ["cpp", "-O2"]) == key
+        assert cache.compute_key(second_directory, ["main.cpp"], ["cpp", "-O0"]) != key
+        assert cache.compute_key(other_directory, ["main.cpp"], ["cpp", "-O2"]) != key
+
+    def test_store_and_restore(self):
+        cache = BuildCache(tempfile.mkdtemp())
+        directory = create_project_directory({"main": "binary", "build/a/A.class": "class"})
+        cache.store("key", directory, ["main", "build"])
+
+        destination = create_project_directory({"main.cpp": "code"})
+        assert cache.restore("key", destination)
+        with open(os.path.join(destination, "build", "a", "A.class")) as class_file:
+            assert class_file.read() == "class"
+        assert os.path.exists(os.path.join(destination, "main"))
+        assert not cache.restore("other key", destination)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = BuildCache(tempfile.mkdtemp(), max_size=10)
+        directory = create_project_directory({"main": "12345"})
+        for key, last_use in [("first", 1), ("second", 2)]:
+            cache.store(key, directory, ["main"])
+            os.utime(os.path.join(cache.directory, key), (last_use, last_use))
+        cache.restore("first", tempfile.mkdtemp())
+        cache.store("third", directory, ["main"])
+
+        assert sorted(os.listdir(cache.directory)) == [".size", "first", "third"]
+
+    def test_build_is_run_once(self):
+        cache = BuildCache(tempfile.mkdtemp())
+        build = mock.MagicMock()
+
+        def compile_code(directory):
+            build()
+            with open(os.path.join(directory, "main"), 'w') as binary:
+                binary.write("binary")
+
+        with mock.patch.object(projects.build_cache, 'get_build_cache', return_value=cache), \
+                mock.patch.object(projects.build_cache, 'get_toolchain_version', return_value="g++ 9"):
+            for _ in range(2):
+                directory = create_project_directory({"main.cpp": "int main() {}"})
+                projects._build_with_cache(lambda: compile_code(directory), directory, ["main.cpp"], ["main"],
+                                           ["cpp"], ["g++", "--version"])
+                assert os.path.exists(os.path.join(directory, "main"))
+
+        assert build.call_count == 1
+
+    def test_cache_is_only_walked_when_its_size_exceeds_the_maximum(self):
+        cache = BuildCache(tempfile.mkdtemp(), max_size=12)
+        directory = create_project_directory({"main": "12345"})
+        cache.store("first", directory, ["main"])
+
+        with mock.patch.object(cache, 'evict', wraps=cache.evict) as evict:
+            cache.store("second", directory, ["main"])
+            assert not evict.called
+            cache.store("third", directory, ["main"])
+            assert evict.called
+        assert sorted(os.listdir(cache.directory)) == [".size", "second", "third"]
+
+    def test_java_classes_in_the_project_are_not_cached(self, fake_sandbox):
+        cache = BuildCache(tempfile.mkdtemp())
+        directory = create_project_directory({"src/Main.java": "class Main {}", "build/Main.class": "stale",
+                                              "build/Other.class": "from the archive"})
+
+        def compile_code(command, cwd, **kwargs):
+            with open(os.path.join(cwd, "build", "Main.class"), 'w') as class_file:
+                class_file.write("compiled")
+            return 0, "", ""
+
+        with mock.patch.object(projects.build_cache, 'get_build_cache', return_value=cache), \
+                mock.patch.object(projects.build_cache, 'get_toolchain_version', return_value="javac 8"), \
+                mock.patch.object(projects, '_run_in_sandbox', compile_code):
+            projects.JavaProjectFactory().create_from_directory(directory).build()
+
+        [key] = [name for name in os.listdir(cache.directory) if name != ".size"]
+        assert os.listdir(os.path.join(cache.directory, key, "build")) == ["Main.class"]
@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+from grading import checkers
+from grading.checkers import get_checker_from_name, FloatChecker
+from grading.results import GraderResult
+
+
+def check_in_chunks(checker_name, output, expected_output, chunk_size=2):
+    checker = get_checker_from_name(checker_name)(expected_output.encode())
+    encoded_output = output.encode()
+    for i in range(0, len(encoded_output), chunk_size):
+        checker.write(encoded_output[i:i + chunk_size])
+    checker.finish()
+    return checker.result
+
+
+@pytest.mark.parametrize("checker_name, output, expected_output, result", [
+    ("exact", "1 2\n3\n", "1 2\n3\n", GraderResult.ACCEPTED),
+    ("exact", "1 2 3", "1 2\n3\n", GraderResult.PRESENTATION_ERROR),
+    ("exact", "1 2 4\n", "1 2\n3\n", GraderResult.WRONG_ANSWER),
+    ("whitespace", "1   2 \n3\n\n\n", "1 2\n3", GraderResult.ACCEPTED),
+    ("whitespace", "1 2 3\n", "1 2\n3", GraderResult.PRESENTATION_ERROR),
+    ("whitespace", "1 2\n\n3\n", "1 2\n3", GraderResult.PRESENTATION_ERROR),
+    ("case_insensitive", "Hello World\n", "hello world\n", GraderResult.ACCEPTED),
+    ("case_insensitive", "HELLO  world\n", "hello world\n", GraderResult.PRESENTATION_ERROR),
+    ("case_insensitive", "Hello there\n", "hello world\n", GraderResult.WRONG_ANSWER),
+    ("line_order", "b\na\nc\n", "a\nb\nc\n", GraderResult.ACCEPTED),
+    ("line_order", "b\na  \nc\n", "a\nb\nc\n", GraderResult.PRESENTATION_ERROR),
+    ("line_order", "b\na\n", "a\nb\nc\n", GraderResult.WRONG_ANSWER),
+    ("tokens", "1\n2   3", "1 2 3\n", GraderResult.ACCEPTED),
+    ("tokens", "1 2", "1 2 3\n", GraderResult.WRONG_ANSWER),
+    ("float", "1.0000000001 2e3\n-inf nan", "1 2000.0 -inf nan\n", GraderResult.ACCEPTED),
+    ("float", "1.5 yes\n", "1.5 yes", GraderResult.ACCEPTED),
+    ("float", "1.5 no\n", "1.5 yes", GraderResult.WRONG_ANSWER),
+    ("float", "1.001 2", "1 2", GraderResult.WRONG_ANSWER),
+    ("float", "inf 2", "-inf 2", GraderResult.WRONG_ANSWER),
+    ("float", "1 2", "1 2 3", GraderResult.WRONG_ANSWER),
+])
+def test_checkers(checker_name, output, expected_output, result):
+    assert check_in_chunks(checker_name, output, expected_output) == result
+
+
+@pytest.mark.parametrize("checker_name", ["whitespace", "case_insensitive", "line_order", "tokens", "float"])
+@pytest.mark.parametrize("chunk_size", [1, 3, 1000])
+def test_long_lines_and_tokens_across_chunks(checker_name, chunk_size):
+    long_token = "x" * 5000
+    expected_output = "a " + long_token + "\n" + "b" * 3000 + "\n" + "c\n"
+    assert check_in_chunks(checker_name, expected_output, expected_output, chunk_size) == GraderResult.ACCEPTED
+
+    output = expected_output.replace(long_token, long_token + "y")
+    assert check_in_chunks(checker_name, output, expected_output, chunk_size) == GraderResult.WRONG_ANSWER
+
+
+def test_unknown_checker():
+    with pytest.raises(ValueError):
+        get_checker_from_name("unknown")
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_float_checker_deviations(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(checkers, "numpy", None)
+
+    checker = FloatChecker.run(b"1.0 2.5 3.1 4.0 text 6", b"1 2 3 4 text 6 7", absolute_tolerance=0.2)
+    assert checker.result == GraderResult.WRONG_ANSWER
+    assert checker.first_deviation == (1, "2.5", "2", pytest.approx(0.5))
+    assert checker.worst_deviation == (6, None, "7", math.inf)
+    assert checker.report() is not None
+
+    checker = FloatChecker.run(b"100.5 200", b"100 200", relative_tolerance=0.01)
+    assert checker.result == GraderResult.ACCEPTED
+    assert checker.first_deviation is None
+    assert checker.report() is None
+
+
+def test_float_checker_reads_the_expected_tokens_with_the_output():
+    checker = FloatChecker(memoryview(b"10.5 20.25\n30"))
+    for chunk in [b"10.", b"5 2", b"0.25", b"\n", b"30", b" 40 50"]:
+        checker.write(chunk)
+    checker.finish()
+    assert checker.result == GraderResult.WRONG_ANSWER
+    assert checker.first_deviation == (3, "40", None, math.inf)
@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+from grading.failure_statistics import FailureStatistics
+from grading.results import GraderResult
+
+
+class TestFailureStatistics(object):
+    def test_sort_by_failure_probability(self):
+        statistics = FailureStatistics(os.path.join(tempfile.mkdtemp(), "statistics.json"))
+        test_cases = [("a", "a.out"), ("b", "b.out"), ("c", "c.out")]
+        statistics.record(test_cases, [GraderResult.ACCEPTED, GraderResult.WRONG_ANSWER, GraderResult.NOT_RUN])
+
+        assert statistics.get_failure_probability("c") == 0.5
+        assert statistics.sort_by_failure_probability(test_cases) == [1, 2, 0]
+
+    def test_save_and_load(self):
+        filename = os.path.join(tempfile.mkdtemp(), "statistics.json")
+        statistics = FailureStatistics(filename)
+        statistics.record([("a", "a.out")], [GraderResult.TIME_LIMIT_EXCEEDED])
+        statistics.save()
+
+        assert FailureStatistics(filename).get_failure_probability("a") == 2 / 3
+
+    def test_save_adds_to_the_statistics_saved_by_others(self):
+        filename = os.path.join(tempfile.mkdtemp(), "statistics.json")
+        first_statistics = FailureStatistics(filename)
+        second_statistics = FailureStatistics(filename)
+        first_statistics.record([("a", "a.out")], [GraderResult.WRONG_ANSWER])
+        second_statistics.record([("a", "a.out")], [GraderResult.ACCEPTED])
+        first_statistics.save()
+        second_statistics.save()
+
+        assert FailureStatistics(filename).get_failure_probability("a") == 2 / 4
+        assert second_statistics.get_failure_probability("a") == 2 / 4
@@ -1,12 +1,16 @@
 import pytest
 import os
 import re
+import json
 import tempfile
 
 from unittest.mock import MagicMock
 from grading.projects import Project, BuildError
 from grading.results import SandboxCodes, GraderResult
 from grading.graders import SimpleGrader
+from grading import projects
+from grading.graders_utils import decompress_text, decode_compact
+from grading.output_streams import DiffWindow
 
 
 def mock_project(return_code, stdout, stderr):
@@ -21,6 +25,8 @@ class FakeProject(Project):
 
     def run(self, input_file, **run_student_flags):
         file_content = input_file.read()
+        if isinstance(file_content, bytes):
+            file_content = file_content.decode()
         if file_content == "TLE":
             return (SandboxCodes.TIME_LIMIT.value, "", "")
         elif file_content == "MLE":
@@ -90,7 +96,7 @@ class TestGrader(object):
         sub_req = MagicMock(custom_input='Hello')
         project = mock_project(0, 'Hello world!\n', "")
         grader = SimpleGrader(sub_req, {'compute_diff': False})
-        return_code, stdout, _ = grader._run_custom_input_project(project)
+        return_code, stdout, _, _ = grader._run_custom_input_project(project)
         assert return_code == 0 and stdout == 'Hello world!\n'
 
     def test_custom_input_with_memory_limit(self):
@@ -101,9 +107,21 @@ class TestGrader(object):
 
         project = mock_project(return_code, stdout, stderr)
         grader = SimpleGrader(sub_req, {'compute_diff': False})
-        r, s, serr = grader._run_custom_input_project(project)
+        r, s, serr, _ = grader._run_custom_input_project(project)
         assert r == return_code and s == stdout and serr == stderr
 
+    def test_custom_input_with_output_limit(self):
+        sub_req = MagicMock(custom_input="Hello")
+        project = mock_project(-9, "x" * 101, "")
+        grader = SimpleGrader(sub_req, {"output_limit": 100})
+
+        return_code, stdout, stderr, stdout_size = grader._run_custom_input_project(project)
+        feedback_info = grader._generate_custom_input_feedback_info(return_code, stdout, stderr, stdout_size)
+
+        assert stdout_size == 101
+        assert feedback_info['global']['return'] == GraderResult.OUTPUT_LIMIT_EXCEEDED
+        assert feedback_info['custom']['stdout'] == ""
+
     def test_grade_with_ignores_runtime_error_success(self):
         expected_output = "Accepted output"
         project = mock_project(0, expected_output, "")
@@ -116,6 +134,21 @@ class TestGrader(object):
         result, debug = grader._run_code_against_test_case(project, full_path_test[0], full_path_test[1])
         assert result == GraderResult.ACCEPTED
 
+    @pytest.mark.parametrize("stdout, expected_result, expected_report", [
+        ("Accepted\n  output", GraderResult.PRESENTATION_ERROR, None),
+        ("Accepted\nanswer", GraderResult.WRONG_ANSWER,
+         "First different token: line 2 of the output, line 1 of the expected output."),
+    ])
+    def test_custom_check_output_reports_different_token(self, stdout, expected_result, expected_report):
+        project = mock_project(0, stdout, "")
+        full_path_test = self.build_test_cases_fullpath(["AC"])[0]
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {"check_output": lambda stdout, expected_output: False})
+        result, debug_info = grader._run_code_against_test_case(project, full_path_test[0], full_path_test[1])
+
+        assert result == expected_result
+        assert debug_info["checker_report"] == expected_report
+
     def test_grade_with_ignores_runtime_error_wrong(self):
         wrong_output = "Wrong output"
         project = mock_project(10, wrong_output, "")
@@ -155,7 +188,358 @@ class TestGrader(object):
 
             project = mock_project(return_code, stdout, stderr)
             grader = SimpleGrader(sub_req, {'compute_diff': False})
-            r, s, serr = grader._run_custom_input_project(project)
+            r, s, serr, _ = grader._run_custom_input_project(project)
             results.append(r)
         # Custom tests from the user don't return grader codes (there is nothing to grade)
         assert results == [SandboxCodes.MEMORY_LIMIT, SandboxCodes.TIME_LIMIT, SandboxCodes.INTERNAL_ERROR]
+
+    def test_parallel_tests_keep_order(self):
+        sub_req = MagicMock(is_staff=False)
+
+        project = FakeProject()
+        tests = ["MLE", "AC", "IE", "TLE", "RTE"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        grader = SimpleGrader(sub_req, {"parallel_tests": 3})
+        results, debug_info = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        assert results == [GraderResult.MEMORY_LIMIT_EXCEEDED, GraderResult.ACCEPTED, GraderResult.INTERNAL_ERROR,
+                           GraderResult.TIME_LIMIT_EXCEEDED, GraderResult.RUNTIME_ERROR]
+        assert list(debug_info["files_feedback"].keys()) == [test[0] for test in full_path_tests]
+
+    @pytest.mark.parametrize("options", [{"pipeline_tests": True}, {"pipeline_tests": 3, "streaming_comparison": True}])
+    def test_pipeline_tests_keep_order(self, options):
+        sub_req = MagicMock(is_staff=True)
+
+        project = FakeProject()
+        tests = ["MLE", "AC", "IE", "TLE", "RTE"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        grader = SimpleGrader(sub_req, options)
+        results, debug_info = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        assert results == [GraderResult.MEMORY_LIMIT_EXCEEDED, GraderResult.ACCEPTED, GraderResult.INTERNAL_ERROR,
+                           GraderResult.TIME_LIMIT_EXCEEDED, GraderResult.RUNTIME_ERROR]
+        assert list(debug_info["files_feedback"].keys()) == [test[0] for test in full_path_tests]
+        assert debug_info["files_feedback"][full_path_tests[4][0]]["return_code"] == 255
+
+    def test_diff_of_long_outputs_shows_first_mismatch(self):
+        grader = SimpleGrader(MagicMock(is_staff=True), {})
+        expected_output = "".join("line %d\n" % i for i in range(200000))
+        actual_output = expected_output.replace("line 150000\n", "line 150001\n")
+
+        diff = grader.diff_tool.compute(actual_output, expected_output)
+        assert "Diff is too big" not in diff
+        assert "@@ -149998,7 +149998,7 @@" in diff
+        assert "-line 150000\n+line 150001" in diff
+
+    @pytest.mark.parametrize("streaming_comparison", [False, True])
+    def test_diff_window_with_inserted_line_has_no_hunk_at_the_cut(self, streaming_comparison, tmp_path):
+        # Longer than the diff limit, so the diff is computed on a window of the outputs
+        expected_lines = ["line %d\n" % i for i in range(1, 100001)]
+        input_filename = str(tmp_path / "input")
+        expected_output_filename = str(tmp_path / "expected_output")
+        open(input_filename, 'w').close()
+        with open(expected_output_filename, 'w') as expected_output_file:
+            expected_output_file.write("".join(expected_lines))
+        actual_output = "".join(expected_lines[:50000] + ["inserted\n"] + expected_lines[50000:])
+        project = mock_project(0, actual_output, "")
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {"streaming_comparison": streaming_comparison})
+        _, debug_info = grader._run_code_against_test_case(project, input_filename, expected_output_filename)
+
+        assert debug_info["diff"].count("@@ -") == 1
+        assert "+inserted" in debug_info["diff"]
+
+    def test_batch_tests_with_project_without_batched_run(self):
+        sub_req = MagicMock(is_staff=False)
+
+        project = FakeProject()
+        tests = ["AC", "TLE", "AC"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        grader = SimpleGrader(sub_req, {"batch_tests": True})
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        assert results == [GraderResult.ACCEPTED, GraderResult.TIME_LIMIT_EXCEEDED, GraderResult.ACCEPTED]
+
+    @pytest.mark.parametrize("options", [{}, {"parallel_tests": 2}, {"batch_tests": True}, {"pipeline_tests": True}])
+    def test_stop_after_max_failures(self, options):
+        sub_req = MagicMock(is_staff=False)
+
+        project = FakeProject()
+        tests = ["AC", "RTE", "AC", "MLE", "AC"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        grader = SimpleGrader(sub_req, dict(options, max_failures=2))
+        results, debug_info = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        assert results == [GraderResult.ACCEPTED, GraderResult.RUNTIME_ERROR, GraderResult.ACCEPTED,
+                           GraderResult.MEMORY_LIMIT_EXCEEDED, GraderResult.NOT_RUN]
+        assert debug_info["files_feedback"][full_path_tests[4][0]] == {}
+
+        feedback_info = grader._generate_feedback_info(results, debug_info, None, full_path_tests)
+        assert feedback_info['grade'] == 40.0
+        assert feedback_info['custom']['summary_result'] == GraderResult.MEMORY_LIMIT_EXCEEDED.name
+
+    def test_stop_on_time_limit_only_for_students(self):
+        project = MagicMock(wraps=FakeProject())
+        tests = ["AC", "TLE", "AC"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+
+        grader = SimpleGrader(MagicMock(is_staff=False), {"stop_on_time_limit": True})
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests)
+        assert results == [GraderResult.ACCEPTED, GraderResult.TIME_LIMIT_EXCEEDED, GraderResult.NOT_RUN]
+        assert project.run.call_count == 2
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {"stop_on_time_limit": True})
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests)
+        assert results == [GraderResult.ACCEPTED, GraderResult.TIME_LIMIT_EXCEEDED, GraderResult.ACCEPTED]
+
+    def test_subtasks_skip_after_failure(self):
+        project = MagicMock(wraps=FakeProject())
+        tests = ["AC", "AC", "RTE", "AC", "AC", "AC"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        subtasks = [{"name": "small", "test_cases": [0, 1], "score": 20},
+                    {"name": "medium", "test_cases": [2, 3], "score": 30},
+                    {"name": "large", "test_cases": [4], "score": 40, "depends_on": ["medium"]},
+                    {"name": "extra", "test_cases": [0, 5], "score": 10, "depends_on": ["small"]}]
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {})
+        results, debug_info = grader._run_code_against_all_test_cases(project, full_path_tests, subtasks)
+
+        assert results == [GraderResult.ACCEPTED, GraderResult.ACCEPTED, GraderResult.RUNTIME_ERROR,
+                           GraderResult.NOT_RUN, GraderResult.NOT_RUN, GraderResult.ACCEPTED]
+        assert project.run.call_count == 4
+
+        feedback_info = grader._generate_feedback_info(results, debug_info, None, full_path_tests, subtasks)
+        assert feedback_info['grade'] == 30.0
+        assert feedback_info['custom']['summary_result'] == GraderResult.RUNTIME_ERROR.name
+
+    @pytest.mark.parametrize("options", [{}, {"parallel_tests": 2}, {"parallel_tests": 2, "batch_tests": True},
+                                         {"batch_tests": True}, {"pipeline_tests": True}])
+    def test_subtasks_with_all_the_test_cases(self, options):
+        project = FakeProject()
+        full_path_tests = self.build_test_cases_fullpath(["AC", "AC"])
+        subtasks = [{"name": "all", "test_cases": [0, 1], "score": 100}]
+
+        grader = SimpleGrader(MagicMock(is_staff=True), options)
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests, subtasks)
+
+        assert results == [GraderResult.ACCEPTED, GraderResult.ACCEPTED]
+
+    def test_subtasks_must_be_defined_before_their_dependencies(self):
+        full_path_tests = self.build_test_cases_fullpath(["AC"])
+        subtasks = [{"name": "large", "test_cases": [0], "score": 50, "depends_on": ["small"]}]
+        grader = SimpleGrader(MagicMock(is_staff=True), {})
+        with pytest.raises(ValueError):
+            grader._run_code_against_all_test_cases(FakeProject(), full_path_tests, subtasks)
+
+    def test_order_tests_by_failure(self):
+        project = MagicMock(wraps=FakeProject())
+        tests = ["AC", "AC", "RTE"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        options = {"order_tests_by_failure": True, "max_failures": 1,
+                   "failure_statistics_file": os.path.join(tempfile.mkdtemp(), "statistics.json")}
+
+        grader = SimpleGrader(MagicMock(is_staff=False), options)
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests)
+        assert results == [GraderResult.ACCEPTED, GraderResult.ACCEPTED, GraderResult.RUNTIME_ERROR]
+        assert project.run.call_count == 3
+
+        # The failing test case is run first on the next grading
+        project.run.reset_mock()
+        grader = SimpleGrader(MagicMock(is_staff=False), options)
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests)
+        assert results == [GraderResult.NOT_RUN, GraderResult.NOT_RUN, GraderResult.RUNTIME_ERROR]
+        assert project.run.call_count == 1
+
+    def test_failure_statistics_shared_by_graders(self):
+        full_path_tests = self.build_test_cases_fullpath(["AC", "RTE"])
+        options = {"order_tests_by_failure": True,
+                   "failure_statistics_file": os.path.join(tempfile.mkdtemp(), "statistics.json")}
+
+        # Both graders run at the same time, so they load the statistics before any of them stores its results
+        graders = [SimpleGrader(MagicMock(is_staff=False), options) for _ in range(2)]
+        for grader in graders:
+            grader._run_code_against_all_test_cases(FakeProject(), full_path_tests)
+
+        statistics = SimpleGrader(MagicMock(is_staff=False), options).failure_statistics
+        assert statistics.get_failure_probability(full_path_tests[0][0]) == 1 / 4
+        assert statistics.get_failure_probability(full_path_tests[1][0]) == 3 / 4
+
+    @pytest.mark.parametrize("options", [{}, {"parallel_tests": 2}, {"streaming_comparison": True}])
+    def test_deduplicate_inputs(self, options):
+        project = MagicMock(wraps=FakeProject())
+        full_path_tests = self.build_test_cases_fullpath(["AC", "AC", "TLE"])
+        # The same input is used with a different expected output
+        full_path_tests[1] = (full_path_tests[1][0], self.build_test_cases_fullpath(["WA"])[0][1])
+
+        grader = SimpleGrader(MagicMock(is_staff=False), dict(options, deduplicate_inputs=True))
+        results, _ = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        assert results == [GraderResult.ACCEPTED, GraderResult.WRONG_ANSWER, GraderResult.TIME_LIMIT_EXCEEDED]
+        assert project.run.call_count == 2
+
+    def test_streaming_comparison(self):
+        sub_req = MagicMock(is_staff=True)
+
+        project = FakeProject()
+        tests = ["AC", "WA"]
+        full_path_tests = self.build_test_cases_fullpath(tests)
+        grader = SimpleGrader(sub_req, {"streaming_comparison": True})
+        results, debug_info = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        assert results == [GraderResult.ACCEPTED, GraderResult.WRONG_ANSWER]
+        assert debug_info["files_feedback"][full_path_tests[1][0]]["diff"]
+
+    @pytest.mark.parametrize("options", [{}, {"streaming_comparison": True}])
+    def test_client_side_diff(self, options):
+        project = FakeProject()
+        full_path_tests = self.build_test_cases_fullpath(["AC", "WA"])
+        grader = SimpleGrader(MagicMock(is_staff=True), dict(options, client_side_diff=True))
+        results, debug_info = grader._run_code_against_all_test_cases(project, full_path_tests)
+
+        wrong_answer_debug_info = debug_info["files_feedback"][full_path_tests[1][0]]
+        assert wrong_answer_debug_info["diff"] is None
+        assert decompress_text(wrong_answer_debug_info["client_diff"]["actual_output"]) == "Accepted output"
+        assert wrong_answer_debug_info["client_diff"]["expected_output_file"] == full_path_tests[1][1]
+        assert wrong_answer_debug_info["client_diff"]["first_line"] == 1
+
+        html_block = grader.diff_tool.to_html_block(1, results[1], full_path_tests[1], debug_info, is_staff=True)
+        assert "Accepted output" in html_block
+        assert "updateDiffBlock" not in html_block and "updateClientDiffBlock" not in html_block
+
+    def test_client_side_diff_output_is_cut(self):
+        grader = SimpleGrader(MagicMock(), {"client_side_diff": True, "diff_max_lines": 2})
+        diff_window = DiffWindow("a\nb\nc\n", "x\n", 5)
+
+        client_diff = grader.diff_tool.client_diff(diff_window, "expected.out")
+
+        assert decompress_text(client_diff["actual_output"]) == "a\nb\n"
+        assert client_diff["first_line"] == 5
+
+    @pytest.mark.parametrize("options, zygote_modules", [
+        ({"batch_tests": True}, None),
+        ({"python_zygote": True}, None),
+        ({"python_zygote": True, "batch_tests": True}, projects.DEFAULT_ZYGOTE_MODULES),
+        ({"python_zygote": ["math"], "batch_tests": True}, ["math"]),
+    ])
+    def test_python_zygote_only_when_enabled_with_batched_runs(self, options, zygote_modules):
+        grader = SimpleGrader(MagicMock(language_name="python3"), options)
+        assert grader._get_project_factory()._zygote_modules == zygote_modules
+
+    def test_output_limit_reported_by_sandbox(self):
+        project = mock_project(-9, "x" * 101, "")
+        full_path_test = self.build_test_cases_fullpath(["AC"])[0]
+
+        grader = SimpleGrader(MagicMock(), {"output_limit": 100})
+        result, _ = grader._run_code_against_test_case(project, full_path_test[0], full_path_test[1])
+
+        assert result == GraderResult.OUTPUT_LIMIT_EXCEEDED
+        assert project.run.call_args[1]["capture_options"]["output_limit"] == 100
+
+    def test_output_limit_not_told_from_return_code(self):
+        # A program can exit with any code, so the output limit is only told from the size of the output
+        project = mock_project(251, "x" * 100, "")
+        full_path_test = self.build_test_cases_fullpath(["AC"])[0]
+
+        grader = SimpleGrader(MagicMock(), {"output_limit": 100})
+        result, _ = grader._run_code_against_test_case(project, full_path_test[0], full_path_test[1])
+
+        assert result == GraderResult.RUNTIME_ERROR
+
+    def test_grade_with_case_insensitive_checker(self):
+        project = mock_project(0, "ACCEPTED OUTPUT", "")
+        full_path_test = self.build_test_cases_fullpath(["AC"])[0]
+
+        grader = SimpleGrader(MagicMock(), {"checker": "case_insensitive"})
+        result, _ = grader._run_code_against_test_case(project, full_path_test[0], full_path_test[1])
+        assert result == GraderResult.ACCEPTED
+
+        grader = SimpleGrader(MagicMock(), {})
+        result, _ = grader._run_code_against_test_case(project, full_path_test[0], full_path_test[1])
+        assert result == GraderResult.WRONG_ANSWER
+
+    def test_feedback_budget_and_debug_info_stored_once(self):
+        full_path_tests = [self.build_test_cases_fullpath([test])[0][0] for test in ["AC", "WA"]]
+        expected_output_filename = self.build_test_cases_fullpath(["WA"])[0][1]
+        test_cases = [(input_filename, expected_output_filename) for input_filename in full_path_tests]
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {"feedback_budget": 100})
+        grader.create_project = FakeProject
+        feedback_info = {}
+        grader.grade(test_cases, set_feedback=feedback_info.update)
+
+        debug_info = json.loads(feedback_info['global']['feedback'])[-1]
+        first_debug_info, second_debug_info = [debug_info["files_feedback"][test[0]] for test in test_cases]
+        assert "dropped" not in first_debug_info and first_debug_info["diff"]
+        assert "diff" in second_debug_info["dropped"] and second_debug_info["diff"] is None
+        assert json.loads(feedback_info['custom']['additional_info']) == {"reference": "feedback"}
+
+    def test_debug_info_reference_only_with_feedback_budget(self):
+        test_cases = self.build_test_cases_fullpath(["AC", "RTE"])
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {})
+        grader.create_project = FakeProject
+        feedback_info = {}
+        grader.grade(test_cases, set_feedback=feedback_info.update)
+        additional_info = json.loads(feedback_info['custom']['additional_info'])
+        assert additional_info["files_feedback"][test_cases[1][0]]["return_code"] == 255
+
+        grader = SimpleGrader(MagicMock(is_staff=True), {"feedback_budget": 100})
+        grader.create_project = FakeProject
+        feedback_info = {}
+        grader.grade([], set_feedback=feedback_info.update)
+        assert json.loads(feedback_info['custom']['additional_info']) == {"reference": "feedback"}
+
+    def test_compact_feedback(self):
+        test_cases = self.build_test_cases_fullpath(["AC", "RTE", "TLE"])
+
+        grader = SimpleGrader(MagicMock(is_staff=False), {"response_type": "compact"})
+        grader.create_project = FakeProject
+        feedback_info = {}
+        grader.grade(test_cases, set_feedback=feedback_info.update)
+
+        feedback = decode_compact(feedback_info['global']['feedback'])
+        columns = feedback["tests"]["columns"]
+        assert feedback["tests"]["count"] == 3
+        assert columns["i"] == [0, 1, 2]
+        assert columns["result"] == [GraderResult.ACCEPTED, GraderResult.RUNTIME_ERROR,
+                                     GraderResult.TIME_LIMIT_EXCEEDED]
+        assert "test_case" in feedback["tests"]["string_columns"]
+        assert [[feedback["strings"][index] for index in test_case] for test_case in columns["test_case"]] == \
+            [list(test_case) for test_case in test_cases]
+        assert feedback["options"]["container_type"] == "multilang"
+        assert list(feedback["debug_info"]["files_feedback"]) == [test_case[0] for test_case in test_cases]
+
+    def test_debug_info_only_for_visible_test_cases(self):
+        project = FakeProject()
+        wrong_answer_test, runtime_error_test = self.build_test_cases_fullpath(["WA", "RTE"])
+        test_cases = [wrong_answer_test, runtime_error_test]
+
+        grader = SimpleGrader(MagicMock(is_staff=False), {"output_diff_for": [wrong_answer_test[0]]})
+        _, debug_info = grader._run_code_against_all_test_cases(project, test_cases)
+
+        assert debug_info["files_feedback"][wrong_answer_test[0]]["diff"]
+        assert debug_info["files_feedback"][runtime_error_test[0]] == {"input_file": runtime_error_test[0],
+                                                                       "return_code": 255}
+
+    @pytest.mark.parametrize("options", [{}, {"streaming_comparison": True}])
+    def test_expected_output_with_crlf_line_breaks(self, options):
+        input_filename = self.build_test_cases_fullpath(["AC"])[0][0]
+        _, expected_output_filename = tempfile.mkstemp()
+        with open(expected_output_filename, 'wb') as expected_output_file:
+            expected_output_file.write(b"first line\r\nsecond line\r\n")
+
+        grader = SimpleGrader(MagicMock(is_staff=True), options)
+        # Only the expected output is read with its line breaks normalized
+        for stdout, expected_result in [("first line\nsecond line\n", GraderResult.ACCEPTED),
+                                        ("first line\r\nsecond line\r\n", GraderResult.PRESENTATION_ERROR)]:
+            result, _ = grader._run_code_against_test_case(mock_project(0, stdout, ""), input_filename,
+                                                           expected_output_filename)
+            assert result == expected_result
+
+        result, debug_info = grader._run_code_against_test_case(mock_project(0, "first line\nother line\n", ""),
+                                                                input_filename, expected_output_filename)
+        assert result == GraderResult.WRONG_ANSWER
+        # Only the different line is changed in the diff
+        assert "\r" not in debug_info["diff"]
+        assert " first line\n-second line\n+other line\n" in debug_info["diff"]
+        os.remove(expected_output_filename)
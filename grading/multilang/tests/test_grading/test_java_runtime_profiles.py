@@ -0,0 +1,60 @@
+from unittest import mock
+from unittest.mock import MagicMock
+from grading.java_runtime_profiles import JavaRuntimeProfile, is_out_of_memory
+from grading.projects import JavaProjectFactory, get_factory_from_name
+from grading.results import SandboxCodes
+from grading.graders import SimpleGrader
+import grading.projects
+
+
+class TestJavaRuntimeProfile(object):
+    def test_heap_is_sized_from_the_memory_limit(self):
+        flags = JavaRuntimeProfile(non_heap_memory=32).get_flags(memory_limit=256)
+        assert "-Xmx224m" in flags
+        assert "-Xshare:auto" in flags
+        # Small limits keep a minimum heap
+        assert "-Xmx16m" in JavaRuntimeProfile(non_heap_memory=32).get_flags(memory_limit=40)
+        assert not any(flag.startswith("-Xmx") for flag in JavaRuntimeProfile().get_flags())
+
+    def test_tiered_compilation_levels(self):
+        assert not any(flag.startswith("-XX:TieredStopAtLevel") for flag in JavaRuntimeProfile().get_flags())
+        assert "-XX:TieredStopAtLevel=1" in JavaRuntimeProfile(tiered_stop_at_level=1).get_flags()
+
+    def test_class_data_sharing_can_be_disabled(self):
+        assert "-Xshare:auto" not in JavaRuntimeProfile(class_data_sharing=False).get_flags()
+
+    def test_out_of_memory(self):
+        stderr = 'Exception in thread "main" java.lang.OutOfMemoryError: Java heap space\n'
+        assert is_out_of_memory(1, stderr)
+        assert not is_out_of_memory(0, stderr)
+        assert not is_out_of_memory(1, "Exception in thread \"main\" java.lang.NullPointerException\n")
+
+    def test_out_of_memory_is_a_memory_limit_exceeded_with_a_profile(self):
+        stderr = 'Exception in thread "main" java.lang.OutOfMemoryError: Java heap space\n'
+        factory = JavaProjectFactory(runtime_profile=JavaRuntimeProfile())
+        assert factory._parse_java_result(1, "", stderr) == (SandboxCodes.MEMORY_LIMIT.value, "", stderr)
+        assert JavaProjectFactory()._parse_java_result(1, "", stderr) == (1, "", stderr)
+
+    def test_profile_is_only_used_when_the_task_enables_it(self):
+        assert get_factory_from_name("java8")._get_java_flags({"memory": 256}) == ["java"]
+
+        grader = SimpleGrader(MagicMock(language_name="java8"), {"java_runtime_profile": True})
+        assert "-Xmx224m" in grader._get_project_factory()._get_java_flags({"memory": 256})
+
+        grader = SimpleGrader(MagicMock(language_name="java8"),
+                              {"java_runtime_profile": {"non_heap_memory": 64, "tiered_stop_at_level": 1}})
+        flags = grader._get_project_factory()._get_java_flags({"memory": 256})
+        assert "-Xmx192m" in flags
+        assert "-XX:TieredStopAtLevel=1" in flags
+
+    def test_startup_overhead_does_not_include_the_sandbox(self):
+        def run_in_sandbox(command, **subprocess_options):
+            # The sandbox takes 0.2 seconds, and the JVM 0.1 more
+            clock[0] += 0.3 if "java" in command else 0.2
+            return 0, "", ""
+
+        clock = [0.0]
+        with mock.patch.object(grading.projects, "_run_in_sandbox", run_in_sandbox), \
+                mock.patch.object(grading.projects.time, "monotonic", lambda: clock[0]):
+            overhead = JavaProjectFactory().measure_startup_overhead(time=2, memory=256)
+        assert abs(overhead - 0.1) < 1e-9
@@ -0,0 +1,46 @@
+import difflib
+
+from grading.line_diff import unified_diff
+
+
+def expected_output_lines(amount):
+    return ["%d" % (i % 10) for i in range(amount)]
+
+
+class TestUnifiedDiff(object):
+    def test_same_format_as_difflib(self):
+        expected_output = ["1", "2", "3", "4", "5", "6", "7", "8", "9"]
+        actual_output = ["0", "1", "2", "4", "5", "6", "7", "8", "nine"]
+        assert list(unified_diff(expected_output, actual_output, "expected_output", "your_output")) == \
+            list(difflib.unified_diff(expected_output, actual_output, "expected_output", "your_output"))
+
+    def test_equal_outputs(self):
+        assert list(unified_diff(["1", "2"], ["1", "2"])) == []
+
+    def test_repeated_lines(self):
+        expected_output = expected_output_lines(100000)
+        actual_output = expected_output[:50000] + ["x"] + expected_output[50001:]
+        assert list(unified_diff(expected_output, actual_output, n=1)) == \
+            ["--- \n", "+++ \n", "@@ -50000,3 +50000,3 @@\n", " 9", "-0", "+x", " 1"]
+
+    def test_first_line(self):
+        diff = list(unified_diff(["a", "b"], ["a", "c"], n=0, first_line=10))
+        assert diff[2] == "@@ -11 +11 @@\n"
+
+    def test_too_many_edits_are_replaced(self):
+        expected_output = ["same"] + ["%d" % i for i in range(100)]
+        actual_output = ["same"] + ["-%d" % i for i in range(100)]
+        diff = list(unified_diff(expected_output, actual_output, n=1, max_edits=10))
+        assert diff[2] == "@@ -1,101 +1,101 @@\n"
+        assert diff[3:5] == [" same", "-0"]
+        assert diff[-1] == "+-99"
+
+    def test_difference_at_the_cut_of_truncated_outputs(self):
+        expected_output = ["%d" % i for i in range(10)]
+        actual_output = expected_output[:3] + ["x"] + expected_output[3:9]
+        diff = list(unified_diff(expected_output, actual_output, n=0, truncated=True))
+        assert diff[2:] == ["@@ -3,0 +4 @@\n", "+x"]
+        assert list(unified_diff(expected_output, actual_output, n=0))[-1] == "-9"
+
+    def test_only_difference_of_truncated_outputs_is_kept(self):
+        assert list(unified_diff(["1", "2"], ["1", "3"], n=0, truncated=True))[2:] == ["@@ -2 +2 @@\n", "-2", "+3"]
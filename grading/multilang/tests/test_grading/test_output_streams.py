@@ -0,0 +1,137 @@
+import io
+import tempfile
+
+from grading.output_streams import StreamingComparator, SpooledOutput, HeadTailBuffer, find_first_mismatch, \
+    find_diff_window, Mismatch
+from grading.results import GraderResult
+
+
+def write_expected_output(text):
+    _, filename = tempfile.mkstemp()
+    with open(filename, 'w') as expected_output_file:
+        expected_output_file.write(text)
+    return filename
+
+
+def compare_in_chunks(output, expected_output, chunk_size=3):
+    comparator = StreamingComparator(write_expected_output(expected_output), context_size=8)
+    encoded_output = output.encode()
+    for i in range(0, len(encoded_output), chunk_size):
+        comparator.write(encoded_output[i:i + chunk_size])
+    comparator.finish()
+    return comparator
+
+
+class TestStreamingComparator(object):
+    def test_matching_output(self):
+        with compare_in_chunks("1 2 3\nhello world\n", "1 2 3\nhello world\n") as comparator:
+            assert comparator.matches
+            assert comparator.result == GraderResult.ACCEPTED
+            assert comparator.getvalue() == "1 2 3\nhello world\n"
+
+    def test_presentation_error(self):
+        with compare_in_chunks("1  2 3 hello\n world", "1 2 3\nhello world\n") as comparator:
+            assert not comparator.matches
+            assert comparator.mismatch_offset == 2
+            assert comparator.result == GraderResult.PRESENTATION_ERROR
+
+    def test_wrong_answer_and_diff_window(self):
+        with compare_in_chunks("line 1\nline 2\nline 3\n", "line 1\nline 2\nline 4\n") as comparator:
+            assert comparator.result == GraderResult.WRONG_ANSWER
+            assert comparator.mismatch_offset == 19
+            actual_output, expected_output, first_line, _ = comparator.diff_window()
+            assert actual_output.startswith("line 3")
+            assert expected_output.startswith("line 4")
+            assert first_line == 3
+
+    def test_shorter_output(self):
+        with compare_in_chunks("1 2", "1 2 3") as comparator:
+            assert comparator.mismatch_offset == 3
+            assert comparator.result == GraderResult.WRONG_ANSWER
+
+    def test_empty_expected_output(self):
+        with compare_in_chunks("", "") as comparator:
+            assert comparator.matches
+
+    def test_only_expected_output_line_breaks_are_normalized(self):
+        with compare_in_chunks("ab\ncd\n", "ab\r\ncd\r\n") as comparator:
+            assert comparator.matches
+            assert comparator.result == GraderResult.ACCEPTED
+        with compare_in_chunks("ab\r\ncd\r\n", "ab\ncd\n") as comparator:
+            assert comparator.mismatch_offset == 2
+            assert comparator.result == GraderResult.PRESENTATION_ERROR
+
+
+class TestSpooledOutput(object):
+    def test_output_in_memory(self):
+        with SpooledOutput(head_size=4) as output:
+            output.write(b"12345")
+            output.write(b"678\n")
+            output.finish()
+            assert output.size == 9
+            assert output.getvalue() == "1234"
+            assert output.decode() == "12345678\n"
+            assert b"".join(output.iter_chunks()) == b"12345678\n"
+
+    def test_output_moved_to_disk(self):
+        with SpooledOutput(max_memory_size=8) as output:
+            for _ in range(4):
+                output.write(b"a" * 5)
+            assert output.size == 20
+            assert output.decode(6) == "aaaaaa"
+            assert b"".join(output.iter_chunks()) == b"a" * 20
+
+
+    def test_diff_window(self):
+        with SpooledOutput(max_memory_size=8) as output:
+            output.write(b"line 1\nline 2\nline 3\n")
+            output.finish()
+            assert output.diff_window(write_expected_output("line 1\nline 2\nline 4\n"), context_size=8) == \
+                ("line 3\n", "line 4\n", 3, False)
+
+    def test_short_outputs_are_not_windowed(self):
+        with SpooledOutput() as output:
+            output.write(b"line 1\nline 2\nline 3\n")
+            output.finish()
+            assert output.diff_window(write_expected_output("line 1\nline 2\nline 4\n"), context_size=8,
+                                      max_length=100) == ("line 1\nline 2\nline 3\n", "line 1\nline 2\nline 4\n", 1, False)
+
+
+class TestFirstMismatch(object):
+    def test_equal_outputs(self):
+        assert find_first_mismatch(io.BytesIO(b"a\nb\n" * 100), io.BytesIO(b"a\nb\n" * 100), block_size=7) is None
+
+    def test_mismatch_after_many_blocks(self):
+        expected_output = b"".join(b"%d\n" % i for i in range(1000))
+        actual_output = expected_output.replace(b"\n700\n", b"\n7000\n")
+        mismatch = find_first_mismatch(io.BytesIO(actual_output), io.BytesIO(expected_output), block_size=16)
+        assert mismatch == Mismatch(expected_output.index(b"\n700\n") + 4, 701)
+
+    def test_shorter_output(self):
+        assert find_first_mismatch(io.BytesIO(b"1\n2"), io.BytesIO(b"1\n2\n3\n")) == Mismatch(3, 2)
+
+    def test_diff_window_starts_at_a_line(self):
+        expected_output = b"".join(b"line %d\n" % i for i in range(10000))
+        actual_output = expected_output.replace(b"line 9000\n", b"line 9000 \n")
+        window = find_diff_window(io.BytesIO(actual_output), io.BytesIO(expected_output), context_size=20)
+        assert window.first_line == 9000
+        assert window.expected_output == "line 8999\nline 9000\nline 9001\n"
+        assert window.actual_output == "line 8999\nline 9000 \nline 9001\n"
+
+
+class TestHeadTailBuffer(object):
+    def test_short_output_is_kept(self):
+        buffer = HeadTailBuffer(head_size=10, tail_size=10)
+        buffer.write(b"short\n")
+        buffer.finish()
+        assert buffer.getvalue() == "short\n"
+        assert buffer.dropped == 0
+
+    def test_long_output_keeps_head_and_tail(self):
+        buffer = HeadTailBuffer(head_size=4, tail_size=4)
+        for chunk in [b"0123", b"45", b"6789", b"abcdef"]:
+            buffer.write(chunk)
+        buffer.finish()
+        assert buffer.dropped == 8
+        assert buffer.getvalue().startswith("0123\n")
+        assert buffer.getvalue().endswith("\ncdef")
@@ -0,0 +1,43 @@
+import os
+import stat
+import tempfile
+
+from grading.precompiled_headers import generate_precompiled_headers, get_precompiled_headers_flags
+
+# Compiler that prints its version and writes the source it is given as the output file
+FAKE_COMPILER = """#!/bin/sh
+if [ "$1" = "--version" ]; then echo "fake 1.0"; exit 0; fi
+while [ "$#" -gt 1 ]; do
+    if [ "$1" = "-o" ]; then output="$2"; fi
+    shift
+done
+cp "$1" "$output"
+"""
+
+
+def create_fake_compiler():
+    compiler = os.path.join(tempfile.mkdtemp(), "fake-g++")
+    with open(compiler, 'w') as compiler_file:
+        compiler_file.write(FAKE_COMPILER)
+    os.chmod(compiler, os.stat(compiler).st_mode | stat.S_IEXEC)
+    return compiler
+
+
+class TestPrecompiledHeaders(object):
+    def test_headers_are_used_once_generated(self):
+        compiler = create_fake_compiler()
+        directory = tempfile.mkdtemp()
+        assert get_precompiled_headers_flags(compiler, ["-O2"], ["bits/stdc++.h"], directory) == []
+
+        generate_precompiled_headers(compiler, "c++", ["-O2", "-lm"], ["bits/stdc++.h"], directory)
+
+        flags = get_precompiled_headers_flags(compiler, ["-O2", "-lm"], ["bits/stdc++.h"], directory)
+        assert flags[0] == "-I"
+        with open(os.path.join(flags[1], "bits", "stdc++.h.gch")) as precompiled_header:
+            assert precompiled_header.read() == "#include <bits/stdc++.h>\n"
+        # The linker flags do not change the headers, but the other flags do
+        assert get_precompiled_headers_flags(compiler, ["-O2"], ["bits/stdc++.h"], directory) == flags
+        assert get_precompiled_headers_flags(compiler, ["-O0"], ["bits/stdc++.h"], directory) == []
+
+    def test_no_headers(self):
+        assert get_precompiled_headers_flags("gcc", ["-O2"], [], tempfile.mkdtemp()) == []
@@ -1,8 +1,12 @@
 import pytest
 import os.path
+import tempfile
+from unittest import mock
 
 from .helpers import run_code_with_project_factory, run_project_with_project_factory
 from grading.projects import BuildError
+from grading.results import SandboxCodes
+from grading.output_streams import StreamingComparator, SpooledOutput
 import grading.projects
 
 
@@ -199,3 +203,281 @@ class TestC11ProjectFactory(object):
         return_code, stdout, stderr = run_code_with_project_factory("c11",
                                                                     "c11/c11_features.c", "empty_input.txt")
         assert return_code == 0
+
+
+class TestRunMany(object):
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_python3_run_many_keeps_order(self):
+        factory = grading.projects.get_factory_from_name("python3")
+        project = factory.create_from_code("print(input()[::-1])")
+        project.build()
+
+        input_files = []
+        for text in ["abc", "hello", "12345"]:
+            input_file = tempfile.TemporaryFile('w+')
+            input_file.write(text + "\n")
+            input_file.seek(0)
+            input_files.append(input_file)
+
+        results = project.run_many(input_files, **{"time": 2, "hard-time": 2, "memory": 100})
+        for input_file in input_files:
+            input_file.close()
+
+        assert [stdout for _, stdout, _ in results] == ["cba\n", "olleh\n", "54321\n"]
+        assert all(return_code == 0 for return_code, _, _ in results)
+
+    def run_many_in_sandbox(self, code, inputs, **run_student_flags):
+        """ Runs the Python code once per input in a batched session, without falling back to separate runs """
+        project_directory = tempfile.mkdtemp(dir=grading.projects.CODE_WORKING_DIR)
+        with open(os.path.join(project_directory, "main.py"), 'w') as main_file:
+            main_file.write(code)
+
+        input_files = []
+        for text in inputs:
+            input_file = tempfile.TemporaryFile('w+')
+            input_file.write(text)
+            input_file.seek(0)
+            input_files.append(input_file)
+
+        results = grading.projects._run_many_in_sandbox(["python3", "main.py"], input_files, cwd=project_directory,
+                                                       **run_student_flags)
+        for input_file in input_files:
+            input_file.close()
+        assert len(results) == len(inputs)
+        return results
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    @pytest.mark.parametrize("zygote", [None, {"preload": []}])
+    def test_run_many_kills_the_processes_left_by_a_case(self, zygote):
+        # The first case leaves a process in another session, which computes the answer after the case ended
+        code = "import os, sys, time\n" \
+               "if input() == 'escape':\n" \
+               "    if os.fork() == 0:\n" \
+               "        os.setsid()\n" \
+               "        start = time.process_time()\n" \
+               "        while time.process_time() - start < 0.5: pass\n" \
+               "        print('answer', flush=True)\n" \
+               "else:\n" \
+               "    time.sleep(1.5)\n"
+        results = self.run_many_in_sandbox(code, ["escape\n", "wait\n"], zygote=zygote,
+                                           **{"time": 2, "hard-time": 2, "memory": 100})
+
+        assert results == [(0, "", ""), (0, "", "")]
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    @pytest.mark.parametrize("zygote", [None, {"preload": []}])
+    def test_run_many_enforces_the_memory_limit_of_all_the_processes(self, zygote):
+        code = "import os, time\n" \
+               "if os.fork() == 0:\n" \
+               "    os.setsid()\n" \
+               "    memory = bytearray(200 * 2 ** 20)\n" \
+               "    time.sleep(2)\n" \
+               "else:\n" \
+               "    time.sleep(1)\n"
+        results = self.run_many_in_sandbox(code, [""], zygote=zygote, **{"time": 3, "hard-time": 3, "memory": 100})
+
+        assert results[0][0] == SandboxCodes.MEMORY_LIMIT
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_run_many_cases_cannot_reach_the_files_of_other_cases(self):
+        code = "import glob, os\n" \
+               "print(input(), len(glob.glob(os.path.join(%r, '*', '*.input'))))" % grading.projects.CODE_WORKING_DIR
+        results = self.run_many_in_sandbox(code, ["first\n", "second\n"], **{"time": 2, "hard-time": 2,
+                                                                               "memory": 100})
+
+        assert [stdout for _, stdout, _ in results] == ["first 0\n", "second 0\n"]
+
+    def test_run_many_removes_its_directory_when_the_session_fails(self):
+        working_directory = tempfile.mkdtemp()
+        with tempfile.TemporaryFile('w+') as input_file, \
+                mock.patch.object(grading.projects, 'CODE_WORKING_DIR', working_directory), \
+                mock.patch.object(grading.projects, '_run_in_sandbox', side_effect=OSError("sandbox failed")):
+            with pytest.raises(OSError):
+                grading.projects._run_many_in_sandbox(["python3", "main.py"], [input_file], cwd=working_directory)
+
+        assert os.listdir(working_directory) == []
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_run_many_gives_the_inputs_as_bytes(self):
+        factory = grading.projects.get_factory_from_name("python3")
+        project = factory.create_from_code("import sys\nprint(list(sys.stdin.buffer.read()))")
+        project.build()
+
+        _, input_filename = tempfile.mkstemp()
+        with open(input_filename, 'wb') as input_file:
+            input_file.write(b"a\xe9\r\n")
+
+        for mode in ['r', 'rb']:
+            with open(input_filename, mode) as input_file:
+                results = project.run_many([input_file], **{"time": 2, "hard-time": 2, "memory": 100})
+            assert results == [(0, "[97, 233, 13, 10]\n", "")]
+        os.remove(input_filename)
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_run_many_reports_time_limit(self):
+        factory = grading.projects.get_factory_from_name("python3")
+        project = factory.create_from_code("while True: pass")
+        project.build()
+
+        with open(os.path.join("tests", "test_grading", "sample_code", "empty_input.txt")) as input_file:
+            results = project.run_many([input_file], **{"time": 1, "hard-time": 1, "memory": 100})
+
+        assert results[0][0] == SandboxCodes.TIME_LIMIT
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_python3_zygote_runs_each_input_in_a_clean_child(self):
+        factory = grading.projects.get_factory_from_name("python3").with_zygote()
+        # The state changed by a run is not seen by the next ones
+        code = "import collections\nprint(input(), hasattr(collections, 'seen'))\ncollections.seen = True\n" \
+               "import sys\nsys.exit(int(sys.argv[1]) if len(sys.argv) > 1 else 3)"
+        project = factory.create_from_code(code)
+        project.build()
+
+        input_files = []
+        for text in ["abc", "hello"]:
+            input_file = tempfile.TemporaryFile('w+')
+            input_file.write(text + "\n")
+            input_file.seek(0)
+            input_files.append(input_file)
+
+        results = project.run_many(input_files, **{"time": 2, "hard-time": 2, "memory": 100})
+        for input_file in input_files:
+            input_file.close()
+
+        assert results == [(3, "abc False\n", ""), (3, "hello False\n", "")]
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_python3_zygote_reports_errors_and_limits(self):
+        factory = grading.projects.get_factory_from_name("python3").with_zygote()
+        project = factory.create_from_code("import sys\nif sys.stdin.readline() == 'loop\\n':\n    while True: pass\n"
+                                           "raise ValueError('wrong')")
+        project.build()
+
+        input_files = []
+        for text in ["loop", "error"]:
+            input_file = tempfile.TemporaryFile('w+')
+            input_file.write(text + "\n")
+            input_file.seek(0)
+            input_files.append(input_file)
+
+        results = project.run_many(input_files, **{"time": 1, "hard-time": 1, "memory": 100})
+        for input_file in input_files:
+            input_file.close()
+
+        assert results[0][0] == SandboxCodes.TIME_LIMIT
+        return_code, stdout, stderr = results[1]
+        assert return_code == 1
+        assert stderr.startswith("Traceback (most recent call last):\n  File \"main.py\", line 4")
+        assert stderr.endswith("ValueError: wrong\n")
+
+
+class TestStreamingCapture(object):
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_stdout_sink_receives_output(self):
+        _, expected_output_filename = tempfile.mkstemp()
+        with open(expected_output_filename, 'w') as expected_output_file:
+            expected_output_file.write("Hello world!\n")
+
+        factory = grading.projects.get_factory_from_name("python3")
+        project = factory.create_from_code("print('Hello world!')")
+        project.build()
+
+        with StreamingComparator(expected_output_filename) as comparator, \
+                open(os.path.join("tests", "test_grading", "sample_code", "empty_input.txt")) as input_file:
+            return_code, stdout, stderr = project.run(input_file, capture_options={"stdout_sink": comparator})
+
+            assert return_code == 0
+            assert stdout == "Hello world!\n"
+            assert comparator.matches
+
+
+class TestOutputLimit(object):
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_output_limit_stops_process(self):
+        factory = grading.projects.get_factory_from_name("python3")
+        project = factory.create_from_code("while True: print('x' * 1000)")
+        project.build()
+
+        with open(os.path.join("tests", "test_grading", "sample_code", "empty_input.txt")) as input_file:
+            return_code, stdout, stderr = project.run(input_file, capture_options={"output_limit": 10000})
+
+        # One more byte than the limit is kept, so the limit is told from the size of the output
+        assert return_code != 0
+        assert len(stdout) == 10001
+
+    @pytest.mark.usefixtures("fake_sandbox")
+    def test_output_limit_in_batched_run(self):
+        factory = grading.projects.get_factory_from_name("python3")
+        project = factory.create_from_code("while True: print('x' * 1000)")
+        project.build()
+
+        with open(os.path.join("tests", "test_grading", "sample_code", "empty_input.txt")) as input_file:
+            results = project.run_many([input_file], capture_options=[{"output_limit": 10000}],
+                                       **{"time": 2, "hard-time": 2, "memory": 100})
+
+        assert results[0][0] != 0
+        assert len(results[0][1]) == 10001
+
+
+class TestDeduplicatedProject(object):
+    def write_inputs(self, texts):
+        input_filenames = []
+        for text in texts:
+            _, input_filename = tempfile.mkstemp()
+            with open(input_filename, 'w') as input_file:
+                input_file.write(text)
+            input_filenames.append(input_filename)
+        return input_filenames
+
+    def create_project(self, runs):
+        def run(input_file, capture_options=None, **run_student_flags):
+            text = input_file.read()
+            runs.append(text)
+            capture_options["stdout_sink"].write(text.upper().encode())
+            capture_options["stdout_sink"].finish()
+            return 0, capture_options["stdout_sink"].getvalue(), ""
+
+        return grading.projects.LambdaProject(run)
+
+    @pytest.mark.parametrize("batched", [False, True])
+    def test_runs_each_input_once(self, batched):
+        runs = []
+        input_filenames = self.write_inputs(["abc", "def", "abc"])
+        project = grading.projects.DeduplicatedProject(self.create_project(runs), input_filenames)
+        project.build()
+
+        sinks = [SpooledOutput() for _ in input_filenames]
+        input_files = [open(input_filename, 'r') for input_filename in input_filenames]
+        capture_options = [{"stdout_sink": sink} for sink in sinks]
+        if batched:
+            results = project.run_many(input_files, capture_options=capture_options)
+        else:
+            results = [project.run(input_file, capture_options=input_capture_options)
+                       for input_file, input_capture_options in zip(input_files, capture_options)]
+        for input_file in input_files:
+            input_file.close()
+
+        assert runs == ["abc", "def"]
+        assert [stdout for _, stdout, _ in results] == ["ABC", "DEF", "ABC"]
+        assert sinks[2].decode() == "ABC"
+
+    def test_inputs_are_told_apart_by_their_bytes(self):
+        runs = []
+        contents = [b"a\r\nb\n", b"a\nb\n", b"\xff\n", b"\xfe\n"]
+        input_filenames = self.write_inputs(["" for _ in contents])
+        for input_filename, content in zip(input_filenames, contents):
+            with open(input_filename, 'wb') as input_file:
+                input_file.write(content)
+
+        def run(input_file, capture_options=None, **run_student_flags):
+            runs.append(input_file.buffer.read())
+            input_file.seek(0)
+            return 0, "", ""
+
+        project = grading.projects.DeduplicatedProject(grading.projects.LambdaProject(run), input_filenames)
+        project.build()
+        for input_filename in input_filenames:
+            with open(input_filename, 'r', newline='') as input_file:
+                project.run(input_file, capture_options={"stdout_sink": SpooledOutput()})
+
+        assert runs == contents
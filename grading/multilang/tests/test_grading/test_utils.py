@@ -0,0 +1,37 @@
+from grading.utils import remove_sockets_exception, find_first_different_token, describe_different_token, \
+    is_presentation_error
+
+
+class TestRemoveSocketsException(object):
+    def test_removes_from_socket_exception(self):
+        stderr = "first line\nsecond line\nException ignored in: <bound method Socket.__del__ of " \
+                 "<zmq.sugar.socket.Socket object at 0x7f>>\nTraceback..."
+        assert remove_sockets_exception(stderr) == "first line\nsecond line"
+
+    def test_socket_exception_at_start(self):
+        stderr = "Exception ignored in: <bound method Socket.__del__ of <zmq.sugar.socket.Socket object>>\n..."
+        assert remove_sockets_exception(stderr) == ""
+
+    def test_without_socket_exception(self):
+        assert remove_sockets_exception("an error\n") == "an error\n"
+
+
+class TestPresentationError(object):
+    def test_same_tokens(self):
+        assert find_first_different_token("1 2\r\n3 ", "1\t2 3\n") is None
+        assert is_presentation_error("1 2\r\n3 ", "1\t2 3\n")
+
+    def test_different_token(self):
+        assert find_first_different_token("1 2 4\n", "1\n2\n3\n") == (4, 4)
+        assert not is_presentation_error("1 2 4\n", "1\n2\n3\n")
+
+    def test_missing_tokens(self):
+        assert find_first_different_token("1 2", "1 2 3") == (3, 4)
+        assert find_first_different_token("1 2 3\n", "1 2") == (4, 3)
+        assert not is_presentation_error("1 2", "1 2 3")
+        assert not is_presentation_error("1 2 3\n", "1 2")
+        assert not is_presentation_error("", "1")
+
+    def test_describe_different_token(self):
+        assert describe_different_token("1 2 4\n", "1\n2\n3\n", (4, 4)) == \
+            "First different token: line 1 of the output, line 3 of the expected output."
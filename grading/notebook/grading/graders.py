@@ -13,7 +13,7 @@ from collections import OrderedDict
 
 from results import GraderResult, parse_non_zero_return_code
 from base_grader import BaseGrader
-from feedback_tools import Diff, set_feedback
+from feedback_tools import Diff, set_feedback, encode_compact_feedback
 from submission_requests import SubmissionRequest
 
 from .notebook_project import get_notebook_factory
@@ -89,8 +89,8 @@ class NotebookGrader(BaseGrader):
             else:
                 # Generate feedback string for tests
                 res_type = self.response_type
-                #Saving feedback as json
-                if res_type == 'json':
+                #Saving feedback as json, or in its compact encoding
+                if res_type in ('json', 'compact'):
                     feedback_list_json = []
                     for i, test_result in enumerate(tests_results):
                         if not test_result:
@@ -111,8 +111,10 @@ class NotebookGrader(BaseGrader):
                     options_for_feedback["is_staff"] = self.submission_request.is_staff
                     feedback_list_json.append(options_for_feedback)
                     feedback_list_json.append(debug_info)
-                    feedback_str_json = json.dumps(feedback_list_json)
-                    feedback_str = feedback_str_json
+                    if res_type == 'json':
+                        feedback_str = json.dumps(feedback_list_json)
+                    else:
+                        feedback_str = encode_compact_feedback(feedback_list_json)
                 #Saving feedback as rst
                 elif res_type == 'rst':
                     feedback_list_rst = []
@@ -2,7 +2,7 @@ import json
 import subprocess
 
 import graders_utils as gutils
-from graders_utils import html_to_rst as html2rst
+from graders_utils import html_to_rst as html2rst, encode_compact
 from results import GraderResult
 
 
@@ -15,10 +15,11 @@ def _run_command(command, **additional_flags):
 
 
 def _feedback_str_for_internal_error(debug_info, response_type="json"):
-    if response_type == "json":
-        return json.dumps({"internal_error_output":debug_info.get("internal_error_output", ""),
-                           "error_name":GraderResult.INTERNAL_ERROR.name,
-                           "container_type":"notebook"})
+    if response_type in ("json", "compact"):
+        internal_error = {"internal_error_output":debug_info.get("internal_error_output", ""),
+                          "error_name":GraderResult.INTERNAL_ERROR.name,
+                          "container_type":"notebook"}
+        return json.dumps(internal_error) if response_type == "json" else encode_compact(internal_error)
     elif response_type == "rst":
         return _("<br><strong>{}:</strong> There was an error while running your notebook: <br><pre>{}</pre><br>").format(
             GraderResult.INTERNAL_ERROR.name, debug_info.get("internal_error_output", ""))
@@ -0,0 +1,383 @@
+"""
+This module is the driver used to run a program against several inputs inside a single
+run_student session (check '_run_many_in_sandbox' in 'projects.py').
+
+It is executed as a standalone script inside the student container, so it must only use the
+standard library. It receives the path of a JSON manifest with the following structure:
+
+    {
+        "command": ["./main"],
+        "time": 2, "hard_time": 2, "memory": 50,
+        "cases": [{"input": "0.in", "stdout": "0.out", "stderr": "0.err", "output_limit": 2097152}, ...],
+        "zygote": {"preload": ["math", "collections"]}
+    }
+
+Every case is run with its own time and memory limits, and the return code of each case is
+printed as a JSON list, using the same codes as run_student (check 'SandboxCodes' in 'results.py').
+The optional output limit of a case (in bytes) is enforced as the maximum size of the files the
+case can write, allowing one more byte to know whether the output exceeded it. It is not reported
+in the return code, as the program could give any code, but told from the size of the output.
+
+The cases are isolated from each other inside the session:
+    - The driver is the subreaper of all the processes of a case, even the ones that leave its
+      session, and kills all of them once the case ends, so none of them survives it.
+    - The CPU time of a case is the time of all its processes. The memory of all its processes is
+      measured while it runs, and the case is killed once it exceeds its limit.
+    - The files of the inputs are removed once they are opened, and the outputs are written to
+      unnamed files, which are only published once all the cases ended, so a case can only reach
+      its own input and outputs. The driver cannot be inspected by the cases.
+The driver fails (so the runs are not batched) when it cannot isolate the cases.
+
+This isolation is still weaker than separate run_student sessions: the memory of the processes
+is sampled (check '_POLL_INTERVAL'), so a short peak between samples might go unnoticed unless
+it is in the main process of the case, and the limits of the session on the network, the
+processes and the files are shared by all the cases, as well as the directory of the project.
+
+The optional zygote runs Python programs without starting a new interpreter for each case. The
+command is then the arguments of 'python3' (e.g. ["main.py"]) and the driver must be run with the
+interpreter of the program. It imports the preloaded modules once, and forks a child for each case,
+which runs the program as its main module with the same limits and isolation as a new process. The
+children never share state, as the driver does not run the programs, but a program can still tell
+the zygote apart from a new 'python3':
+    - The modules imported by the driver and the preloaded ones are already in 'sys.modules', and
+      the time to import them is not part of the time of the case.
+    - All the cases share the hash seed of the driver, so the order of the sets of strings (and of
+      the other hashes of strings and bytes) is the same on each case.
+    - The frames of the driver are reachable from the program (e.g. with 'sys._getframe'), with the
+      manifest and the return codes of the previous cases.
+So the zygote is only used when the task enables it (check the option 'python_zygote' of the grader).
+"""
+
+import atexit
+import ctypes
+import importlib
+import json
+import math
+import os
+import resource
+import runpy
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+MEMORY_LIMIT_CODE = 252
+TIME_LIMIT_CODE = 253
+INTERNAL_ERROR_CODE = 254
+
+# Interval in seconds to check whether the running case has finished or exceeded its memory limit
+_POLL_INTERVAL = 0.005
+
+# Options of prctl (check 'man 2 prctl')
+_PR_SET_DUMPABLE = 4
+_PR_SET_CHILD_SUBREAPER = 36
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+class IsolationError(Exception):
+    pass
+
+
+def _prctl(option, value):
+    """ Sets an option of the driver process with prctl, raising an IsolationError if it fails """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.prctl(option, value, 0, 0, 0) == 0:
+            return
+    except (OSError, AttributeError):
+        pass
+    raise IsolationError("prctl(%d) is not available" % option)
+
+
+def _get_descendants():
+    """
+    Returns the pids of all the descendants of the driver, i.e. the processes of the running case, as
+    the driver is their subreaper.
+    """
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % name, "rb") as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            # The process already finished
+            continue
+        # The name of the process, between parentheses, might contain spaces
+        parent_pid = int(stat[stat.rindex(b")") + 2:].split()[1])
+        children.setdefault(parent_pid, []).append(int(name))
+
+    descendants = []
+    pending = [os.getpid()]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            descendants.append(child)
+            pending.append(child)
+    return descendants
+
+
+def _get_resident_memory(pids):
+    """ Returns the amount of bytes of memory used by the given processes """
+    memory = 0
+    for pid in pids:
+        try:
+            with open("/proc/%d/statm" % pid, "rb") as statm_file:
+                memory += int(statm_file.read().split()[1]) * _PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+    return memory
+
+
+def _kill(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _reap_children():
+    """ Reaps the children of the driver that already finished """
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _kill_descendants():
+    """ Kills and reaps all the processes of the case, until none of them is left """
+    descendants = _get_descendants()
+    while descendants:
+        _kill(descendants)
+        time.sleep(_POLL_INTERVAL)
+        _reap_children()
+        descendants = _get_descendants()
+
+
+def _set_case_limits(cpu_time, output_limit):
+    """ Returns a function that applies the per-case limits in the child process before the exec """
+
+    def set_limits():
+        soft_limit = int(math.ceil(cpu_time))
+        resource.setrlimit(resource.RLIMIT_CPU, (soft_limit, soft_limit + 1))
+        if output_limit is not None:
+            resource.setrlimit(resource.RLIMIT_FSIZE, (output_limit + 1, output_limit + 1))
+
+    return set_limits
+
+
+def _wait_case(pid, hard_time, memory):
+    """
+    Waits for the given process up to hard_time seconds, killing all the processes of the case when the
+    time is exceeded or they use more than memory MBs. Returns a tuple of (status, rusage, exceeded_limit),
+    where exceeded_limit is the return code of the exceeded limit, or None.
+    """
+    deadline = time.monotonic() + hard_time
+    while True:
+        waited_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+        if waited_pid != 0:
+            return status, rusage, None
+
+        exceeded_limit = None
+        descendants = _get_descendants()
+        if time.monotonic() > deadline:
+            exceeded_limit = TIME_LIMIT_CODE
+        elif _get_resident_memory(descendants) > memory * 2 ** 20:
+            exceeded_limit = MEMORY_LIMIT_CODE
+        if exceeded_limit is not None:
+            _kill(descendants)
+            waited_pid, status, rusage = os.wait4(pid, 0)
+            return status, rusage, exceeded_limit
+        time.sleep(_POLL_INTERVAL)
+
+
+def _start_process(command, input_file, stdout_file, stderr_file, set_limits):
+    """ Starts the command in a new process and session, returning its pid """
+    process = subprocess.Popen(command, stdin=input_file, stdout=stdout_file, stderr=stderr_file,
+                               preexec_fn=set_limits, start_new_session=True)
+    return process.pid
+
+
+def _preload_modules(modules):
+    """ Imports the given modules in the zygote, ignoring the ones that are not available """
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+
+def _get_exit_code(code):
+    """ Returns the exit code of a SystemExit with the given code, as the interpreter does """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xFF
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run_python_program(arguments):
+    """
+    Runs the Python program with the given arguments (the program first) in the forked child, as
+    'python3' does with its standard streams, and returns its exit code.
+    """
+    sys.argv = list(arguments)
+    sys.path[0] = os.path.dirname(os.path.abspath(arguments[0]))
+    sys.stdin = sys.__stdin__ = open(0, "r", closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, "w", closefd=False)
+    sys.stderr = sys.__stderr__ = open(2, "w", errors="backslashreplace", closefd=False, buffering=1)
+    if "random" in sys.modules:
+        # A new interpreter seeds its generator, instead of repeating the one of the zygote
+        sys.modules["random"].seed()
+
+    try:
+        runpy.run_path(arguments[0], run_name="__main__")
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = _get_exit_code(e.code)
+    except BaseException as e:
+        # The frames of the driver are not part of the traceback of the program
+        program_traceback = e.__traceback__
+        while program_traceback is not None and \
+                program_traceback.tb_frame.f_code.co_filename != sys.argv[0]:
+            program_traceback = program_traceback.tb_next
+        traceback.print_exception(type(e), e, program_traceback)
+        exit_code = 1
+
+    # As the interpreter before exiting, wait for the threads of the program and run its exit functions
+    if "threading" in sys.modules:
+        sys.modules["threading"]._shutdown()
+    atexit._run_exitfuncs()
+    try:
+        sys.stdout.flush()
+    except OSError:
+        # As the interpreter, when the output cannot be written (e.g. it exceeded its limit)
+        exit_code = 120
+    return exit_code
+
+
+def _fork_python_program(arguments, input_file, stdout_file, stderr_file, set_limits):
+    """ Forks the zygote into a child that runs the Python program in a new session, returning its pid """
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    exit_code = 1
+    try:
+        os.setsid()
+        set_limits()
+        os.dup2(input_file.fileno(), 0)
+        os.dup2(stdout_file.fileno(), 1)
+        os.dup2(stderr_file.fileno(), 2)
+        # The files of the other cases are not inherited, as it is done by the exec of a new process
+        os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+        exit_code = _run_python_program(arguments)
+        sys.stderr.flush()
+    finally:
+        # The child never returns to the driver
+        os._exit(exit_code)
+
+
+def run_case(command, case_files, cpu_time, hard_time, memory, output_limit=None, zygote=False):
+    """
+    Runs the command for a single case and returns its return code. With a zygote, the command is
+    run in a child of the driver (check '_fork_python_program').
+
+    The resources used by the case are taken from the resource usage of all its processes, as the limits
+    of the container apply to the whole session.
+
+    Args:
+        - command (list): The command to run.
+        - case_files (tuple): The input, stdout and stderr files of the case (check '_open_case_files').
+        - cpu_time (float), hard_time (float), memory (int): The limits of the case.
+        - output_limit (int): The maximum amount of bytes of the output, or None.
+        - zygote (bool): Whether the command is run in a child of the driver.
+    """
+    input_file, stdout_file, stderr_file = case_files
+    start = _fork_python_program if zygote else _start_process
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    pid = start(command, input_file, stdout_file, stderr_file, _set_case_limits(cpu_time, output_limit))
+    status, rusage, exceeded_limit = _wait_case(pid, hard_time, memory)
+    # The processes left by the case would use the time of the next ones, or change their outputs
+    _kill_descendants()
+    finished_children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time_used = finished_children_usage.ru_utime + finished_children_usage.ru_stime - \
+        children_usage.ru_utime - children_usage.ru_stime
+    # ru_maxrss is given in KB
+    if exceeded_limit == MEMORY_LIMIT_CODE or rusage.ru_maxrss > memory * 1024:
+        return MEMORY_LIMIT_CODE
+    if exceeded_limit == TIME_LIMIT_CODE or cpu_time_used > cpu_time:
+        return TIME_LIMIT_CODE
+    if os.WIFSIGNALED(status):
+        if os.WTERMSIG(status) == signal.SIGXCPU:
+            return TIME_LIMIT_CODE
+        return 128 + os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+
+def _open_case_files(case, directory):
+    """
+    Opens the input of the case and removes its file, and creates its stdout and stderr as unnamed
+    files, so the other cases cannot reach them. Returns a tuple with the files.
+    """
+    input_file = open(case["input"], "rb")
+    os.remove(case["input"])
+    return input_file, tempfile.TemporaryFile(dir=directory), tempfile.TemporaryFile(dir=directory)
+
+
+def _publish_output(output_file, filename):
+    """ Writes the content of an unnamed output file into the file with the given name, and closes it """
+    with output_file, open(filename, "wb") as published_file:
+        output_file.seek(0)
+        shutil.copyfileobj(output_file, published_file)
+
+
+def main(manifest_filename):
+    with open(manifest_filename, "r") as manifest_file:
+        manifest = json.load(manifest_file)
+
+    try:
+        # The processes that leave the session of a case are still descendants of the driver
+        _prctl(_PR_SET_CHILD_SUBREAPER, 1)
+        # The cases cannot reach the files opened by the driver through /proc
+        _prctl(_PR_SET_DUMPABLE, 0)
+    except IsolationError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    directory = os.path.dirname(os.path.abspath(manifest_filename))
+    cases_files = [_open_case_files(case, directory) for case in manifest["cases"]]
+
+    zygote = manifest.get("zygote")
+    if zygote is not None:
+        _preload_modules(zygote.get("preload", []))
+
+    return_codes = []
+    for case, case_files in zip(manifest["cases"], cases_files):
+        try:
+            return_code = run_case(manifest["command"], case_files, manifest["time"], manifest["hard_time"],
+                                   manifest["memory"], case.get("output_limit"), zygote is not None)
+        except OSError:
+            return_code = INTERNAL_ERROR_CODE
+        return_codes.append(return_code)
+
+    for case, (input_file, stdout_file, stderr_file) in zip(manifest["cases"], cases_files):
+        input_file.close()
+        _publish_output(stdout_file, case["stdout"])
+        _publish_output(stderr_file, case["stderr"])
+
+    json.dump(return_codes, sys.stdout)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
@@ -0,0 +1,218 @@
+"""
+This module contains a content-addressed cache of the artifacts of the builds (e.g. the binary of a
+C++ program or the classes of a Java program), so a code that was already built is not compiled again,
+as when a student submits the same code that was run with a custom input.
+
+The cache is a directory, which can be mounted in all the grading containers to share it. Each build is
+stored in a subdirectory named after the hash of its sources, language, flags and toolchain version:
+
+    <cache directory>/<key>/<artifacts of the build>
+
+The entries are written in a temporary directory and published by renaming it, and removed by renaming
+them before deleting them, so the containers that use the cache at the same time never see incomplete
+entries. The least recently used entries are removed once the cache exceeds its maximum size. The cache
+keeps an estimate of its size, so it is only walked to measure it when the estimate exceeds the maximum.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+DEFAULT_BUILD_CACHE_DIRECTORY = '/build_cache'
+# Maximum amount of bytes of the entries of the cache
+DEFAULT_MAX_SIZE = (2 ** 20) * 512
+# Prefix of the directories that are not entries, i.e. the ones being published or removed
+_TEMPORARY_PREFIX = '.tmp-'
+# Age in seconds after which a temporary directory is assumed to be left by a crashed container
+_TEMPORARY_MAX_AGE = 60 * 60
+# File with the estimated amount of bytes of the entries. The containers update it without locking, so a
+# lost update only delays the next eviction, which measures the size again
+_SIZE_FILENAME = '.size'
+
+_toolchain_versions = {}
+
+
+def get_build_cache(directory=DEFAULT_BUILD_CACHE_DIRECTORY):
+    """ Returns the BuildCache in the given directory, or None if the directory is not mounted """
+    if not os.path.isdir(directory) or not os.access(directory, os.W_OK):
+        return None
+    return BuildCache(directory)
+
+
+def get_toolchain_version(version_command):
+    """
+    Returns the output of the command that prints the version of a toolchain (e.g. ['g++', '--version']),
+    or None if it cannot be run. The version is computed once per command.
+    """
+    key = tuple(version_command)
+    if key not in _toolchain_versions:
+        try:
+            completed_process = subprocess.run(version_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            version = completed_process.stdout.decode(errors="replace")
+            _toolchain_versions[key] = version if completed_process.returncode == 0 else None
+        except OSError:
+            _toolchain_versions[key] = None
+    return _toolchain_versions[key]
+
+
+def _get_size(path):
+    """ Returns the amount of bytes of the files in the given directory """
+    size = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return size
+
+
+class BuildCache:
+    """
+    This class contains the cache of the artifacts of the builds.
+
+    Attributes:
+        - directory (str): Directory where the entries of the cache are stored.
+        - max_size (int): Maximum amount of bytes of the entries of the cache.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def compute_key(self, source_directory, source_files, build_options):
+        """
+        Returns the key of a build: the hash of the contents and relative paths of its source files and
+        of the given build options, e.g. the language, the compiler flags and the toolchain version.
+
+        Args:
+            - source_directory (str): Directory of the project.
+            - source_files (list): Paths of the sources of the build, relative to the source_directory.
+            - build_options (list): Values that change the artifacts of the build, which must be serializable as JSON.
+        """
+        key_hash = hashlib.sha256(json.dumps(build_options).encode())
+        for source_file in sorted(source_files):
+            key_hash.update(source_file.encode() + b"\0")
+            with open(os.path.join(source_directory, source_file), 'rb') as source:
+                for chunk in iter(lambda: source.read(2 ** 16), b""):
+                    key_hash.update(chunk)
+            key_hash.update(b"\0")
+        return key_hash.hexdigest()
+
+    def restore(self, key, destination_directory):
+        """
+        Copies the artifacts of the build with the given key into the destination directory. Returns whether
+        the build was in the cache.
+        """
+        entry = os.path.join(self.directory, key)
+        try:
+            # The modification time of the entry is its last use, to remove the least recently used entries
+            os.utime(entry)
+            shutil.copytree(entry, destination_directory, symlinks=True, dirs_exist_ok=True)
+            return True
+        except OSError:
+            # The entry is not in the cache, or it was removed while it was copied
+            return False
+
+    def store(self, key, source_directory, artifacts):
+        """
+        Publishes the artifacts of the build with the given key in the cache, unless they are already there.
+
+        Args:
+            - key (str): The key of the build (check 'compute_key').
+            - source_directory (str): Directory of the project.
+            - artifacts (list): Paths of the files and directories produced by the build, relative to the
+            source_directory.
+        """
+        entry = os.path.join(self.directory, key)
+        if os.path.exists(entry):
+            return
+
+        try:
+            temporary_entry = tempfile.mkdtemp(prefix=_TEMPORARY_PREFIX, dir=self.directory)
+        except OSError:
+            return
+        try:
+            for artifact in artifacts:
+                artifact_path = os.path.join(source_directory, artifact)
+                cached_path = os.path.join(temporary_entry, artifact)
+                os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+                if os.path.isdir(artifact_path):
+                    shutil.copytree(artifact_path, cached_path, symlinks=True)
+                else:
+                    shutil.copy2(artifact_path, cached_path)
+            # The entry is published at once, and only by one of the containers that built it at the same time
+            os.rename(temporary_entry, entry)
+        except OSError:
+            shutil.rmtree(temporary_entry, ignore_errors=True)
+            return
+
+        cache_size = self._read_size()
+        if cache_size is None:
+            self.evict()
+            return
+        cache_size += _get_size(entry)
+        if cache_size > self.max_size:
+            self.evict()
+        else:
+            self._write_size(cache_size)
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache does not exceed its maximum size """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name == _SIZE_FILENAME:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                last_use = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if name.startswith(_TEMPORARY_PREFIX):
+                if time.time() - last_use > _TEMPORARY_MAX_AGE:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((last_use, path, _get_size(path)))
+
+        total_size = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(path)
+            total_size -= size
+        self._write_size(total_size)
+
+    def _read_size(self):
+        """ Returns the estimated amount of bytes of the entries (check '_SIZE_FILENAME'), or None if it is unknown """
+        try:
+            with open(os.path.join(self.directory, _SIZE_FILENAME)) as size_file:
+                return int(size_file.read())
+        except (OSError, ValueError):
+            return None
+
+    def _write_size(self, size):
+        """ Replaces the estimated amount of bytes of the entries at once """
+        try:
+            file_descriptor, temporary_filename = tempfile.mkstemp(prefix=_TEMPORARY_PREFIX, dir=self.directory)
+            with os.fdopen(file_descriptor, 'w') as size_file:
+                size_file.write(str(size))
+            os.replace(temporary_filename, os.path.join(self.directory, _SIZE_FILENAME))
+        except OSError:
+            pass
+
+    def _remove(self, entry):
+        """ Removes the entry, which disappears at once for the other containers """
+        try:
+            temporary_entry = tempfile.mkdtemp(prefix=_TEMPORARY_PREFIX, dir=self.directory)
+        except OSError:
+            return
+        try:
+            os.rename(entry, os.path.join(temporary_entry, "entry"))
+        except OSError:
+            # The entry was removed by another container
+            pass
+        shutil.rmtree(temporary_entry, ignore_errors=True)
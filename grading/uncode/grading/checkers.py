@@ -0,0 +1,551 @@
+"""
+This module contains the output checkers, which decide whether the output of a program is
+accepted, has a presentation error or is a wrong answer when compared against the expected output.
+
+A checker receives the output of the program chunk by chunk (bytes), and reads the expected
+output (a bytes-like object, e.g. a memory-mapped file) lazily, so both outputs are compared in a
+single pass without building intermediate copies of them.
+
+Checkers:
+    - exact: Both outputs must be equal. Presentation error if they have the same tokens.
+    - whitespace: The lines must be equal after collapsing the whitespaces of each line, ignoring
+      trailing blank lines. Presentation error if they have the same tokens.
+    - case_insensitive: Both outputs must be equal ignoring the case. Presentation error if they have
+      the same tokens ignoring the case.
+    - line_order: Both outputs must have the same lines in any order. Presentation error if they
+      have the same whitespace-collapsed lines in any order.
+    - tokens: Both outputs must have the same tokens. There is no presentation error.
+    - float: Both outputs must have the same tokens, where the numeric tokens are compared with an
+      absolute and relative tolerance. There is no presentation error.
+"""
+
+from abc import ABCMeta, abstractmethod
+from collections import Counter, namedtuple
+import itertools
+import math
+import re
+
+from results import GraderResult
+
+try:
+    import numpy
+except ImportError:
+    # The float checker falls back to plain Python when NumPy is not installed
+    numpy = None
+
+_TOKEN_REGEX = re.compile(rb"[^ \r\t\n]+")
+
+
+def _identity(data):
+    return data
+
+
+def _collapse_whitespaces(line):
+    return b" ".join(line.split())
+
+
+def iter_lines(data):
+    """ Generates the lines (without line breaks) of the given bytes-like object, without splitting it at once """
+    start = 0
+    while start < len(data):
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+        yield data[start:end]
+        start = end + 1
+
+
+def _skip_trailing_blank_lines(lines):
+    """ Generates the given whitespace-collapsed lines, except for the blank lines at the end """
+    pending_blank_lines = 0
+    for line in lines:
+        if not line:
+            pending_blank_lines += 1
+            continue
+        for _ in range(pending_blank_lines):
+            yield b""
+        pending_blank_lines = 0
+        yield line
+
+
+class _LineSplitter:
+    """
+    Splits the chunks of a stream into complete lines, keeping the pieces of the incomplete line for the
+    next chunks. They are only joined once the line ends, so a long line is not copied on each chunk.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def feed(self, chunk):
+        if b"\n" not in chunk:
+            self._pending.append(chunk)
+            return []
+        lines = chunk.split(b"\n")
+        self._pending.append(lines[0])
+        lines[0] = b"".join(self._pending)
+        self._pending = [lines.pop()]
+        return lines
+
+    def finish(self):
+        line = b"".join(self._pending)
+        self._pending = []
+        return [line] if line else []
+
+
+class _TokenSplitter:
+    """
+    Splits the chunks of a stream into complete tokens (split by whitespaces), keeping the pieces of the
+    incomplete token for the next chunks. They are only joined once the token ends, so a long token is
+    not copied on each chunk.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def feed(self, chunk):
+        tokens = []
+        end = 0
+        for match in _TOKEN_REGEX.finditer(chunk):
+            if match.start() > 0:
+                # A whitespace before the token ends the pending one
+                self._flush(tokens)
+            self._pending.append(match.group())
+            end = match.end()
+        if end < len(chunk):
+            # The chunk ends with whitespaces, otherwise the last token might continue in the next chunk
+            self._flush(tokens)
+        return tokens
+
+    def finish(self):
+        tokens = []
+        self._flush(tokens)
+        return tokens
+
+    def _flush(self, tokens):
+        if self._pending:
+            tokens.append(b"".join(self._pending))
+            self._pending = []
+
+
+class _PrefixMatcher:
+    """ Compares a stream byte by byte against the expected output, after applying a transformation """
+
+    def __init__(self, expected_output, transform=_identity):
+        self._expected_output = expected_output
+        self._transform = transform
+        self._size = 0
+        self.matches = True
+
+    def feed(self, chunk):
+        if self.matches:
+            expected_chunk = self._expected_output[self._size:self._size + len(chunk)]
+            self.matches = self._transform(chunk) == self._transform(expected_chunk)
+        self._size += len(chunk)
+
+    def finish(self):
+        self.matches = self.matches and self._size == len(self._expected_output)
+
+
+class _TokenMatcher:
+    """
+    Compares the tokens (split by whitespaces) of a stream against the tokens of the expected output,
+    which are generated lazily. The comparison stops at the first different token.
+    """
+
+    def __init__(self, expected_output, transform=_identity):
+        self._expected_tokens = _TOKEN_REGEX.finditer(expected_output)
+        self._transform = transform
+        self._splitter = _TokenSplitter()
+        self.matches = True
+
+    def feed(self, chunk):
+        self._match_tokens(self._splitter.feed(chunk))
+
+    def finish(self):
+        self._match_tokens(self._splitter.finish())
+        if self.matches and next(self._expected_tokens, None) is not None:
+            self.matches = False
+        self._expected_tokens = None
+
+    def _match_tokens(self, tokens):
+        for token in tokens:
+            if not self._match_token(token):
+                break
+
+    def _match_token(self, token):
+        expected_token = next(self._expected_tokens, None)
+        if expected_token is None or self._transform(expected_token.group()) != self._transform(token):
+            self.matches = False
+        return self.matches
+
+
+class OutputChecker(metaclass=ABCMeta):
+    """
+    Represents a checker that compares the output of a program, received chunk by chunk, against
+    the expected output. The result is only valid once finish has been called.
+    """
+
+    def __init__(self, expected_output):
+        """
+        Args:
+            - expected_output (bytes-like): The expected output, e.g. bytes or a memory-mapped file.
+        """
+        self._expected_output = expected_output
+
+    @abstractmethod
+    def write(self, chunk):
+        """ Receives the next chunk (bytes) of the program's output """
+        pass
+
+    @abstractmethod
+    def finish(self):
+        """ Called once the program's output has ended """
+        pass
+
+    @property
+    @abstractmethod
+    def result(self):
+        """ Returns GraderResult.ACCEPTED, GraderResult.PRESENTATION_ERROR or GraderResult.WRONG_ANSWER """
+        pass
+
+    def report(self):
+        """ Returns a description (str) of the difference between the outputs, or None if there is none """
+        return None
+
+    @classmethod
+    def run(cls, output, expected_output, **checker_options):
+        """ Returns a finished checker that received the complete output (bytes) """
+        checker = cls(expected_output, **checker_options)
+        checker.write(output)
+        checker.finish()
+        return checker
+
+    @classmethod
+    def check(cls, output, expected_output, **checker_options):
+        """ Returns the result of checking the complete output (bytes) against the expected output """
+        return cls.run(output, expected_output, **checker_options).result
+
+
+class ExactChecker(OutputChecker):
+    transform = staticmethod(_identity)
+
+    def __init__(self, expected_output):
+        super().__init__(expected_output)
+        self._bytes_matcher = _PrefixMatcher(expected_output, self.transform)
+        self._token_matcher = _TokenMatcher(expected_output, self.transform)
+
+    def write(self, chunk):
+        self._bytes_matcher.feed(chunk)
+        self._token_matcher.feed(chunk)
+
+    def finish(self):
+        self._bytes_matcher.finish()
+        self._token_matcher.finish()
+
+    @property
+    def result(self):
+        if self._bytes_matcher.matches:
+            return GraderResult.ACCEPTED
+        if self._token_matcher.matches:
+            return GraderResult.PRESENTATION_ERROR
+        return GraderResult.WRONG_ANSWER
+
+
+class CaseInsensitiveChecker(ExactChecker):
+    transform = staticmethod(bytes.lower)
+
+
+class WhitespaceChecker(OutputChecker):
+    def __init__(self, expected_output):
+        super().__init__(expected_output)
+        self._splitter = _LineSplitter()
+        self._expected_lines = _skip_trailing_blank_lines(
+            _collapse_whitespaces(line) for line in iter_lines(expected_output))
+        self._pending_blank_lines = 0
+        self._lines_match = True
+        self._token_matcher = _TokenMatcher(expected_output)
+
+    def write(self, chunk):
+        self._token_matcher.feed(chunk)
+        if self._lines_match:
+            self._match_lines(self._splitter.feed(chunk))
+
+    def finish(self):
+        self._token_matcher.finish()
+        if self._lines_match:
+            self._match_lines(self._splitter.finish())
+        # The pending blank lines are trailing blank lines, which are ignored
+        if self._lines_match and next(self._expected_lines, None) is not None:
+            self._lines_match = False
+        self._expected_lines = None
+
+    @property
+    def result(self):
+        if self._lines_match:
+            return GraderResult.ACCEPTED
+        if self._token_matcher.matches:
+            return GraderResult.PRESENTATION_ERROR
+        return GraderResult.WRONG_ANSWER
+
+    def _match_lines(self, lines):
+        for line in lines:
+            line = _collapse_whitespaces(line)
+            if not line:
+                self._pending_blank_lines += 1
+                continue
+            for _ in range(self._pending_blank_lines):
+                if not self._match_line(b""):
+                    return
+            self._pending_blank_lines = 0
+            if not self._match_line(line):
+                return
+
+    def _match_line(self, line):
+        if next(self._expected_lines, None) != line:
+            self._lines_match = False
+        return self._lines_match
+
+
+class LineOrderChecker(OutputChecker):
+    """
+    The lines of the program's output are counted as a multiset of line hashes, then the lines
+    of the expected output are discounted from it.
+    """
+
+    def __init__(self, expected_output):
+        super().__init__(expected_output)
+        self._splitter = _LineSplitter()
+        self._lines = Counter()
+        self._collapsed_lines = Counter()
+        self._lines_match = False
+        self._collapsed_lines_match = False
+
+    def write(self, chunk):
+        self._count_lines(self._splitter.feed(chunk))
+
+    def finish(self):
+        self._count_lines(self._splitter.finish())
+        for line in iter_lines(self._expected_output):
+            self._lines[hash(line)] -= 1
+            self._collapsed_lines[hash(_collapse_whitespaces(line))] -= 1
+        self._lines_match = not any(self._lines.values())
+        self._collapsed_lines_match = not any(self._collapsed_lines.values())
+        self._lines = self._collapsed_lines = None
+
+    @property
+    def result(self):
+        if self._lines_match:
+            return GraderResult.ACCEPTED
+        if self._collapsed_lines_match:
+            return GraderResult.PRESENTATION_ERROR
+        return GraderResult.WRONG_ANSWER
+
+    def _count_lines(self, lines):
+        for line in lines:
+            self._lines[hash(line)] += 1
+            self._collapsed_lines[hash(_collapse_whitespaces(line))] += 1
+
+
+class TokensChecker(OutputChecker):
+    def __init__(self, expected_output):
+        super().__init__(expected_output)
+        self._token_matcher = _TokenMatcher(expected_output)
+
+    def write(self, chunk):
+        self._token_matcher.feed(chunk)
+
+    def finish(self):
+        self._token_matcher.finish()
+
+    @property
+    def result(self):
+        return GraderResult.ACCEPTED if self._token_matcher.matches else GraderResult.WRONG_ANSWER
+
+
+Deviation = namedtuple("Deviation", ["index", "actual", "expected", "error"])
+Deviation.__doc__ = """ A token out of the tolerance. The tokens are None when one of the outputs is shorter """
+
+
+def _parse_tokens(tokens):
+    """
+    Parses the given tokens (bytes) as floats. Returns a pair with the values, where the non numeric
+    tokens are NaN, and the sorted indices of the non numeric tokens.
+    """
+    if numpy is not None:
+        try:
+            return numpy.array(tokens, dtype=bytes).astype(numpy.float64), []
+        except ValueError:
+            # Some token is not a number, so the tokens are parsed one by one
+            pass
+
+    values = []
+    text_indices = []
+    for index, token in enumerate(tokens):
+        try:
+            values.append(float(token))
+        except ValueError:
+            values.append(math.nan)
+            text_indices.append(index)
+    if numpy is not None:
+        values = numpy.array(values, dtype=numpy.float64)
+    return values, text_indices
+
+
+def _find_deviations(actual_values, expected_values, absolute_tolerance, relative_tolerance):
+    """
+    Returns a pair with the indices of the values out of the tolerance and their errors. Two values are
+    within the tolerance when |actual - expected| <= max(absolute_tolerance, relative_tolerance * |expected|).
+    NaN only matches NaN and infinity only matches the infinity of the same sign.
+    """
+    if numpy is not None:
+        with numpy.errstate(invalid="ignore"):
+            errors = numpy.abs(actual_values - expected_values)
+            tolerances = numpy.maximum(absolute_tolerance, relative_tolerance * numpy.abs(expected_values))
+            within_tolerance = (numpy.isfinite(expected_values) & (errors <= tolerances)) | \
+                (actual_values == expected_values) | \
+                (numpy.isnan(actual_values) & numpy.isnan(expected_values))
+        indices = numpy.flatnonzero(~within_tolerance)
+        errors = numpy.nan_to_num(errors[indices], nan=math.inf, posinf=math.inf)
+        return indices.tolist(), errors.tolist()
+
+    indices = []
+    errors = []
+    for index, (actual, expected) in enumerate(zip(actual_values, expected_values)):
+        if actual == expected or math.isnan(actual) and math.isnan(expected):
+            continue
+        error = abs(actual - expected)
+        if not math.isfinite(expected) or math.isnan(error) or error > max(absolute_tolerance, relative_tolerance * abs(expected)):
+            indices.append(index)
+            errors.append(math.inf if math.isnan(error) else error)
+    return indices, errors
+
+
+class FloatChecker(OutputChecker):
+    """
+    The tokens of both outputs are parsed as floats in bulk (with NumPy when it is available), one
+    chunk of the program's output at a time, and compared at once against the expected values. The
+    expected tokens are read lazily, as many as the tokens of each chunk. The tokens that are not
+    numbers must be equal.
+
+    Attributes:
+        - first_deviation (Deviation): The first token out of the tolerance, or None.
+        - worst_deviation (Deviation): The token with the largest error, or None.
+    """
+
+    def __init__(self, expected_output, absolute_tolerance=1e-9, relative_tolerance=1e-9):
+        """
+        Args:
+            - expected_output (bytes-like): The expected output, e.g. bytes or a memory-mapped file.
+            - absolute_tolerance (float): The maximum absolute error of a value.
+            - relative_tolerance (float): The maximum error of a value, relative to the expected value.
+        """
+        super().__init__(expected_output)
+        self.absolute_tolerance = absolute_tolerance
+        self.relative_tolerance = relative_tolerance
+        self.first_deviation = None
+        self.worst_deviation = None
+        self._expected_tokens = _TOKEN_REGEX.finditer(expected_output)
+        self._splitter = _TokenSplitter()
+        self._size = 0
+        self._extra_token = None
+
+    def write(self, chunk):
+        self._compare(self._splitter.feed(chunk))
+
+    def finish(self):
+        self._compare(self._splitter.finish())
+        # When one of the outputs is shorter, its first missing token is reported as a deviation
+        if self._extra_token is not None:
+            self._add_deviation(Deviation(self._size, self._extra_token, None, math.inf))
+        else:
+            missing_token = next(self._expected_tokens, None)
+            if missing_token is not None:
+                self._add_deviation(Deviation(self._size, None, missing_token.group().decode(errors="replace"),
+                                              math.inf))
+        self._expected_tokens = None
+
+    @property
+    def result(self):
+        return GraderResult.ACCEPTED if self.first_deviation is None else GraderResult.WRONG_ANSWER
+
+    def report(self):
+        if self.first_deviation is None:
+            return None
+        return "First difference: %s. Largest difference: %s." % (
+            _describe_deviation(self.first_deviation), _describe_deviation(self.worst_deviation))
+
+    def _compare(self, tokens):
+        """ Compares the tokens against the next expected tokens. The size only counts the expected tokens """
+        if not tokens or self._extra_token is not None:
+            return
+        start = self._size
+        expected_tokens = [match.group() for match in itertools.islice(self._expected_tokens, len(tokens))]
+        self._size += len(expected_tokens)
+        if len(tokens) > len(expected_tokens):
+            # The output is longer than the expected one, so the rest of its tokens are not compared
+            self._extra_token = tokens[len(expected_tokens)].decode(errors="replace")
+        if not expected_tokens:
+            return
+
+        tokens = tokens[:len(expected_tokens)]
+        values, text_indices = _parse_tokens(tokens)
+        expected_values, expected_text_indices = _parse_tokens(expected_tokens)
+        indices, errors = _find_deviations(values, expected_values, self.absolute_tolerance, self.relative_tolerance)
+        deviations = dict(zip(indices, errors))
+
+        # The non numeric tokens, on any of the outputs, are compared as text
+        for index in set(text_indices).union(expected_text_indices):
+            if tokens[index] == expected_tokens[index]:
+                deviations.pop(index, None)
+            else:
+                deviations[index] = math.inf
+
+        if deviations:
+            first_index = min(deviations)
+            worst_index = max(deviations, key=lambda index: (deviations[index], -index))
+            for index in (first_index, worst_index):
+                self._add_deviation(Deviation(start + index, tokens[index].decode(errors="replace"),
+                                              expected_tokens[index].decode(errors="replace"),
+                                              deviations[index]))
+
+    def _add_deviation(self, deviation):
+        if self.first_deviation is None:
+            self.first_deviation = deviation
+        if self.worst_deviation is None or deviation.error > self.worst_deviation.error:
+            self.worst_deviation = deviation
+
+
+def _describe_deviation(deviation):
+    if deviation.actual is None:
+        return "token %d is missing (expected %s)" % (deviation.index + 1, deviation.expected)
+    if deviation.expected is None:
+        return "token %d was not expected (got %s)" % (deviation.index + 1, deviation.actual)
+    return "token %d is %s, expected %s (error %g)" % (deviation.index + 1, deviation.actual, deviation.expected,
+                                                       deviation.error)
+
+
+_ALL_CHECKERS = {
+    "exact": ExactChecker,
+    "whitespace": WhitespaceChecker,
+    "case_insensitive": CaseInsensitiveChecker,
+    "line_order": LineOrderChecker,
+    "tokens": TokensChecker,
+    "float": FloatChecker,
+}
+
+
+def checker_exists(name):
+    return name in _ALL_CHECKERS
+
+
+def get_checker_from_name(name):
+    """
+    Returns the OutputChecker class associated to the given name.
+    Raises ValueError if no checker is associated to that name.
+    """
+
+    if not checker_exists(name):
+        raise ValueError("Checker does not exist: " + str(name))
+
+    return _ALL_CHECKERS[name]
@@ -0,0 +1,98 @@
+"""
+This module keeps the failure statistics of the test cases of a task, which are used to run first
+the test cases that are most likely to fail.
+
+The statistics are stored as a small JSON file, with the amount of runs and failures of each test case,
+identified by its input filename:
+
+    {"tests/1.in": {"runs": 10, "failures": 3}, ...}
+
+The file must be kept between the gradings to build up the statistics. In INGInious, the task directory
+is copied for each grading, so a file in it (as DEFAULT_STATISTICS_FILENAME) only keeps the statistics of
+the grading itself. The file of each task should be in a volume mounted in all the grading containers,
+as the build cache (check 'build_cache.py'). The gradings that share the file at the same time add their
+results to it, instead of replacing the results of the others (check 'save').
+"""
+
+import json
+import os
+import tempfile
+
+from results import GraderResult
+
+DEFAULT_STATISTICS_FILENAME = '/task/.failure_statistics.json'
+
+
+class FailureStatistics:
+    """
+    This class contains the failure statistics of the test cases of a task.
+
+    Attributes:
+        - filename (str): Name of the file where the statistics are stored.
+    """
+
+    def __init__(self, filename=DEFAULT_STATISTICS_FILENAME):
+        self.filename = filename
+        self._statistics = self._load()
+        # Runs and failures recorded since the statistics were last saved
+        self._recorded = {}
+
+    def _load(self):
+        """ Returns the statistics stored in the file """
+        try:
+            with open(self.filename, 'r') as statistics_file:
+                return json.load(statistics_file)
+        except (OSError, ValueError):
+            # There are no statistics yet, or they could not be read
+            return {}
+
+    def get_failure_probability(self, input_filename):
+        """
+        Returns the estimated probability that the test case with the given input fails. The
+        estimation is smoothed, so a test case without runs has a probability of 0.5.
+        """
+        test_statistics = self._statistics.get(input_filename, {})
+        return (test_statistics.get("failures", 0) + 1) / (test_statistics.get("runs", 0) + 2)
+
+    def sort_by_failure_probability(self, test_cases):
+        """
+        Returns the indices of the given test cases sorted from the most likely to fail to the least
+        likely to fail. Test cases with the same probability keep their order.
+        """
+        return sorted(range(len(test_cases)),
+                      key=lambda index: -self.get_failure_probability(test_cases[index][0]))
+
+    def record(self, test_cases, results):
+        """ Adds the results of a grading, ignoring the test cases that were not run """
+        for (input_filename, _), result in zip(test_cases, results):
+            if result in (GraderResult.NOT_RUN, GraderResult.COMPILATION_ERROR):
+                continue
+            for statistics in (self._statistics, self._recorded):
+                test_statistics = statistics.setdefault(input_filename, {"runs": 0, "failures": 0})
+                test_statistics["runs"] += 1
+                if result != GraderResult.ACCEPTED:
+                    test_statistics["failures"] += 1
+
+    def save(self):
+        """
+        Adds the results recorded since the last save to the statistics in the file, which might have been
+        updated by other gradings. The file is replaced atomically, so a grading running at the same time
+        never reads a partial file.
+        """
+        statistics = self._load()
+        for input_filename, recorded_statistics in self._recorded.items():
+            test_statistics = statistics.setdefault(input_filename, {"runs": 0, "failures": 0})
+            test_statistics["runs"] += recorded_statistics["runs"]
+            test_statistics["failures"] += recorded_statistics["failures"]
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        file_descriptor, temporary_filename = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(file_descriptor, 'w') as statistics_file:
+                json.dump(statistics, statistics_file)
+            os.replace(temporary_filename, self.filename)
+        except OSError:
+            os.unlink(temporary_filename)
+            raise
+        self._statistics = statistics
+        self._recorded = {}
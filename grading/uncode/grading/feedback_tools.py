@@ -9,14 +9,26 @@ TO DO:
     - Charts: Donut, Bars
 """
 
-import difflib
+import html
+import io
 import itertools
+import json
+import os
 import sys
 
-from graders_utils import reduce_text, html_to_rst as html2rst
+import line_diff
+from graders_utils import reduce_text, compress_text, decompress_text, encode_compact, html_to_rst as html2rst
 from inginious import feedback
+from output_streams import find_diff_window
 from results import GraderResult
 
+#  800 KBs will be the max length of stdout and expected output to calculate diff
+DIFF_MAX_LENGTH = (2 ** 10) * 800
+
+# Fields of the debug information of a test case that are dropped when the feedback exceeds its budget,
+# in the order they are kept
+BUDGETED_FIELDS = ["checker_report", "stderr", "diff", "client_diff", "stdout"]
+
 
 class Diff:
     """
@@ -26,6 +38,12 @@ class Diff:
     Attributes:
         - diff_max_lines (int): The maximum number of lines that the diff tool should show
         - diff_context_lines (int): The diff tool context lines to use. # TODO Better Resume
+        - diff_max_edits (int): The maximum amount of different lines searched by the diff tool. The lines
+        after them are shown as replaced (check 'line_diff.py').
+        - client_side_diff (bool): Whether the diff is left to the frontend, instead of being computed by the
+        grader. The feedback then has the compressed output of the program around the first mismatch, cut to
+        diff_max_lines lines, and the name of the expected output file, instead of the diff (check 'client_diff').
+        The html block shows that output as it is.
         - output_diff_for (set): Group of str containing the test cases for which the diff
         tool is going to be used.
         - testcase_template (str): Containing the html code for presenting the diff of
@@ -44,6 +62,8 @@ class Diff:
         """
         self.diff_max_lines = options.get("diff_max_lines", 100)
         self.diff_context_lines = options.get("diff_context_lines", 3)
+        self.diff_max_edits = options.get("diff_max_edits", line_diff.DEFAULT_MAX_EDITS)
+        self.client_side_diff = options.get("client_side_diff", False)
         self.output_diff_for = set(options.get("output_diff_for", []))
         self.custom_feedback = options.get("custom_feedback", {})
         self.show_input = options.get('show_input', False)
@@ -65,38 +85,56 @@ class Diff:
                                   """)
         self.diff_template = """<pre id="{block_id}"></pre>
                                 <script>updateDiffBlock("{block_id}", `{diff_result}`);</script>"""
+        self.client_diff_template = _("""<p>Output from line {first_line} (expected output: {expected_output_file})</p>
+                                       <pre id="{block_id}">{actual_output}</pre>""")
         self.custom_feedback_template = _("""<p>Custom feedback</p><pre>{custom_feedback}</pre><br>""")
+        self.checker_report_template = """<p>{checker_report}</p>"""
         self.runtime_error_template = """<p>Error: </p><br><pre>{stderr}</pre>"""
 
         self.not_debug_info_template = """<ul><li><strong>Test {0}: {1} </strong></li></ul>"""
 
-    def compute(self, current_output, expected_output):
+    def compute(self, current_output, expected_output, first_line=1, truncated=False):
         """
         Computes a diff between the program output and the expected output.
         This function will strip the diff to diff_max_lines, and provide a context of diff_context_lines
         for each difference found.
 
+        When any of the outputs is longer than DIFF_MAX_LENGTH, the diff is computed only on the region
+        of both outputs around their first mismatch (check 'find_diff_window').
+
         Args:
             - actual_output (str): First text given for the diff tool.
             - expected_output (str): Second text given for the diff tool.
+            - first_line (int): Number of the line where both texts start, when they are a region of
+            longer outputs (check 'output_streams.DiffWindow').
+            - truncated (bool): Whether the texts are regions of longer outputs that go on after them.
         """
-        #  800 KBs will be the max length of stdout and expected output to calculate diff
-        _max_length = (2 ** 10) * 800
-        expected_output = reduce_text(expected_output, _max_length)
+        if len(current_output) > DIFF_MAX_LENGTH or len(expected_output) > DIFF_MAX_LENGTH:
+            current_output, expected_output, window_first_line, window_truncated = find_diff_window(
+                io.BytesIO(current_output.encode()), io.BytesIO(expected_output.encode()), DIFF_MAX_LENGTH // 2)
+            first_line += window_first_line - 1
+            truncated = truncated or window_truncated
+
+        expected_output = reduce_text(expected_output, DIFF_MAX_LENGTH)
         expected_output_lines = expected_output.splitlines()
-        # In case the expected output has an end of line at the end, add it to the split lines.
-        if expected_output and expected_output[-1] == '\n':
+        # In case the expected output has an end of line at the end, add it to the split lines. A truncated
+        # output is cut at a line end, so it is not its actual end.
+        if expected_output and expected_output[-1] == '\n' and not truncated:
             expected_output_lines.append("\n")
 
-        actual_output = reduce_text(current_output, _max_length)
+        actual_output = reduce_text(current_output, DIFF_MAX_LENGTH)
         actual_output_lines = actual_output.splitlines()
         # In case the actual output has an end of line at the end, add it to the split lines.
-        if actual_output and actual_output[-1] == '\n':
+        if actual_output and actual_output[-1] == '\n' and not truncated:
             actual_output_lines.append("\n")
 
-        diff_generator = difflib.unified_diff(expected_output_lines, actual_output_lines, n=self.diff_context_lines,
-                                              fromfile="expected_output",
-                                              tofile="your_output")
+        # The diff is generated lazily, so it stops once diff_max_lines lines are taken
+        diff_generator = line_diff.unified_diff(expected_output_lines, actual_output_lines, n=self.diff_context_lines,
+                                                fromfile="expected_output",
+                                                tofile="your_output",
+                                                first_line=first_line,
+                                                max_edits=self.diff_max_edits,
+                                                truncated=truncated)
 
         # Remove file names (legend will be added in the frontend)
         start = 2
@@ -114,6 +152,25 @@ class Diff:
 
         return diff_output
     
+    def client_diff(self, diff_window, expected_output_filename):
+        """
+        Returns the information for computing the diff in the frontend (check 'client_side_diff'): the
+        output of the program around the first mismatch, cut to diff_max_lines lines and compressed
+        (check 'graders_utils.compress_text'), the name of the expected output file and the number of
+        the line where the output starts.
+
+        Args:
+            - diff_window (DiffWindow): The region of both outputs around the first mismatch
+            (check 'output_streams.find_diff_window').
+            - expected_output_filename (str): Name of the expected output file, which the frontend can access.
+        """
+        return {
+            "actual_output": compress_text("".join(itertools.islice(
+                diff_window.actual_output.splitlines(keepends=True), self.diff_max_lines))),
+            "expected_output_file": expected_output_filename,
+            "first_line": diff_window.first_line,
+        }
+
     def get_options_dict(self):
         """
         This method creates a dictionary containing the information of the options required for the feedback
@@ -125,6 +182,7 @@ class Diff:
             "output_diff_for":list(self.output_diff_for),
             "custom_feedback":self.custom_feedback,
             "show_input":self.show_input,
+            "client_side_diff":self.client_side_diff,
         }
         return options
 
@@ -143,13 +201,15 @@ class Diff:
             a single test case.
         """
         input_filename = test_case[0]
-        if result in [GraderResult.ACCEPTED, GraderResult.INTERNAL_ERROR] or input_filename not in self.output_diff_for and not is_staff:
+        if result in [GraderResult.ACCEPTED, GraderResult.INTERNAL_ERROR, GraderResult.NOT_RUN] or input_filename not in self.output_diff_for and not is_staff:
             text = self.not_debug_info_template.format(
                 test_id + 1, result.name)
             return html2rst(text)
 
         diff_result = debug_info.get("files_feedback", {}).get(input_filename, {}).get("diff", None)
         stderr = debug_info.get("files_feedback", {}).get(input_filename, {}).get("stderr", "")
+        checker_report = debug_info.get("files_feedback", {}).get(input_filename, {}).get("checker_report", None)
+        client_diff = debug_info.get("files_feedback", {}).get(input_filename, {}).get("client_diff", None)
         diff_available = diff_result is not None
         input_text = get_input_sample(test_case)
         template_info = {
@@ -171,9 +231,18 @@ class Diff:
         if self.show_input:
             template.append(self.input_template)
 
+        if checker_report is not None:
+            template_info["checker_report"] = checker_report
+            template.append(self.checker_report_template)
+
         if diff_available:
             template_info["diff_result"] = escape_text(diff_result)
             template.append(self.diff_template)
+        elif client_diff is not None:
+            template_info["first_line"] = client_diff["first_line"]
+            template_info["expected_output_file"] = html.escape(os.path.basename(client_diff["expected_output_file"]))
+            template_info["actual_output"] = html.escape(decompress_text(client_diff["actual_output"]))
+            template.append(self.client_diff_template)
 
         if GraderResult.RUNTIME_ERROR == result:
             template_info["stderr"] = stderr
@@ -185,6 +254,88 @@ class Diff:
         return html2rst(diff_html)
 
 
+def apply_feedback_budget(debug_info, input_filenames, budget):
+    """
+    Shares a budget of bytes among the debug information of the test cases (check 'BUDGETED_FIELDS'),
+    giving priority to the first test cases. Once a field does not fit in the remaining budget, it is
+    set to None and its name is added to the 'dropped' list of its test case, so the frontend can tell
+    it apart from a missing field.
+
+    Args:
+        - debug_info (dict): The debug information of the grading, with the 'files_feedback' of each test case.
+        - input_filenames (list): The input filenames of the test cases, in order of priority.
+        - budget (int): Amount of bytes of the budgeted fields, measured as JSON.
+    """
+    files_feedback = debug_info.get("files_feedback", {})
+    remaining_budget = budget
+    for input_filename in input_filenames:
+        test_case_debug_info = files_feedback.get(input_filename)
+        if not test_case_debug_info:
+            continue
+        for field in BUDGETED_FIELDS:
+            if test_case_debug_info.get(field) is None:
+                continue
+            size = len(json.dumps(test_case_debug_info[field]))
+            if size <= remaining_budget:
+                remaining_budget -= size
+            else:
+                test_case_debug_info[field] = None
+                test_case_debug_info.setdefault("dropped", []).append(field)
+
+
+def encode_compact_feedback(feedback_list):
+    """
+    Encodes the feedback of the json response type, a list with the feedback of each test case followed by
+    the options for the feedback and the debug info, for the compact response type (check 'encode_compact').
+
+    The feedback of the test cases is stored by columns, one list per key, and the strings of the columns
+    that only have strings (or lists of strings, as the test cases) are replaced by their index in a table
+    of strings, so the repeated ones are stored once:
+
+        {"tests": {"count": 2, "columns": {"i": [0, 1], "test_case": [[0, 1], [2, 3]], ...},
+                   "string_columns": ["test_case", ...]},
+         "strings": ["1.in", "1.out", "2.in", "2.out", ...], "options": {...}, "debug_info": {...}}
+    """
+    tests_feedback, (options, debug_info) = feedback_list[:-2], feedback_list[-2:]
+    strings = []
+    string_ids = {}
+
+    def intern(text):
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text)
+        return string_ids[text]
+
+    keys = []
+    for test_feedback in tests_feedback:
+        keys.extend(key for key in test_feedback if key not in keys)
+
+    columns = {}
+    string_columns = []
+    for key in keys:
+        values = [test_feedback.get(key) for test_feedback in tests_feedback]
+        if all(_is_text(value) for value in values):
+            columns[key] = [intern(value) if isinstance(value, str) else [intern(text) for text in value]
+                            for value in values]
+            string_columns.append(key)
+        else:
+            columns[key] = values
+
+    return encode_compact({
+        "tests": {"count": len(tests_feedback), "columns": columns, "string_columns": string_columns},
+        "strings": strings,
+        "options": options,
+        "debug_info": debug_info,
+    })
+
+
+def _is_text(value):
+    """ Whether the value is a string or a list of strings """
+    if isinstance(value, str):
+        return True
+    return isinstance(value, (list, tuple)) and all(isinstance(text, str) for text in value)
+
+
 def get_input_sample(test_case):
     """ This method reads and gets an small sample of input that will be shown to students."""
     max_lines = 15
@@ -2,9 +2,17 @@
 This module contains the util functions for the grader and feedback_tools modules.
 """
 import rst
+import base64
 import json
+import os
+import zlib
 from sys import getsizeof
 
+from results import GraderResult
+
+# Prefix of the feedback in the compact encoding, tagged with its version (check 'encode_compact')
+COMPACT_FEEDBACK_PREFIX = "compact-v1:"
+
 
 def html_to_rst(html):
     """ Generates an RST HTML block from the given HTML """
@@ -15,12 +23,20 @@ def feedback_str_for_compilation_error(compilation_output,container_type,respons
     if response_type == "json":
         return json.dumps({"compilation_output":compilation_output,
                            "container_type":container_type})
+    elif response_type == "compact":
+        return encode_compact({"compilation_output": compilation_output,
+                               "container_type": container_type})
     elif response_type == "rst":
         return _("**Compilation error**:\n\n") + html_to_rst("<pre>%s</pre>" % (compilation_output,))
 
 
 def compute_summary_result(results):
-    return min(results)
+    """
+    Returns the result with the highest precedence. The test cases that were not run are ignored,
+    unless none of them was run.
+    """
+    run_results = [result for result in results if result != GraderResult.NOT_RUN]
+    return min(run_results) if run_results else GraderResult.NOT_RUN
 
 
 def check_output(actual_output, expected_output):
@@ -45,3 +61,96 @@ def reduce_text(text, max_size, additional_text=""):
         new_text.append(additional_text)
 
         return '\n'.join(new_text)
+
+
+def compress_text(text):
+    """ Compresses the text with zlib, encoded in base64 so it can be embedded in the feedback """
+    return base64.b64encode(zlib.compress(text.encode())).decode('ascii')
+
+
+def decompress_text(compressed_text):
+    """ Returns the text compressed with compress_text """
+    return zlib.decompress(base64.b64decode(compressed_text)).decode()
+
+
+def encode_compact(value):
+    """
+    Encodes the value for the compact response type: as JSON without spaces, compressed (check 'compress_text')
+    and prefixed with COMPACT_FEEDBACK_PREFIX, so the frontend can tell the version of the encoding.
+    """
+    return COMPACT_FEEDBACK_PREFIX + compress_text(json.dumps(value, separators=(',', ':')))
+
+
+def decode_compact(encoded_value):
+    """ Returns the value encoded with encode_compact """
+    if not encoded_value.startswith(COMPACT_FEEDBACK_PREFIX):
+        raise ValueError("Unknown feedback encoding")
+    return json.loads(decompress_text(encoded_value[len(COMPACT_FEEDBACK_PREFIX):]))
+
+
+def get_cgroup_cpu_quota():
+    """
+    Returns the amount of CPUs the container is allowed to use according to its cgroup CPU quota
+    (supporting both cgroup v1 and v2), or None if the container has no quota.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as cpu_max_file:
+            quota, period = cpu_max_file.read().split()
+        return None if quota == "max" else float(quota) / float(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as quota_file, \
+                open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as period_file:
+            quota = float(quota_file.read())
+            period = float(period_file.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def get_cgroup_memory_limit():
+    """
+    Returns the memory limit in bytes of the container according to its cgroup (supporting both cgroup v1 and v2),
+    or None if the container has no limit.
+    """
+    # cgroup v1 reports a huge number (close to the max int64) when there is no limit.
+    _unlimited_threshold = 2 ** 60
+    for limit_filename in ["/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"]:
+        try:
+            with open(limit_filename, "r") as limit_file:
+                limit = limit_file.read().strip()
+        except OSError:
+            continue
+        if limit == "max":
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            continue
+        return None if limit >= _unlimited_threshold else limit
+    return None
+
+
+def compute_parallel_workers(memory_limit, max_workers=None):
+    """
+    Computes how many test cases can be run at the same time in the container. The amount of workers is bounded
+    by the cgroup CPU quota (or the amount of CPUs when there is no quota) and by how many runs of
+    `memory_limit` MB fit in the container's memory.
+
+    Args:
+        - memory_limit (int): Memory limit in MB of a single run.
+        - max_workers (int): Optional upper bound for the amount of workers.
+    """
+    cpu_quota = get_cgroup_cpu_quota()
+    workers = int(cpu_quota) if cpu_quota is not None else (os.cpu_count() or 1)
+
+    container_memory = get_cgroup_memory_limit()
+    if container_memory is not None and memory_limit:
+        workers = min(workers, container_memory // (memory_limit * 2 ** 20))
+
+    if max_workers is not None:
+        workers = min(workers, max_workers)
+
+    return max(1, workers)
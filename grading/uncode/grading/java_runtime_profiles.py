@@ -0,0 +1,68 @@
+"""
+This module contains the runtime profiles of the JVM that runs the Java codes, i.e. the flags given to
+'java' on each run of a test case (check 'JavaProjectFactory' in 'projects.py').
+
+A profile makes the JVM start faster and fit in the memory limit of the sandbox:
+    - The JDK classes are loaded from the class data sharing archive of the image, which is generated
+      once when the image is built ('java -Xshare:dump'). The JVM ignores it if it is missing.
+    - The heap and the code cache are sized from the memory limit, instead of from the memory of the
+      machine, so the JVM does not grow beyond the limit before collecting the garbage.
+    - The tiered compilation starts compiling the hot code sooner, and it can be stopped at the first
+      tier for codes that run for a short time.
+
+The flags are supported by the JVMs of Java 7 and Java 8.
+
+The codes are run with the default flags of the JVM unless the task enables a profile (check the option
+'java_runtime_profile' of the grader), as the sized heap might be smaller than the default one.
+"""
+
+# Amount of MBs of the memory limit kept for the JVM itself (e.g. the classes, the threads and the code cache)
+DEFAULT_NON_HEAP_MEMORY = 32
+# Minimum amount of MBs of the heap, whatever the memory limit is
+MINIMUM_HEAP_MEMORY = 16
+# Amount of MBs of the code cache
+DEFAULT_CODE_CACHE_MEMORY = 16
+# Message of the error thrown by the JVM when the heap is exhausted
+OUT_OF_MEMORY_ERROR = "java.lang.OutOfMemoryError"
+
+
+class JavaRuntimeProfile:
+    """
+    This class contains the options of the JVM for the runs of the Java codes.
+
+    Attributes:
+        - class_data_sharing (bool): Whether the JDK classes are loaded from the class data sharing archive.
+        - tiered_stop_at_level (int): Highest tier of the tiered compilation (e.g. 1 to only use the client
+        compiler, which starts faster), or None to use all of them.
+        - non_heap_memory (int): Amount of MBs of the memory limit kept for the JVM outside the heap.
+        - code_cache_memory (int): Amount of MBs of the code cache.
+    """
+
+    def __init__(self, class_data_sharing=True, tiered_stop_at_level=None, non_heap_memory=DEFAULT_NON_HEAP_MEMORY,
+                 code_cache_memory=DEFAULT_CODE_CACHE_MEMORY):
+        self.class_data_sharing = class_data_sharing
+        self.tiered_stop_at_level = tiered_stop_at_level
+        self.non_heap_memory = non_heap_memory
+        self.code_cache_memory = code_cache_memory
+
+    def get_flags(self, memory_limit=None):
+        """
+        Returns the flags of 'java' for a run with the given memory limit in MBs, or with the default heap
+        if it is None.
+        """
+        # The archive is only used by the serial collector in Java 8, which also needs the least memory
+        flags = ["-XX:+UseSerialGC", "-XX:+TieredCompilation",
+                 "-XX:ReservedCodeCacheSize=%dm" % self.code_cache_memory]
+        if self.class_data_sharing:
+            flags.append("-Xshare:auto")
+        if self.tiered_stop_at_level is not None:
+            flags.append("-XX:TieredStopAtLevel=%d" % self.tiered_stop_at_level)
+        if memory_limit is not None:
+            heap_memory = max(int(memory_limit) - self.non_heap_memory, MINIMUM_HEAP_MEMORY)
+            flags.append("-Xmx%dm" % heap_memory)
+        return flags
+
+
+def is_out_of_memory(return_code, stderr):
+    """ Returns whether a run of 'java' ended because its heap was exhausted """
+    return return_code != 0 and OUT_OF_MEMORY_ERROR in stderr
@@ -0,0 +1,223 @@
+"""
+This module contains the line diff engine used to show the differences between the output of a
+program and the expected output (check 'Diff' in 'feedback_tools.py').
+
+The diff is computed with the Myers algorithm over the lines interned as integers, after removing
+the common prefix and suffix of both texts. Its cost is proportional to the amount of lines times
+the amount of edits, which is capped: when the texts differ in more lines than that, the rest of
+them is shown as replaced. Repeated lines, as in numeric outputs, do not slow it down.
+
+The diff is produced in the same unified format as 'difflib.unified_diff'.
+
+Tools:
+    - unified_diff
+"""
+
+import difflib
+
+# Maximum amount of inserted and deleted lines searched by the diff
+DEFAULT_MAX_EDITS = 1000
+
+
+class _OpcodesMatcher(difflib.SequenceMatcher):
+    """
+    This class groups already computed opcodes into hunks (check 'SequenceMatcher.get_grouped_opcodes'),
+    without matching the sequences again.
+    """
+
+    def __init__(self, opcodes):
+        self._opcodes = opcodes
+
+    def get_opcodes(self):
+        return self._opcodes
+
+
+def _intern_lines(first_lines, second_lines):
+    """ Returns both lists of lines with each distinct line replaced by the same integer """
+    line_ids = {}
+    return ([line_ids.setdefault(line, len(line_ids)) for line in first_lines],
+            [line_ids.setdefault(line, len(line_ids)) for line in second_lines])
+
+
+def _myers_edits(first, second, first_start, first_end, second_start, second_end, max_edits):
+    """
+    Returns the shortest list of edits that turns first[first_start:first_end] into
+    second[second_start:second_end], as tuples ('delete', i) or ('insert', j) in order, or None if it
+    needs more than max_edits edits.
+    """
+    n = first_end - first_start
+    m = second_end - second_start
+    max_d = min(n + m, max_edits)
+    offset = max_d + 1
+    # Furthest index in first reached on each diagonal k = x - y, stored at k + offset
+    furthest = [0] * (2 * max_d + 3)
+    # The diagonals -d-1..d+1 before each step d, to find the path back
+    trace = []
+
+    for d in range(max_d + 1):
+        trace.append(furthest[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and furthest[offset + k - 1] < furthest[offset + k + 1]):
+                x = furthest[offset + k + 1]
+            else:
+                x = furthest[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and first[first_start + x] == second[second_start + y]:
+                x += 1
+                y += 1
+            furthest[offset + k] = x
+
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m, first_start, second_start)
+
+    return None
+
+
+def _backtrack(trace, x, y, first_start, second_start):
+    """ Returns the edits of the path found by '_myers_edits', following the trace from its end """
+    edits = []
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d]
+        k = x - y
+        # The diagonal k of the step d is stored at k + d + 1
+        if k == -d or (k != d and previous[k - 1 + d + 1] < previous[k + 1 + d + 1]):
+            previous_k = k + 1
+        else:
+            previous_k = k - 1
+        previous_x = previous[previous_k + d + 1]
+        previous_y = previous_x - previous_k
+        # Skip the equal lines of the snake
+        x, y = x - min(x - previous_x, y - previous_y), y - min(x - previous_x, y - previous_y)
+        if x == previous_x:
+            edits.append(('insert', second_start + previous_y))
+        else:
+            edits.append(('delete', first_start + previous_x))
+        x, y = previous_x, previous_y
+
+    edits.reverse()
+    return edits
+
+
+def _edits_to_opcodes(edits, first_start, first_end, second_start, second_end):
+    """ Converts the edits into opcodes (check 'SequenceMatcher.get_opcodes') between the given bounds """
+    opcodes = []
+    i, j = first_start, second_start
+    for tag, index in edits:
+        equal_length = index - i if tag == 'delete' else index - j
+        if equal_length:
+            opcodes.append(('equal', i, i + equal_length, j, j + equal_length))
+            i += equal_length
+            j += equal_length
+
+        # Consecutive edits are a single change, which is a replacement if it has deletions and insertions
+        if opcodes and opcodes[-1][0] != 'equal':
+            _, change_i, _, change_j, _ = opcodes.pop()
+        else:
+            change_i, change_j = i, j
+        if tag == 'delete':
+            i += 1
+        else:
+            j += 1
+        change_tag = 'delete' if j == change_j else 'insert' if i == change_i else 'replace'
+        opcodes.append((change_tag, change_i, i, change_j, j))
+
+    if i < first_end:
+        opcodes.append(('equal', i, first_end, j, second_end))
+    return opcodes
+
+
+def _compute_opcodes(first, second, max_edits):
+    """ Returns the opcodes that turn the first list of lines into the second one """
+    first, second = _intern_lines(first, second)
+    first_end, second_end = len(first), len(second)
+
+    start = 0
+    while start < first_end and start < second_end and first[start] == second[start]:
+        start += 1
+    while first_end > start and second_end > start and first[first_end - 1] == second[second_end - 1]:
+        first_end -= 1
+        second_end -= 1
+
+    edits = _myers_edits(first, second, start, first_end, start, second_end, max_edits)
+    if edits is None:
+        # Too many differences, so the rest of the lines are shown as replaced
+        middle = [('replace', start, first_end, start, second_end)]
+    else:
+        middle = _edits_to_opcodes(edits, start, first_end, start, second_end)
+
+    opcodes = []
+    if start > 0:
+        opcodes.append(('equal', 0, start, 0, start))
+    opcodes.extend(middle)
+    if first_end < len(first):
+        opcodes.append(('equal', first_end, len(first), second_end, len(second)))
+    return opcodes
+
+
+def _drop_difference_at_cut(opcodes):
+    """
+    Drops the last difference of the opcodes when it reaches the end of the texts and is not the only one,
+    as it might only come from cutting the texts (check 'truncated' in 'unified_diff').
+    """
+    differences = [index for index, opcode in enumerate(opcodes) if opcode[0] != 'equal']
+    if len(differences) < 2 or differences[-1] != len(opcodes) - 1:
+        return opcodes
+    return opcodes[:differences[-1]]
+
+
+def _format_range(start, stop, first_line):
+    """ Formats the range of lines of a hunk, as in 'difflib.unified_diff' """
+    beginning = start + first_line
+    length = stop - start
+    if length == 1:
+        return '{}'.format(beginning)
+    if not length:
+        beginning -= 1
+    return '{},{}'.format(beginning, length)
+
+
+def unified_diff(first_lines, second_lines, fromfile='', tofile='', n=3, lineterm='\n', first_line=1,
+                 max_edits=DEFAULT_MAX_EDITS, truncated=False):
+    """
+    Generates the lines of the unified diff between two lists of lines, as 'difflib.unified_diff'.
+    The differences between the whole texts are searched before the first line is given (check
+    'max_edits'), only the formatting of the hunks is done while they are taken.
+
+    Args:
+        - first_lines (list): Lines of the first text.
+        - second_lines (list): Lines of the second text.
+        - fromfile (str): Name of the first text, in the header of the diff.
+        - tofile (str): Name of the second text, in the header of the diff.
+        - n (int): Amount of context lines around each difference.
+        - lineterm (str): End of line of the headers of the diff.
+        - first_line (int): Number of the line where both texts start, used in the headers of the hunks.
+        - max_edits (int): Maximum amount of inserted and deleted lines searched by the diff.
+        - truncated (bool): Whether the texts are regions of longer texts, cut at the same offset. A line
+        inserted or deleted before the cut shifts the end of one of them, so a difference at the end of
+        both is left out, unless it is the only one.
+    """
+    opcodes = _compute_opcodes(first_lines, second_lines, max_edits)
+    if truncated:
+        opcodes = _drop_difference_at_cut(opcodes)
+    started = False
+    for group in _OpcodesMatcher(opcodes).get_grouped_opcodes(n):
+        if not started:
+            started = True
+            yield '--- {}{}'.format(fromfile, lineterm)
+            yield '+++ {}{}'.format(tofile, lineterm)
+
+        first, last = group[0], group[-1]
+        yield '@@ -{} +{} @@{}'.format(_format_range(first[1], last[2], first_line),
+                                       _format_range(first[3], last[4], first_line), lineterm)
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in first_lines[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in first_lines[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in second_lines[j1:j2]:
+                    yield '+' + line
@@ -0,0 +1,524 @@
+"""
+This module contains the tools to process the output of a program while it is produced,
+instead of capturing it completely in memory.
+
+A sink is any object with the following methods, which receives the output of a run in the
+sandbox (check '_run_in_sandbox' in 'projects.py'):
+    - write(chunk): Receives the next chunk (bytes) of the output.
+    - finish(): Called once the output has ended.
+    - getvalue(): Returns the (possibly reduced) output as a string.
+
+The line breaks of the expected output are normalized (CRLF into LF) before it is compared, as it is done
+when the file is read in text mode (check 'NewlineNormalizer'). The output of the program is compared as it is.
+
+Tools:
+    - normalize_newlines
+    - NewlineNormalizer
+    - find_first_mismatch
+    - find_diff_window
+    - OutputBuffer
+    - SpooledOutput
+    - TeeSink
+    - HeadTailBuffer
+    - StreamingComparator
+"""
+
+import mmap
+import os
+import tempfile
+from collections import namedtuple
+
+import checkers
+
+# Size in bytes of the chunks read from the output streams
+CHUNK_SIZE = 2 ** 16
+
+# Amount of bytes of both outputs taken before and after their first mismatch to compute the diff
+DIFF_CONTEXT_SIZE = (2 ** 10) * 8
+
+# Position of the first different byte between two outputs, and the number (from 1) of its line
+Mismatch = namedtuple("Mismatch", ["offset", "line"])
+
+# Region of both outputs around their first mismatch, the number (from 1) of its first line, and whether any of
+# the outputs goes on after it
+DiffWindow = namedtuple("DiffWindow", ["actual_output", "expected_output", "first_line", "truncated"],
+                        defaults=(False,))
+
+
+def read_stream(stream, sink, limit=None):
+    """
+    Reads the given binary stream chunk by chunk until its end, sending each chunk to the sink.
+
+    If a limit is given, the reading stops as soon as the stream exceeds it, and at most limit + 1
+    bytes are sent to the sink, so the output limit is told from the size of the output (and never
+    from the return code, which could be given by the program). Returns whether the limit was exceeded.
+    """
+    read = stream.read1 if hasattr(stream, "read1") else stream.read
+    size = 0
+    for chunk in iter(lambda: read(CHUNK_SIZE), b""):
+        if limit is not None and size + len(chunk) > limit:
+            sink.write(chunk[:limit + 1 - size])
+            return True
+        size += len(chunk)
+        sink.write(chunk)
+    return False
+
+
+def normalize_newlines(data):
+    """
+    Returns the given bytes-like object with its CRLF line breaks turned into LF. It is only copied when it
+    has any of them.
+    """
+    if data.find(b"\r\n") == -1:
+        return data
+    return bytes(data).replace(b"\r\n", b"\n")
+
+
+class NewlineNormalizer:
+    """
+    This class turns the CRLF line breaks of a stream into LF, chunk by chunk. A CR at the end of a
+    chunk is kept until the next one, as it might be followed by a LF.
+    """
+
+    def __init__(self):
+        self._pending_cr = False
+
+    def feed(self, chunk):
+        """ Returns the normalized chunk """
+        if self._pending_cr:
+            chunk = b"\r" + chunk
+            self._pending_cr = False
+        if chunk.endswith(b"\r"):
+            chunk = chunk[:-1]
+            self._pending_cr = True
+        return chunk.replace(b"\r\n", b"\n")
+
+    def finish(self):
+        """ Returns the rest of the stream, once it has ended """
+        rest = b"\r" if self._pending_cr else b""
+        self._pending_cr = False
+        return rest
+
+
+class _NormalizedReader:
+    """
+    This class reads a binary file with its line breaks normalized (check 'NewlineNormalizer'). The offsets
+    are the ones of the normalized file, so seeking reads the file again from its beginning.
+    """
+
+    def __init__(self, raw_file):
+        self._raw_file = raw_file
+        self.seek(0)
+
+    def seek(self, offset):
+        self._raw_file.seek(0)
+        self._normalizer = NewlineNormalizer()
+        self._buffer = b""
+        self._finished = False
+        while offset > 0:
+            skipped = self.read(min(offset, CHUNK_SIZE))
+            if not skipped:
+                break
+            offset -= len(skipped)
+
+    def read(self, size=-1):
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            chunk = self._raw_file.read(CHUNK_SIZE)
+            if chunk:
+                self._buffer += self._normalizer.feed(chunk)
+            else:
+                self._buffer += self._normalizer.finish()
+                self._finished = True
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _first_difference(first, second):
+    """
+    Returns the first index where the two byte strings differ, assuming they are different. The common
+    prefix is found by bisection, comparing whole slices instead of byte by byte.
+    """
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[low:middle] == second[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _window_start(expected_output, mismatch_offset, context_size):
+    """
+    Returns the offset where the window around the mismatch starts: the beginning of the first complete
+    line of the context_size bytes before it, or the beginning of the output.
+    """
+    start = max(0, mismatch_offset - context_size)
+    if start == 0:
+        return 0
+    line_end = expected_output.find(b"\n", start - 1, mismatch_offset)
+    return line_end + 1 if line_end != -1 else start
+
+
+def _cut_at_line_end(window, complete):
+    """ Drops the incomplete last line of the window, unless it holds the complete rest of the output """
+    if complete:
+        return window
+    line_end = window.rfind(b"\n")
+    return window[:line_end + 1] if line_end != -1 else window
+
+
+def find_first_mismatch(actual_file, expected_file, block_size=CHUNK_SIZE):
+    """
+    Finds the first mismatch between two binary files in linear time, reading both block by block. The
+    blocks are compared as a whole and only the first different block is searched for the different byte,
+    so the outputs are never decoded nor kept in memory.
+
+    Returns the Mismatch, or None if the files are equal.
+    """
+    offset = 0
+    line = 1
+    while True:
+        actual_block = actual_file.read(block_size)
+        expected_block = expected_file.read(block_size)
+        if actual_block != expected_block:
+            index = _first_difference(actual_block, expected_block)
+            return Mismatch(offset + index, line + expected_block.count(b"\n", 0, index))
+        if not actual_block:
+            return None
+        offset += len(actual_block)
+        line += actual_block.count(b"\n")
+
+
+def find_diff_window(actual_file, expected_file, context_size=DIFF_CONTEXT_SIZE):
+    """
+    Returns the DiffWindow of two binary files around their first mismatch (check 'find_first_mismatch'),
+    with at most context_size bytes before and after it, so the diff can be computed on it no matter how
+    long the outputs are. The window is empty if the files are equal.
+
+    Both outputs are cut at the same offset, so a line inserted or deleted by the program shifts the end
+    of one of them (check 'truncated' in 'line_diff.unified_diff').
+    """
+    mismatch = find_first_mismatch(actual_file, expected_file)
+    if mismatch is None:
+        return DiffWindow("", "", 1)
+
+    # The byte before the context tells whether the context starts at the beginning of a line
+    region_start = max(0, mismatch.offset - context_size - 1)
+    expected_file.seek(region_start)
+    region = expected_file.read(mismatch.offset - region_start)
+    region_mismatch_offset = mismatch.offset - region_start
+    window_start = region_start + _window_start(region, region_mismatch_offset, context_size)
+    first_line = mismatch.line - region.count(b"\n", window_start - region_start, region_mismatch_offset)
+
+    window_size = mismatch.offset - window_start + context_size
+    windows = []
+    truncated = False
+    for output_file in (actual_file, expected_file):
+        output_file.seek(window_start)
+        window = output_file.read(window_size + 1)
+        complete = len(window) <= window_size
+        window = _cut_at_line_end(window[:window_size], complete)
+        windows.append(window.decode(errors="replace"))
+        truncated = truncated or not complete
+    return DiffWindow(windows[0], windows[1], first_line, truncated)
+
+
+class OutputBuffer:
+    """
+    This class is a sink that keeps the complete output in memory, as it is done when the
+    output is captured without a sink.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, chunk):
+        self._chunks.append(chunk)
+
+    def finish(self):
+        pass
+
+    def getvalue(self):
+        return b"".join(self._chunks).decode()
+
+
+class SpooledOutput:
+    """
+    This class is a sink that keeps the complete output as bytes in a temporary file, which is only
+    written to disk once the output exceeds max_memory_size. The output is decoded only for the
+    slices that are requested (check 'decode'), and is released when the sink is closed.
+
+    Attributes:
+        - size (int): Amount of bytes of the output.
+        - finished (bool): Whether the output has ended.
+    """
+
+    def __init__(self, max_memory_size=2 ** 20, head_size=(2 ** 10) * 50):
+        """
+        Args:
+            - max_memory_size (int): Amount of bytes kept in memory before moving the output to disk.
+            - head_size (int): Amount of bytes of the output returned by getvalue.
+        """
+        self.head_size = head_size
+        self.size = 0
+        self.finished = False
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        self.finished = True
+
+    def getvalue(self):
+        """ Returns the beginning of the output (at most head_size bytes) """
+        return self.decode(self.head_size)
+
+    def iter_chunks(self):
+        """ Generates the output chunk by chunk, as bytes """
+        self._file.seek(0)
+        return iter(lambda: self._file.read(CHUNK_SIZE), b"")
+
+    def decode(self, max_size=None):
+        """ Returns the first max_size bytes of the output (or all of them if it is None) as a string """
+        self._file.seek(0)
+        return self._file.read(max_size if max_size is not None else -1).decode(errors="replace")
+
+    def diff_window(self, expected_output_filename, context_size=DIFF_CONTEXT_SIZE, max_length=None):
+        """
+        Returns the DiffWindow of the output and the expected output file (check 'find_diff_window'), with
+        the line breaks of the expected output normalized. When both outputs have at most max_length bytes,
+        the window holds them completely.
+        """
+        with open(expected_output_filename, 'rb') as expected_output_file:
+            expected_output = _NormalizedReader(expected_output_file)
+            if max_length is not None and self.size <= max_length and \
+                    os.fstat(expected_output_file.fileno()).st_size <= max_length:
+                return DiffWindow(self.decode(), expected_output.read().decode(errors="replace"), 1)
+            self._file.seek(0)
+            return find_diff_window(self._file, expected_output, context_size)
+
+    def close(self):
+        """ Releases the output """
+        self._file.close()
+
+
+class TeeSink:
+    """
+    This class is a sink that sends the output to several sinks. Its value is the value of the
+    first of them.
+    """
+
+    def __init__(self, sinks):
+        self._sinks = sinks
+
+    def write(self, chunk):
+        for sink in self._sinks:
+            sink.write(chunk)
+
+    def finish(self):
+        for sink in self._sinks:
+            sink.finish()
+
+    def getvalue(self):
+        return self._sinks[0].getvalue()
+
+
+class HeadTailBuffer:
+    """
+    This class is a sink that keeps only the beginning and the end of the output, so its memory
+    use is bounded no matter how long the output is. The end of the output is kept in a ring
+    buffer, dropping the oldest bytes as new ones arrive.
+
+    Attributes:
+        - dropped (int): Amount of bytes between the head and the tail that were not kept.
+    """
+
+    def __init__(self, head_size=(2 ** 10) * 8, tail_size=(2 ** 10) * 8):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.dropped = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def write(self, chunk):
+        if len(self._head) < self.head_size:
+            head_chunk_size = self.head_size - len(self._head)
+            self._head += chunk[:head_chunk_size]
+            chunk = chunk[head_chunk_size:]
+
+        self._tail += chunk
+        if len(self._tail) > self.tail_size:
+            overflow = len(self._tail) - self.tail_size
+            self.dropped += overflow
+            del self._tail[:overflow]
+
+    def finish(self):
+        pass
+
+    def getvalue(self):
+        head = self._head.decode(errors="replace")
+        tail = self._tail.decode(errors="replace")
+        if not self.dropped:
+            return head + tail
+        return "%s\n\t\t... (%d bytes omitted) ...\n%s" % (head, self.dropped, tail)
+
+
+class StreamingComparator:
+    """
+    This class is a sink that compares the output of a program, chunk by chunk, against
+    an expected output file, which is memory-mapped instead of read. The result of the comparison
+    is decided by an output checker (check 'checkers.py').
+
+    The output is not kept in memory: only its first head_size bytes (to be shown as the output
+    of the program) and context_size bytes after the first different byte (to compute the diff)
+    are stored, or the whole rest of the output when it has at most max_diff_length bytes. The line
+    breaks of the expected output are normalized, so an expected output file with CRLF line breaks is
+    read in memory instead of memory-mapped.
+
+    Attributes:
+        - size (int): Amount of bytes of the program's output.
+        - mismatch_offset (int): Offset of the first byte where the outputs differ, or None if they are equal.
+        - mismatch_line (int): Number (from 1) of the line of the first mismatch, or None if they are equal.
+        - result (GraderResult): The result given by the checker, once the output has finished.
+        - checker_report (str): The description of the difference given by the checker, or None.
+    """
+
+    def __init__(self, expected_output_filename, checker_name="exact", checker_options=None,
+                 head_size=(2 ** 10) * 50, context_size=(2 ** 10) * 8, max_diff_length=None):
+        """
+        Args:
+            - expected_output_filename (str): Name of the file with the expected output.
+            - checker_name (str): Name of the checker that decides the result (check 'checkers.py').
+            - checker_options (dict): Options given to the checker.
+            - head_size (int): Amount of bytes to keep from the beginning of the output.
+            - context_size (int): Amount of bytes to keep around the first mismatch.
+            - max_diff_length (int): Outputs of at most this amount of bytes are kept completely, so the
+            diff is computed on them instead of on a window (check 'diff_window').
+        """
+        self.head_size = head_size
+        self.context_size = context_size
+        self.max_diff_length = max_diff_length
+        self.size = 0
+        self.mismatch_offset = None
+        self.mismatch_line = None
+        self.result = None
+        self.checker_report = None
+        self.finished = False
+
+        self._expected_output_file = open(expected_output_filename, 'rb')
+        try:
+            mapped_output = mmap.mmap(self._expected_output_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be memory-mapped
+            mapped_output = b""
+        self._expected_output = normalize_newlines(mapped_output)
+        if self._expected_output is not mapped_output and isinstance(mapped_output, mmap.mmap):
+            mapped_output.close()
+        self._head = bytearray()
+        self._mismatch_context = bytearray()
+        # Amount of lines of the output before the first mismatch
+        self._matching_lines = 0
+        self._checker = checkers.get_checker_from_name(checker_name)(self._expected_output, **(checker_options or {}))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def matches(self):
+        """ Whether the output is exactly the expected output. Only valid once the output has finished """
+        return self.mismatch_offset is None
+
+    def write(self, chunk):
+        if len(self._head) < self.head_size:
+            self._head += chunk[:self.head_size - len(self._head)]
+        self._compare(chunk)
+
+    def _compare(self, chunk):
+        """ Compares the next chunk of the output """
+        if self.mismatch_offset is None:
+            expected_chunk = self._expected_output[self.size:self.size + len(chunk)]
+            if chunk != expected_chunk:
+                mismatch_index = _first_difference(chunk, expected_chunk)
+                self.mismatch_offset = self.size + mismatch_index
+                self.mismatch_line = self._matching_lines + chunk.count(b"\n", 0, mismatch_index) + 1
+                self._mismatch_context += chunk[mismatch_index:mismatch_index + self._kept_context_size()]
+            else:
+                self._matching_lines += chunk.count(b"\n")
+        elif len(self._mismatch_context) < self._kept_context_size():
+            self._mismatch_context += chunk[:self._kept_context_size() - len(self._mismatch_context)]
+
+        self._checker.write(chunk)
+        self.size += len(chunk)
+
+    def _kept_context_size(self):
+        """ Amount of bytes of the output kept after the first mismatch (check 'max_diff_length') """
+        if self.max_diff_length is None:
+            return self.context_size
+        return max(self.context_size, self.max_diff_length - self.mismatch_offset)
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+
+        if self.mismatch_offset is None and self.size != len(self._expected_output):
+            self.mismatch_offset = self.size
+            self.mismatch_line = self._matching_lines + 1
+
+        self._checker.finish()
+        self.result = self._checker.result
+        self.checker_report = self._checker.report()
+
+    def getvalue(self):
+        """ Returns the beginning of the output (at most head_size bytes) """
+        return self._head.decode(errors="replace")
+
+    def diff_window(self):
+        """
+        Returns the DiffWindow with the region of both outputs around the first mismatch, starting at
+        the beginning of a line (check 'find_diff_window'). The window is empty if the outputs are equal,
+        and holds both outputs completely when they have at most max_diff_length bytes.
+        """
+        if self.mismatch_offset is None:
+            return DiffWindow("", "", 1)
+
+        if self.max_diff_length is not None and self.size <= self.max_diff_length and \
+                len(self._expected_output) <= self.max_diff_length:
+            actual_output = self._expected_output[:self.mismatch_offset] + bytes(self._mismatch_context)
+            return DiffWindow(actual_output.decode(errors="replace"),
+                              bytes(self._expected_output).decode(errors="replace"), 1)
+
+        start = _window_start(self._expected_output, self.mismatch_offset, self.context_size)
+        common_prefix = self._expected_output[start:self.mismatch_offset]
+        first_line = self.mismatch_line - common_prefix.count(b"\n")
+
+        actual_complete = self.size - self.mismatch_offset <= self.context_size
+        actual_output = _cut_at_line_end(common_prefix + bytes(self._mismatch_context[:self.context_size]),
+                                         actual_complete)
+        end = self.mismatch_offset + self.context_size
+        expected_complete = end >= len(self._expected_output)
+        expected_output = _cut_at_line_end(self._expected_output[start:end], expected_complete)
+        return DiffWindow(actual_output.decode(errors="replace"), expected_output.decode(errors="replace"),
+                          first_line, not (actual_complete and expected_complete))
+
+    def close(self):
+        """ Releases the expected output file """
+        # The checker might hold references to the memory-mapped file
+        self._checker = None
+        if isinstance(self._expected_output, mmap.mmap):
+            self._expected_output.close()
+        self._expected_output_file.close()
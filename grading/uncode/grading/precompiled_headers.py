@@ -0,0 +1,96 @@
+"""
+This module contains the precompiled headers of the C and C++ toolchains, so the headers that most
+codes include (e.g. bits/stdc++.h) are not parsed again on every build.
+
+The headers are precompiled once, when the image is built (check 'generate_precompiled_headers' in
+'projects.py'), for each compiler and set of flags, in a directory named after the hash of the compiler,
+its version and the flags:
+
+    <precompiled headers directory>/<key>/bits/stdc++.h.gch
+
+The directory is given to the compiler with -I, so GCC uses a precompiled header when a code includes its
+header before any other code, and otherwise (or if it is not valid for the compilation) it ignores it and
+parses the usual header. The code is compiled as it is, so the compilation errors point to its own lines.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+
+import build_cache
+
+DEFAULT_PRECOMPILED_HEADERS_DIRECTORY = '/usr/lib/uncode/precompiled_headers'
+
+
+def _get_headers_directory(compiler, flags, directory):
+    """
+    Returns the directory of the precompiled headers for the compiler and flags, or None if the version of
+    the compiler is unknown.
+    """
+    version = build_cache.get_toolchain_version([compiler, "--version"])
+    if version is None:
+        return None
+    key = hashlib.sha256(json.dumps([compiler, version, flags]).encode()).hexdigest()
+    return os.path.join(directory, key)
+
+
+def _get_header_flags(flags):
+    """ Returns the flags that change the precompiled headers, dropping the ones for the linker """
+    return [flag for flag in flags if not flag.startswith(("-l", "-L"))]
+
+
+def get_precompiled_headers_flags(compiler, flags, headers, directory=DEFAULT_PRECOMPILED_HEADERS_DIRECTORY):
+    """
+    Returns the flags to compile with the precompiled headers of the compiler and flags, or an empty list
+    if any of the headers was not precompiled.
+
+    Args:
+        - compiler (str): The compiler, e.g. 'g++'.
+        - flags (list): The flags of the compilation.
+        - headers (list): The names of the headers, as they are included, e.g. 'bits/stdc++.h'.
+        - directory (str): Directory where the precompiled headers are stored.
+    """
+    if not headers or not os.path.isdir(directory):
+        return []
+    headers_directory = _get_headers_directory(compiler, _get_header_flags(flags), directory)
+    if headers_directory is None or \
+            not all(os.path.exists(os.path.join(headers_directory, header + ".gch")) for header in headers):
+        return []
+    return ["-I", headers_directory]
+
+
+def generate_precompiled_headers(compiler, language, flags, headers, directory=DEFAULT_PRECOMPILED_HEADERS_DIRECTORY):
+    """
+    Precompiles the headers for the compiler and flags, unless they were already precompiled. Each header is
+    written in a temporary file and published by renaming it, so a compilation never uses an incomplete one.
+    Raises a subprocess.CalledProcessError if a header cannot be precompiled.
+
+    Args:
+        - compiler (str): The compiler, e.g. 'g++'.
+        - language (str): The language of the headers, 'c++' or 'c'.
+        - flags (list): The flags of the compilations that use the headers.
+        - headers (list): The names of the headers, as they are included, e.g. 'bits/stdc++.h'.
+        - directory (str): Directory where the precompiled headers are stored.
+    """
+    flags = _get_header_flags(flags)
+    headers_directory = _get_headers_directory(compiler, flags, directory)
+    if headers_directory is None:
+        return
+
+    for header in headers:
+        precompiled_header = os.path.join(headers_directory, header + ".gch")
+        if os.path.exists(precompiled_header):
+            continue
+        os.makedirs(os.path.dirname(precompiled_header), exist_ok=True)
+
+        # The precompiled header is the state of the compiler after including the usual header
+        with tempfile.TemporaryDirectory(dir=headers_directory) as temporary_directory:
+            source = os.path.join(temporary_directory, os.path.basename(header))
+            with open(source, 'w') as source_file:
+                source_file.write("#include <%s>\n" % header)
+            temporary_header = os.path.join(temporary_directory, "header.gch")
+            subprocess.run([compiler, "-x", language + "-header"] + flags + ["-o", temporary_header, source],
+                           check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            os.replace(temporary_header, precompiled_header)
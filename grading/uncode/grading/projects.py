@@ -1,14 +1,39 @@
 from abc import abstractmethod, ABCMeta
+from collections import Counter, namedtuple
 from glob import glob
+import hashlib
+import json
 import os
+import shutil
+import signal
 import tempfile
 import subprocess
-from results import GraderResult, parse_non_zero_return_code
+import threading
+import time
+import build_cache
+import java_runtime_profiles
+import output_streams
+import precompiled_headers
+from results import GraderResult, SandboxCodes, parse_non_zero_return_code
 
 CODE_WORKING_DIR = '/task/student/'
 
+# Path of the script that runs several inputs in a single run_student session (check '_run_many_in_sandbox')
+_BATCH_DRIVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_driver.py")
+# Additional time (in seconds) and memory (in MB) given to a batched session for the driver itself
+_BATCH_SESSION_TIME_OVERHEAD = 5
+_BATCH_SESSION_MEMORY_OVERHEAD = 32
+# Modules of the standard library imported once by the zygote of the Python projects (check 'batch_driver.py')
+DEFAULT_ZYGOTE_MODULES = ["bisect", "collections", "fractions", "functools", "heapq", "itertools", "math", "random",
+                          "re", "string"]
 
-def _run_in_sandbox(command, **subprocess_options):
+
+def _get_sandbox_command(command):
+    """ Returns the command that runs the given command (including the run_student flags) in the sandbox """
+    return ["run_student"] + command
+
+
+def _run_in_sandbox(command, stdout_sink=None, stderr_sink=None, output_limit=None, **subprocess_options):
     """
     Runs the given command with the given options and returns a tuple of
     (return_code, stdout, stderr). It is provided as a helper method for implementations of
@@ -16,10 +41,24 @@ def _run_in_sandbox(command, **subprocess_options):
 
     Arguments:
     command -- A list specifying the program and the arguments to be run.
+    stdout_sink -- An optional sink (check 'output_streams.py') that receives the standard output
+        while it is produced. In that case, the returned stdout is the one given by the sink.
+    stderr_sink -- An optional sink that receives the standard error while it is produced (e.g. a
+        HeadTailBuffer to keep only its first and last bytes).
+    output_limit -- An optional maximum amount of bytes of the standard output. Once it is exceeded,
+        the output is not read anymore and the process group is killed. The returned stdout then has
+        one more byte than the limit (check 'output_streams.read_stream').
     subprocess_options -- Additional options sent to subprocess.run.
     """
     try:
-        command_to_run = ["run_student"] + command
+        command_to_run = _get_sandbox_command(command)
+        if stdout_sink is not None or stderr_sink is not None or output_limit is not None:
+            if stdout_sink is None:
+                stdout_sink = output_streams.OutputBuffer()
+            if stderr_sink is None:
+                stderr_sink = output_streams.OutputBuffer()
+            return _run_with_sinks(command_to_run, stdout_sink, stderr_sink, output_limit, **subprocess_options)
+
         completed_process = subprocess.run(command_to_run, stdout=subprocess.PIPE,
                                            stderr=subprocess.PIPE, **subprocess_options)
 
@@ -32,6 +71,127 @@ def _run_in_sandbox(command, **subprocess_options):
         return GraderResult.INTERNAL_ERROR, "", str(a)
 
 
+def _run_with_sinks(command_to_run, stdout_sink, stderr_sink, output_limit=None, **subprocess_options):
+    """
+    Runs the command sending its standard output and error to the given sinks while they are produced.
+    The standard error is read in another thread, so none of the pipes can get full and block the process.
+
+    The process is started in its own session, so its whole process group can be killed when it
+    exceeds the output limit.
+    """
+    with subprocess.Popen(command_to_run, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True,
+                          **subprocess_options) as process:
+        stderr_reader = threading.Thread(target=output_streams.read_stream, args=(process.stderr, stderr_sink))
+        stderr_reader.start()
+        if output_streams.read_stream(process.stdout, stdout_sink, output_limit):
+            _kill_process_group(process)
+        stderr_reader.join()
+        return_code = process.wait()
+
+    stdout_sink.finish()
+    stderr_sink.finish()
+    return return_code, stdout_sink.getvalue(), stderr_sink.getvalue()
+
+
+def _kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # The process already finished
+        pass
+
+
+def _copy_input_file(input_file, filename):
+    """
+    Copies the content of the given file-like object into the file with the given name as bytes, as an
+    unbatched run receives it, without decoding it nor translating its line breaks.
+    """
+    source = getattr(input_file, "buffer", input_file)
+    with open(filename, 'wb') as destination:
+        chunk = source.read(output_streams.CHUNK_SIZE)
+        while chunk:
+            destination.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            chunk = source.read(output_streams.CHUNK_SIZE)
+
+
+def _run_many_in_sandbox(command, input_files, cwd, capture_options=None, zygote=None, **run_student_flags):
+    """
+    Runs the given command once per input file inside a single run_student session and returns a
+    list of (return_code, stdout, stderr) tuples in the same order of the input files. The limits
+    of run_student_flags (time, hard-time and memory) are applied to every run by the batch driver
+    (check 'batch_driver.py'), the session itself gets the sum of them.
+
+    The returned list might be shorter than input_files if the session could not finish (e.g. it
+    was killed by the sandbox), in which case the remaining inputs were not reported.
+
+    Arguments:
+    command -- A list specifying the program and the arguments to be run.
+    input_files -- A list of file-like objects, each one sent as stdin to a run of the command.
+    cwd -- The directory where the command is run.
+    capture_options -- An optional list with the capture options (check '_run_in_sandbox') of each run.
+    zygote -- Optional options of the zygote (check 'batch_driver.py') when the command runs a Python
+        program, which is then forked from the driver, run with the interpreter of the command.
+    run_student_flags -- The limits of each run, as given to Project.run.
+    """
+    time_limit = float(run_student_flags.get("time", 2))
+    hard_time_limit = float(run_student_flags.get("hard-time", run_student_flags.get("hard_time", time_limit)))
+    memory_limit = int(run_student_flags.get("memory", 50))
+
+    # Inputs, outputs and the driver are stored in the student directory, which is shared with the sandbox
+    if capture_options is None:
+        capture_options = [{} for _ in input_files]
+
+    batch_directory = tempfile.mkdtemp(dir=CODE_WORKING_DIR)
+    # The directory is removed even if the session or its results fail
+    try:
+        cases = []
+        for i, (input_file, case_capture_options) in enumerate(zip(input_files, capture_options)):
+            case = {name: os.path.join(batch_directory, "%d.%s" % (i, name)) for name in ["input", "stdout", "stderr"]}
+            case["output_limit"] = case_capture_options.get("output_limit")
+            _copy_input_file(input_file, case["input"])
+            cases.append(case)
+
+        manifest = {"command": command, "time": time_limit, "hard_time": hard_time_limit, "memory": memory_limit,
+                    "cases": cases}
+        driver_interpreter = "python3"
+        if zygote is not None:
+            driver_interpreter = command[0]
+            manifest["command"] = command[1:]
+            manifest["zygote"] = zygote
+
+        manifest_filename = os.path.join(batch_directory, "manifest.json")
+        with open(manifest_filename, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        driver_filename = os.path.join(batch_directory, os.path.basename(_BATCH_DRIVER_PATH))
+        shutil.copyfile(_BATCH_DRIVER_PATH, driver_filename)
+
+        session_flags = _parse_run_student_args(**{
+            "time": time_limit * len(cases) + _BATCH_SESSION_TIME_OVERHEAD,
+            "hard-time": hard_time_limit * len(cases) + _BATCH_SESSION_TIME_OVERHEAD,
+            "memory": memory_limit + _BATCH_SESSION_MEMORY_OVERHEAD
+        })
+        return_code, stdout, stderr = _run_in_sandbox(
+            session_flags + [driver_interpreter, driver_filename, manifest_filename], cwd=cwd)
+        try:
+            cases_return_codes = json.loads(stdout) if return_code == 0 else []
+        except ValueError:
+            cases_return_codes = []
+
+        results = []
+        for case, case_return_code, case_capture_options in zip(cases, cases_return_codes, capture_options):
+            with open(case["stdout"], 'rb') as stdout_file, open(case["stderr"], 'rb') as stderr_file:
+                stdout_sink = case_capture_options.get("stdout_sink", output_streams.OutputBuffer())
+                output_streams.read_stream(stdout_file, stdout_sink, case["output_limit"])
+                stdout_sink.finish()
+                stderr_sink = case_capture_options.get("stderr_sink", output_streams.OutputBuffer())
+                output_streams.read_stream(stderr_file, stderr_sink)
+                stderr_sink.finish()
+                results.append((case_return_code, stdout_sink.getvalue(), stderr_sink.getvalue()))
+        return results
+    finally:
+        shutil.rmtree(batch_directory, ignore_errors=True)
+
+
 def _get_compilation_message_from_return_code(return_code):
     if return_code == 0:
         return ""
@@ -48,6 +208,49 @@ def _get_compilation_message_from_return_code(return_code):
         raise AssertionError(_("Unhandled grader result: ") + str(result))
 
 
+def _build_with_cache(build, directory, source_files, artifacts, build_options, version_command):
+    """
+    Runs the build of a project, unless its artifacts are in the build cache (check 'build_cache.py'), in
+    which case they are copied into the project directory instead. The artifacts of a successful build
+    are stored in the cache. The build is always run when there is no cache or the toolchain version is
+    unknown.
+
+    Arguments:
+    build -- function that builds the project, raising a BuildError if it cannot be built.
+    directory -- directory of the project.
+    source_files -- paths of the files the build depends on, relative to the directory.
+    artifacts -- paths of the files and directories produced by the build, relative to the directory. The list
+        is only read once the build has run, so the build can fill it.
+    build_options -- values that change the artifacts, e.g. the language and the compiler flags.
+    version_command -- command that prints the version of the toolchain, which is part of the key of the build.
+    """
+    cache = build_cache.get_build_cache()
+    toolchain_version = build_cache.get_toolchain_version(version_command) if cache is not None else None
+    if toolchain_version is None:
+        build()
+        return
+
+    key = cache.compute_key(directory, source_files, build_options + [toolchain_version])
+    if cache.restore(key, directory):
+        return
+    build()
+    cache.store(key, directory, artifacts)
+
+
+def _get_file_versions(directory, subdirectory):
+    """
+    Returns the modification time and size of each file in the subdirectory of the directory, by its path
+    relative to the directory, to tell the files written by a build.
+    """
+    versions = {}
+    for root, _, filenames in os.walk(os.path.join(directory, subdirectory)):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            stat = os.lstat(path)
+            versions[os.path.relpath(path, directory)] = (stat.st_mtime_ns, stat.st_size)
+    return versions
+
+
 class BuildError(Exception):
     def __init__(self, compilation_output):
         self.compilation_output = compilation_output
@@ -87,7 +290,7 @@ class Project(object, metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def run(self, input_file, **run_student_flags):
+    def run(self, input_file, capture_options=None, **run_student_flags):
         """
         Executes this project with the given input file and returns a tuple of
         (return_code, stdout, stderr), where return_code is the status code the process finished
@@ -102,19 +305,42 @@ class Project(object, metaclass=ABCMeta):
 
         Arguments:
         input_file -- a file-like object to be sent as stdin to the code process.
+        capture_options -- optional dict with the options to capture the output of the process,
+            sent to _run_in_sandbox (e.g. stdout_sink). Projects might ignore them.
         run_student_flags: several flags passed to the run_student container like --time, --hard-time and --memory
         """
 
         if not self._is_built:
             raise ProjectNotBuiltError()
 
+    def run_many(self, input_files, capture_options=None, **run_student_flags):
+        """
+        Executes this project once per input file and returns a list of (return_code, stdout, stderr)
+        tuples in the same order of the input files. The run_student_flags are applied to each run.
+
+        This implementation calls run for each input file. Subclasses able to run all the inputs in a
+        single sandbox session should override this method.
+
+        Arguments:
+        input_files -- a list of file-like objects, each one sent as stdin to a run of the code.
+        capture_options -- optional list with the capture options (check run) of each run.
+        run_student_flags: several flags passed to the run_student container like --time, --hard-time and --memory
+        """
+
+        if capture_options is None:
+            capture_options = [None for _ in input_files]
+
+        return [self.run(input_file, capture_options=input_capture_options, **run_student_flags)
+                for input_file, input_capture_options in zip(input_files, capture_options)]
+
 
 class LambdaProject(Project):
     """
-    A Project implementation that takes the run and _do_build functions as parameters.
+    A Project implementation that takes the run and _do_build functions as parameters, and optionally
+    a run_many function to run several inputs in a single sandbox session.
     """
 
-    def __init__(self, run_function, build_function=None):
+    def __init__(self, run_function, build_function=None, run_many_function=None):
         super().__init__()
 
         assert run_function is not None
@@ -124,15 +350,192 @@ class LambdaProject(Project):
 
         self._run = run_function
         self._build = build_function
+        self._run_many = run_many_function
 
     def _do_build(self):
         self._build()
 
-    def run(self, input_file, **run_student_flags):
-        super().run(input_file, **run_student_flags)
+    def run(self, input_file, capture_options=None, **run_student_flags):
+        super().run(input_file, capture_options, **run_student_flags)
 
+        if capture_options:
+            return self._run(input_file, capture_options=capture_options, **run_student_flags)
         return self._run(input_file, **run_student_flags)
 
+    def run_many(self, input_files, capture_options=None, **run_student_flags):
+        if self._run_many is None:
+            return super().run_many(input_files, capture_options, **run_student_flags)
+
+        if not self._is_built:
+            raise ProjectNotBuiltError()
+
+        if capture_options is None:
+            capture_options = [{} for _ in input_files]
+
+        results = self._run_many(input_files, capture_options=capture_options, **run_student_flags)
+        # The inputs the batched session could not report are run one by one
+        for input_file, input_capture_options in zip(input_files[len(results):], capture_options[len(results):]):
+            input_file.seek(0)
+            results.append(self.run(input_file, capture_options=input_capture_options, **run_student_flags))
+
+        return results
+
+
+_RunRecord = namedtuple("_RunRecord", ["return_code", "stdout", "stderr", "output"])
+
+
+def _hash_input_file(input_file):
+    """
+    Returns the SHA-256 digest of the raw bytes of the given file-like object, which is rewound after it. The
+    bytes of a text file are read from its buffer, so inputs that only differ in their line breaks (or that are
+    not valid UTF-8) are told apart, as the program reads the bytes.
+    """
+    digest = hashlib.sha256()
+    raw_file = getattr(input_file, "buffer", input_file)
+    chunk = raw_file.read(output_streams.CHUNK_SIZE)
+    while chunk:
+        digest.update(chunk.encode() if isinstance(chunk, str) else chunk)
+        chunk = raw_file.read(output_streams.CHUNK_SIZE)
+    input_file.seek(0)
+    return digest.hexdigest()
+
+
+class DeduplicatedProject(Project):
+    """
+    A Project that wraps another project and runs it only once for each distinct input (with the same
+    limits). The output of the run is kept and given again to the other runs with the same input, so
+    each of them can be compared against a different expected output.
+
+    Only the inputs that appear more than once are kept, and their output is released once all the
+    runs with that input were given.
+    """
+
+    def __init__(self, project, input_filenames):
+        """
+        Arguments:
+        project -- the Project to run.
+        input_filenames -- the names of all the input files the project will be run with.
+        """
+        super().__init__()
+        self._project = project
+        self._remaining_runs = Counter()
+        for input_filename in input_filenames:
+            with open(input_filename, 'rb') as input_file:
+                self._remaining_runs[_hash_input_file(input_file)] += 1
+        self._records = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _do_build(self):
+        self._project.build()
+
+    def run(self, input_file, capture_options=None, **run_student_flags):
+        super().run(input_file, capture_options, **run_student_flags)
+
+        input_hash = _hash_input_file(input_file)
+        key = self._get_key(input_hash, capture_options, run_student_flags)
+        if self._remaining_runs[input_hash] <= 1 and key not in self._records:
+            # It is the last run of this input, so its output is not kept
+            self._release(input_hash)
+            return self._project.run(input_file, capture_options=capture_options, **run_student_flags)
+
+        with self._get_lock(key):
+            if key in self._records:
+                result = self._replay(key, capture_options)
+            else:
+                output = output_streams.SpooledOutput()
+                recording_capture_options = self._get_recording_capture_options(capture_options, output)
+                result = self._project.run(input_file, capture_options=recording_capture_options, **run_student_flags)
+                self._records[key] = self._create_record(*result, output)
+            self._release(input_hash)
+            return result
+
+    def run_many(self, input_files, capture_options=None, **run_student_flags):
+        if not self._is_built:
+            raise ProjectNotBuiltError()
+
+        if capture_options is None:
+            capture_options = [{} for _ in input_files]
+
+        input_hashes = [_hash_input_file(input_file) for input_file in input_files]
+        keys = [self._get_key(input_hash, input_capture_options, run_student_flags)
+                for input_hash, input_capture_options in zip(input_hashes, capture_options)]
+
+        # The first run of each input is sent in the batch, the rest of them are given from its record
+        batch_indices = []
+        batch_outputs = []
+        for index, key in enumerate(keys):
+            if key not in self._records and key not in keys[:index]:
+                batch_indices.append(index)
+                batch_outputs.append(output_streams.SpooledOutput() if self._remaining_runs[input_hashes[index]] > 1
+                                     else None)
+
+        batch_capture_options = [self._get_recording_capture_options(capture_options[index], output)
+                                 for index, output in zip(batch_indices, batch_outputs)]
+        batch_results = self._project.run_many([input_files[index] for index in batch_indices],
+                                               capture_options=batch_capture_options, **run_student_flags)
+
+        results = [None for _ in input_files]
+        for index, output, batch_result in zip(batch_indices, batch_outputs, batch_results):
+            results[index] = batch_result
+            if output is not None:
+                self._records[keys[index]] = self._create_record(*batch_result, output)
+
+        for index, (input_hash, key) in enumerate(zip(input_hashes, keys)):
+            if results[index] is None:
+                results[index] = self._replay(key, capture_options[index])
+            self._release(input_hash)
+
+        return results
+
+    def _get_key(self, input_hash, capture_options, run_student_flags):
+        """ Returns the key of a run, as the output only depends on the input and the limits """
+        output_limit = (capture_options or {}).get("output_limit")
+        return input_hash, json.dumps(run_student_flags, sort_keys=True), output_limit
+
+    def _get_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+    def _get_recording_capture_options(self, capture_options, output):
+        """ Returns the capture options that also send the standard output to the given SpooledOutput, if any """
+        if output is None or not capture_options or capture_options.get("stdout_sink") is None:
+            return capture_options
+        recording_capture_options = dict(capture_options)
+        recording_capture_options["stdout_sink"] = output_streams.TeeSink([capture_options["stdout_sink"], output])
+        return recording_capture_options
+
+    def _create_record(self, return_code, stdout, stderr, output):
+        if not output.finished:
+            # The project did not stream its output, so its returned stdout is given again
+            output.close()
+            output = None
+        return _RunRecord(return_code, stdout, stderr, output)
+
+    def _replay(self, key, capture_options):
+        """ Gives the output of the recorded run with the given key, sending it to the stdout sink (if any) """
+        stdout_sink = (capture_options or {}).get("stdout_sink")
+        with self._get_lock(key):
+            record = self._records[key]
+            if record.output is None or stdout_sink is None:
+                return record.return_code, record.stdout, record.stderr
+
+            for chunk in record.output.iter_chunks():
+                stdout_sink.write(chunk)
+        stdout_sink.finish()
+        return record.return_code, stdout_sink.getvalue(), record.stderr
+
+    def _release(self, input_hash):
+        """ Counts a run of the given input, releasing its recorded outputs after the last one """
+        with self._lock:
+            self._remaining_runs[input_hash] -= 1
+            if self._remaining_runs[input_hash] > 0:
+                return
+            for key in [key for key in self._records if key[0] == input_hash]:
+                record = self._records.pop(key)
+                if record.output is not None:
+                    record.output.close()
+
 
 class ProjectFactory(object, metaclass=ABCMeta):
     """
@@ -166,18 +569,27 @@ class PythonProjectFactory(ProjectFactory):
     Implementation of ProjectFactory for Python.
     """
 
-    def __init__(self, main_file_name='main.py', python_binary='python', additional_flags=None):
+    def __init__(self, main_file_name='main.py', python_binary='python', additional_flags=None, zygote_modules=None):
         """
         Initializes an instance of PythonProjectFactory with the given options.
 
         Arguments:
         main_file_name -- The name of the file to run. If running a code, this will also be the name
             of the file where the code will be stored.
+        zygote_modules -- modules imported once by the zygote that forks a child for each batched run (check
+            'batch_driver.py'), or None to start a new interpreter for each of them.
         """
 
         self._main_file_name = main_file_name
         self._python_binary = python_binary
         self._additional_flags = additional_flags if additional_flags is not None else []
+        self._zygote_modules = zygote_modules
+
+    def with_zygote(self, zygote_modules=None):
+        """ Returns a copy of this factory whose batched runs are forked from a zygote with the given modules """
+        if zygote_modules is None:
+            zygote_modules = DEFAULT_ZYGOTE_MODULES
+        return PythonProjectFactory(self._main_file_name, self._python_binary, self._additional_flags, zygote_modules)
 
     def create_from_code(self, code):
         project_directory = tempfile.mkdtemp(dir=CODE_WORKING_DIR)
@@ -188,13 +600,19 @@ class PythonProjectFactory(ProjectFactory):
         return self.create_from_directory(project_directory)
 
     def create_from_directory(self, directory):
-        def run(input_file, **run_student_flags):
+        def run(input_file, capture_options=None, **run_student_flags):
             sandbox_flags = _parse_run_student_args(**run_student_flags)
             command = sandbox_flags + [self._python_binary, self._main_file_name] + self._additional_flags
 
-            return _run_in_sandbox(command, stdin=input_file, cwd=directory)
+            return _run_in_sandbox(command, stdin=input_file, cwd=directory, **(capture_options or {}))
 
-        return LambdaProject(run_function=run)
+        def run_many(input_files, capture_options=None, **run_student_flags):
+            command = [self._python_binary, self._main_file_name] + self._additional_flags
+            zygote = {"preload": self._zygote_modules} if self._zygote_modules is not None else None
+            return _run_many_in_sandbox(command, input_files, cwd=directory, capture_options=capture_options,
+                                        zygote=zygote, **run_student_flags)
+
+        return LambdaProject(run_function=run, run_many_function=run_many)
 
 
 class JavaProjectFactory(ProjectFactory):
@@ -203,13 +621,15 @@ class JavaProjectFactory(ProjectFactory):
     """
 
     def __init__(self, main_class='Main', source_version='1.8', sourcepath="src", classpath="lib",
-                 bootclasspath=None):
+                 bootclasspath=None, runtime_profile=None):
         """
         Initializes an instance of JavaProjectFactory with the given options.
 
         Arguments:
         main_file_name -- The name of the file to run. If running a code, this will also be the name
             of the file where the code will be stored.
+        runtime_profile -- JavaRuntimeProfile with the flags of the JVM on each run (check
+            'java_runtime_profiles.py'), or None to run it with its default flags.
         """
 
         self._main_class = main_class
@@ -218,6 +638,14 @@ class JavaProjectFactory(ProjectFactory):
         self._sourcepath = sourcepath
         self._classpath = classpath
         self._bootclasspath = bootclasspath
+        self._runtime_profile = runtime_profile
+
+    def with_runtime_profile(self, runtime_profile=None):
+        """ Returns a copy of this factory whose runs use the given runtime profile (or the default one) """
+        if runtime_profile is None:
+            runtime_profile = java_runtime_profiles.JavaRuntimeProfile()
+        return JavaProjectFactory(self._main_class, self._source_version, self._sourcepath, self._classpath,
+                                  self._bootclasspath, runtime_profile)
 
     def create_from_code(self, code):
         project_directory = tempfile.mkdtemp(dir=CODE_WORKING_DIR)
@@ -234,9 +662,7 @@ class JavaProjectFactory(ProjectFactory):
         if not os.path.exists(build_directory):
             os.makedirs(build_directory)
 
-        def build():
-            source_files = glob(os.path.join(os.path.abspath(directory), "**/*.java"), recursive=True)
-
+        def compile_code(source_files):
             javac_command = ["javac", "-source", self._source_version, "-d", "build",
                              "-cp", self._classpath + "/*",
                              "-sourcepath", self._sourcepath]
@@ -250,13 +676,78 @@ class JavaProjectFactory(ProjectFactory):
             if return_code != 0:
                 raise BuildError(_get_compilation_message_from_return_code(return_code) + "\n" + stderr)
 
-        def run(input_file, **run_student_flags):
-            classpath_entries = ["build", self._classpath, self._classpath + "/*"]
+        def build():
+            source_files = glob(os.path.join(os.path.abspath(directory), "**/*.java"), recursive=True)
+            # The libraries in the classpath also change the compiled classes
+            dependencies = source_files + glob(os.path.join(os.path.abspath(directory), self._classpath, "*"))
+            build_options = ["java", self._source_version, self._sourcepath, self._classpath, self._bootclasspath]
+            # The build directory might come with the project, so only the classes compiled from the sources
+            # are stored in the cache
+            previous_classes = _get_file_versions(directory, "build")
+            compiled_classes = []
+
+            def compile_classes():
+                compile_code(source_files)
+                compiled_classes.extend(path for path, version in _get_file_versions(directory, "build").items()
+                                        if previous_classes.get(path) != version)
+
+            _build_with_cache(compile_classes, directory,
+                              [os.path.relpath(path, directory) for path in dependencies if os.path.isfile(path)],
+                              compiled_classes, build_options, ["javac", "-version"])
+
+        classpath_entries = ["build", self._classpath, self._classpath + "/*"]
+
+        def get_java_command(run_student_flags):
+            return self._get_java_flags(run_student_flags) + ["-cp", os.pathsep.join(classpath_entries),
+                                                              self._main_class]
+
+        def run(input_file, capture_options=None, **run_student_flags):
             sandbox_flags = _parse_run_student_args(**run_student_flags)
-            java_command = sandbox_flags + ["java", "-cp", os.pathsep.join(classpath_entries), self._main_class]
-            return _run_in_sandbox(java_command, stdin=input_file, cwd=directory)
+            result = _run_in_sandbox(sandbox_flags + get_java_command(run_student_flags), stdin=input_file,
+                                     cwd=directory, **(capture_options or {}))
+            return self._parse_java_result(*result)
+
+        def run_many(input_files, capture_options=None, **run_student_flags):
+            results = _run_many_in_sandbox(get_java_command(run_student_flags), input_files, cwd=directory,
+                                           capture_options=capture_options, **run_student_flags)
+            return [self._parse_java_result(*result) for result in results]
+
+        return LambdaProject(run_function=run, build_function=build, run_many_function=run_many)
+
+    def _get_java_flags(self, run_student_flags):
+        """ Returns the command of the JVM, with the flags of the runtime profile for the given limits """
+        if self._runtime_profile is None:
+            return ["java"]
+        return ["java"] + self._runtime_profile.get_flags(run_student_flags.get("memory"))
+
+    def _parse_java_result(self, return_code, stdout, stderr):
+        """ Reports the runs that exhausted the heap sized by the runtime profile as memory limit exceeded """
+        if self._runtime_profile is not None and java_runtime_profiles.is_out_of_memory(return_code, stderr):
+            return_code = SandboxCodes.MEMORY_LIMIT.value
+        return return_code, stdout, stderr
 
-        return LambdaProject(run_function=run, build_function=build)
+    def measure_startup_overhead(self, **run_student_flags):
+        """
+        Returns the time in seconds that the JVM takes to start and stop in the sandbox with the given
+        limits, which is part of the time of each run, or None if it could not be run. The time of a
+        command that does nothing in the same sandbox is subtracted, so the time of the sandbox itself
+        is not reported as the time of the JVM.
+        """
+        jvm_time = _measure_run_time(self._get_java_flags(run_student_flags) + ["-version"], **run_student_flags)
+        sandbox_time = _measure_run_time(["true"], **run_student_flags)
+        if jvm_time is None or sandbox_time is None:
+            return None
+        return max(jvm_time - sandbox_time, 0.0)
+
+
+def _measure_run_time(command, **run_student_flags):
+    """ Returns the time in seconds of a run of the command in the sandbox, or None if it failed """
+    sandbox_flags = _parse_run_student_args(**run_student_flags)
+    start_time = time.monotonic()
+    return_code, stdout, stderr = _run_in_sandbox(sandbox_flags + command, cwd=CODE_WORKING_DIR)
+    if return_code != 0:
+        return None
+    return time.monotonic() - start_time
 
 
 class MakefileProjectFactory(ProjectFactory):
@@ -271,12 +762,16 @@ class MakefileProjectFactory(ProjectFactory):
             if return_code != 0:
                 raise BuildError(stderr)
 
-        def run(input_file, **run_student_flags):
+        def run(input_file, capture_options=None, **run_student_flags):
             sandbox_flags = _parse_run_student_args(**run_student_flags)
             run_command = sandbox_flags + ["make", "run"]
-            return _run_in_sandbox(run_command, stdin=input_file, cwd=directory)
+            return _run_in_sandbox(run_command, stdin=input_file, cwd=directory, **(capture_options or {}))
 
-        return LambdaProject(run_function=run, build_function=build)
+        def run_many(input_files, capture_options=None, **run_student_flags):
+            return _run_many_in_sandbox(["make", "run"], input_files, cwd=directory, capture_options=capture_options,
+                                        **run_student_flags)
+
+        return LambdaProject(run_function=run, build_function=build, run_many_function=run_many)
 
 
 class CppProjectFactory(MakefileProjectFactory):
@@ -284,32 +779,55 @@ class CppProjectFactory(MakefileProjectFactory):
     Implementation of ProjectFactory for C++.
     """
 
-    def __init__(self, additional_flags=None):
+    def __init__(self, additional_flags=None, precompiled_headers=None):
         """
         Initializes an instance of CppProjectFactory with the given options.
+
+        Arguments:
+        additional_flags -- flags given to the compiler.
+        precompiled_headers -- headers that are precompiled for the additional flags (check
+            'precompiled_headers.py'). They are used when a code includes one of them first.
         """
         if additional_flags is None:
             additional_flags = []
+        if precompiled_headers is None:
+            precompiled_headers = ["bits/stdc++.h"]
 
         self._additional_flags = additional_flags
+        self._precompiled_headers = precompiled_headers
+
+    def generate_precompiled_headers(self):
+        """ Precompiles the headers of this factory, which is done when the image is built """
+        precompiled_headers.generate_precompiled_headers("g++", "c++", self._additional_flags,
+                                                         self._precompiled_headers)
 
     def create_from_code(self, code):
         project_directory = tempfile.mkdtemp(dir=CODE_WORKING_DIR)
         with open(os.path.join(project_directory, "main.cpp"), 'w') as main_file:
             main_file.write(code)
 
-        def build():
-            compilation_command = ["g++", "main.cpp", "-o", "main"] + self._additional_flags
+        def compile_code():
+            compilation_command = ["g++", "main.cpp", "-o", "main"] + self._additional_flags + \
+                precompiled_headers.get_precompiled_headers_flags("g++", self._additional_flags,
+                                                                  self._precompiled_headers)
             return_code, stdout, stderr = _run_in_sandbox(compilation_command, cwd=project_directory)
             if return_code != 0:
                 raise BuildError(_get_compilation_message_from_return_code(return_code) + "\n" + stderr)
 
-        def run(input_file, **run_student_flags):
+        def build():
+            _build_with_cache(compile_code, project_directory, ["main.cpp"], ["main"], ["cpp"] + self._additional_flags,
+                              ["g++", "--version"])
+
+        def run(input_file, capture_options=None, **run_student_flags):
             sandbox_flags = _parse_run_student_args(**run_student_flags)
             run_command = sandbox_flags + ["./main"]
-            return _run_in_sandbox(run_command, stdin=input_file, cwd=project_directory)
+            return _run_in_sandbox(run_command, stdin=input_file, cwd=project_directory, **(capture_options or {}))
 
-        return LambdaProject(run_function=run, build_function=build)
+        def run_many(input_files, capture_options=None, **run_student_flags):
+            return _run_many_in_sandbox(["./main"], input_files, cwd=project_directory,
+                                        capture_options=capture_options, **run_student_flags)
+
+        return LambdaProject(run_function=run, build_function=build, run_many_function=run_many)
 
 
 class CProjectFactory(MakefileProjectFactory):
@@ -317,32 +835,55 @@ class CProjectFactory(MakefileProjectFactory):
     Implementation of ProjectFactory for C.
     """
 
-    def __init__(self, additional_flags=None):
+    def __init__(self, additional_flags=None, precompiled_headers=None):
         """
         Initializes an instance of CProjectFactory with the given options.
+
+        Arguments:
+        additional_flags -- flags given to the compiler.
+        precompiled_headers -- headers that are precompiled for the additional flags (check
+            'precompiled_headers.py'). They are used when a code includes one of them first.
         """
         if additional_flags is None:
             additional_flags = []
+        if precompiled_headers is None:
+            precompiled_headers = []
 
         self._additional_flags = additional_flags
+        self._precompiled_headers = precompiled_headers
+
+    def generate_precompiled_headers(self):
+        """ Precompiles the headers of this factory, which is done when the image is built """
+        precompiled_headers.generate_precompiled_headers("gcc", "c", self._additional_flags,
+                                                         self._precompiled_headers)
 
     def create_from_code(self, code):
         project_directory = tempfile.mkdtemp(dir=CODE_WORKING_DIR)
         with open(os.path.join(project_directory, "main.c"), 'w') as main_file:
             main_file.write(code)
 
-        def build():
-            compilation_command = ["gcc", "main.c", "-o", "main"] + self._additional_flags
+        def compile_code():
+            compilation_command = ["gcc", "main.c", "-o", "main"] + self._additional_flags + \
+                precompiled_headers.get_precompiled_headers_flags("gcc", self._additional_flags,
+                                                                  self._precompiled_headers)
             return_code, stdout, stderr = _run_in_sandbox(compilation_command, cwd=project_directory)
             if return_code != 0:
                 raise BuildError(_get_compilation_message_from_return_code(return_code) + "\n" + stderr)
 
-        def run(input_file, **run_student_flags):
+        def build():
+            _build_with_cache(compile_code, project_directory, ["main.c"], ["main"], ["c"] + self._additional_flags,
+                              ["gcc", "--version"])
+
+        def run(input_file, capture_options=None, **run_student_flags):
             sandbox_flags = _parse_run_student_args(**run_student_flags)
             run_command = sandbox_flags + ["./main"]
-            return _run_in_sandbox(run_command, stdin=input_file, cwd=project_directory)
+            return _run_in_sandbox(run_command, stdin=input_file, cwd=project_directory, **(capture_options or {}))
 
-        return LambdaProject(run_function=run, build_function=build)
+        def run_many(input_files, capture_options=None, **run_student_flags):
+            return _run_many_in_sandbox(["./main"], input_files, cwd=project_directory,
+                                        capture_options=capture_options, **run_student_flags)
+
+        return LambdaProject(run_function=run, build_function=build, run_many_function=run_many)
 
 
 class VerilogProjectFactory(ProjectFactory):
@@ -456,6 +997,13 @@ _ALL_FACTORIES = {
 }
 
 
+def generate_precompiled_headers():
+    """ Precompiles the headers of all the factories that support them (check 'precompiled_headers.py') """
+    for factory in _ALL_FACTORIES.values():
+        if hasattr(factory, "generate_precompiled_headers"):
+            factory.generate_precompiled_headers()
+
+
 def factory_exists(name):
     return name in _ALL_FACTORIES
 
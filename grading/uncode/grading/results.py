@@ -15,6 +15,8 @@ class GraderResult(IntEnum):
     INTERNAL_ERROR = 70
     PRESENTATION_ERROR = 80
     WRONG_ANSWER = 90
+    # The test case was not run because the grading stopped early, it never overrides other results
+    NOT_RUN = 95
     ACCEPTED = 100
 
 